@@ -3,16 +3,176 @@ Main Flask application file.
 Contains route definitions and error handling.
 """
 
-from flask import Flask, jsonify
-from views.prompt_controller import PromptController
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
 
+from flask import Flask, Response, abort, current_app, g, jsonify, request, send_file, stream_with_context
+from services.file_type_model import configure_file_type_model
+from services.metrics import add_label, get_request_metrics
+from services.rules import DEFAULT_RULES_PATH, DEFAULT_TEMPLATES_PATH
+from services.rule_store import configure_rule_store, get_active_snapshot, reset_snapshot, use_snapshot
+from views.encoding import JSON_MIMETYPE, encode_body
+from views.prompt_controller import RULES_VERSION_HEADER, PromptController
+from views.request_body import DecompressionError, close_request_body, get_small_request_body
+from werkzeug.test import EnvironBuilder, run_wsgi_app
 
-def create_app():
-    """Application factory function to create and configure the Flask app."""
+# Optional features (profiling, capture, the response cache, tenants, jobs
+# and the middlewares) are imported by create_app only when they are enabled
+
+
+def create_app(config=None, warm_up=True):
+    """
+    Application factory function to create and configure the Flask app.
+    
+    Args:
+        config: Optional mapping of config values overriding the defaults
+        warm_up: Send the warm-up requests if WARM_UP_ENABLED is set;
+            create_asgi_app warms up its own app instead
+    """
     app = Flask(__name__)
     
     # Configure the app
     app.config['JSON_SORT_KEYS'] = False  # Preserve JSON key order
+    app.config['MAX_BATCH_ITEMS'] = 10000  # Upper bound for JSON array batches
+    app.config['LAZY_JSON_PARSING'] = False  # Decode only the routing fields of /match-prompt bodies
+    app.config['LAZY_JSON_MIN_BYTES'] = 256 * 1024  # Smaller bodies are parsed in full
+    app.config['RULES_PATH'] = os.environ.get('PROMPT_RULES_PATH', DEFAULT_RULES_PATH)
+    app.config['RULES_RELOAD_INTERVAL'] = 2.0  # Seconds between rule file checks, 0 disables
+    app.config['RULES_SNAPSHOT_PATH'] = os.environ.get('PROMPT_RULES_SNAPSHOT')  # Prebuilt compiled rules loaded instead of compiling, None disables
+    app.config['WARM_UP_ENABLED'] = False  # Send a request of each hot kind through the app before create_app returns
+    app.config['MAX_CONTENT_LENGTH'] = 64 * 1024 * 1024  # Larger bodies are rejected with 413
+    app.config['BODY_SPOOL_THRESHOLD'] = 1024 * 1024  # Larger /match-prompt bodies are spooled to disk
+    app.config['BODY_SPOOL_DIR'] = None  # Directory for spooled bodies, None for the system default
+    app.config['FAST_PATH_ENABLED'] = False  # Answer POST /match-prompt in a WSGI middleware in front of Flask
+    app.config['FAST_PATH_MAX_BYTES'] = 64 * 1024  # Larger bodies go through Flask
+    app.config['PROFILING_ENABLED'] = False  # Allow profiling /match-prompt requests
+    app.config['PROFILE_HEADER'] = 'X-Profile'  # Requests with this header set to 1 are profiled
+    app.config['PROFILE_SAMPLE_RATE'] = 0.0  # Fraction of other requests profiled
+    app.config['PROFILE_DIR'] = os.path.join(tempfile.gettempdir(), 'prompt-profiles')
+    app.config['PROFILE_MAX_FILES'] = 100  # Newest profiles kept in PROFILE_DIR
+    app.config['METRICS_WORKER_LABEL'] = False  # Label /metrics samples with worker="<pid>", set by server.py
+    app.config['CAPTURE_PATH'] = os.environ.get('PROMPT_CAPTURE_PATH')  # Append /match-prompt requests here, None disables
+    app.config['CAPTURE_SAMPLE_RATE'] = 1.0  # Fraction of requests captured
+    app.config['CAPTURE_MAX_BYTES'] = 64 * 1024  # Larger bodies are not captured
+    app.config['FILE_TYPE_MODEL_PATH'] = os.environ.get('PROMPT_FILE_TYPE_MODEL')  # Infer a missing file_type with this model, None disables
+    app.config['FILE_TYPE_MIN_CONFIDENCE'] = 0.5  # Less likely predictions are reported but not used
+    app.config['PROMPT_TEMPLATES_PATH'] = os.environ.get('PROMPT_TEMPLATES_PATH', DEFAULT_TEMPLATES_PATH)  # None disables rendering
+    app.config['TEMPLATE_CACHE_SIZE'] = 256  # Compiled templates kept in memory
+    app.config['RESPONSE_CACHE_ENABLED'] = False  # Answer repeated /match-prompt requests from a cache
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'] = 10000  # Responses kept in memory
+    app.config['RESPONSE_CACHE_MAX_BYTES'] = 64 * 1024 * 1024  # Memory used by cached responses
+    app.config['RESPONSE_CACHE_TTL'] = 300.0  # Seconds a cached response is valid
+    app.config['RESPONSE_CACHE_DB_PATH'] = os.environ.get('PROMPT_RESPONSE_CACHE_DB')  # SQLite disk tier, None disables
+    app.config['IDEMPOTENCY_HEADER'] = 'Idempotency-Key'  # Requests with this header are cached by its value
+    app.config['COMPRESSION_ENABLED'] = True  # Accept compressed request bodies and compress large responses
+    app.config['COMPRESS_MIN_BYTES'] = 1024  # Smaller responses are sent uncompressed
+    app.config['COMPRESS_LEVEL'] = 6  # gzip level (1-9) or zstd level
+    app.config['ADMISSION_ENABLED'] = False  # Shed excess requests with 429/503 before Flask sees them
+    app.config['ADMISSION_RATE'] = 0  # Requests per second per client, 0 disables rate limiting
+    app.config['ADMISSION_BURST'] = 50  # Requests a client may send at once
+    app.config['ADMISSION_CLIENT_HEADER'] = 'X-Client-Id'  # Client key, falling back to the remote address
+    app.config['ADMISSION_MAX_CLIENTS'] = 10000  # Clients whose rate limit state is kept
+    app.config['ADMISSION_INITIAL_CONCURRENCY'] = 20  # Starting limit on requests in flight
+    app.config['ADMISSION_MIN_CONCURRENCY'] = 1
+    app.config['ADMISSION_MAX_CONCURRENCY'] = 200  # 0 disables the concurrency limit
+    app.config['ADMISSION_LATENCY_TOLERANCE'] = 2.0  # Latency over the no-load baseline tolerated before the limit shrinks
+    app.config['ADMISSION_EXEMPT_PATHS'] = ('/health', '/metrics', '/jobs/')  # Always admitted; a trailing / exempts the paths under it
+    app.config['JOBS_ENABLED'] = False  # Accept background jobs on /jobs and Prefer: respond-async
+    app.config['JOBS_DB_PATH'] = os.environ.get('PROMPT_JOBS_DB', os.path.join(tempfile.gettempdir(), 'prompt-jobs.sqlite3'))
+    app.config['JOBS_WORKERS'] = 2  # Job worker threads per process, 0 when server.py runs job processes
+    app.config['JOBS_MAX_PENDING'] = 1000  # Unfinished jobs before submissions get 503
+    app.config['JOBS_RESULT_TTL'] = 3600.0  # Seconds a job result is kept
+    app.config['JOBS_LEASE'] = 300.0  # Seconds before a job whose worker died is run again
+    app.config['JOBS_MAX_WAIT'] = 30.0  # Longest long poll on GET /jobs/<id>?wait=
+    app.config['TENANT_RULES_DIR'] = os.environ.get('PROMPT_TENANT_RULES_DIR')  # <tenant>.json rule files, None disables tenants
+    app.config['TENANT_HEADER'] = 'X-Tenant-Id'  # Selects a tenant, like a /tenants/<tenant>/ path prefix
+    app.config['TENANT_CACHE_MAX_ENTRIES'] = 1000  # Compiled tenant rule sets kept in memory
+    app.config['TENANT_CACHE_MAX_BYTES'] = 256 * 1024 * 1024  # Memory used by compiled tenant rule sets, roughly
+    app.config['HTTP_CACHE_MAX_AGE'] = 60  # Seconds clients and proxies may reuse GET /match-prompt and / responses
+    if config:
+        app.config.update(config)
+    
+    # Load the rule file and watch it for changes
+    configure_rule_store(
+        app.config['RULES_PATH'],
+        app.config['RULES_RELOAD_INTERVAL'],
+        app.config['RULES_SNAPSHOT_PATH']
+    )
+    
+    # Load the model that infers a missing file_type from the data
+    configure_file_type_model(
+        app.config['FILE_TYPE_MODEL_PATH'],
+        app.config['FILE_TYPE_MIN_CONFIDENCE']
+    )
+    
+    # Map the prompt templates returned with "render": true
+    if app.config['PROMPT_TEMPLATES_PATH']:
+        from services.prompt_templates import configure_template_library
+        configure_template_library(
+            app.config['PROMPT_TEMPLATES_PATH'],
+            app.config['TEMPLATE_CACHE_SIZE'],
+            app.config['RULES_RELOAD_INTERVAL']
+        )
+    elif 'services.prompt_templates' in sys.modules:
+        # Turn off rendering set up by an earlier app in this process
+        sys.modules['services.prompt_templates'].configure_template_library(None)
+    
+    # Set up request profiling
+    if app.config['PROFILING_ENABLED']:
+        from services.profiler import RequestProfiler
+        app.extensions['request_profiler'] = RequestProfiler(
+            app.config['PROFILE_DIR'],
+            app.config['PROFILE_SAMPLE_RATE'],
+            app.config['PROFILE_MAX_FILES']
+        )
+    
+    # Record traffic for benchmarks/replay.py
+    if app.config['CAPTURE_PATH']:
+        from services.capture import RequestCapture
+        app.extensions['request_capture'] = RequestCapture(
+            app.config['CAPTURE_PATH'],
+            app.config['CAPTURE_SAMPLE_RATE'],
+            app.config['CAPTURE_MAX_BYTES']
+        )
+    
+    # Answer resubmitted requests without processing them again
+    if app.config['RESPONSE_CACHE_ENABLED']:
+        from services.response_cache import ResponseCache
+        app.extensions['response_cache'] = ResponseCache(
+            app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+            app.config['RESPONSE_CACHE_MAX_BYTES'],
+            app.config['RESPONSE_CACHE_TTL'],
+            app.config['RESPONSE_CACHE_DB_PATH']
+        )
+    
+    # Compile tenant rule files on first use and keep the hot ones
+    if app.config['TENANT_RULES_DIR']:
+        from services.tenant_rules import TenantRuleSets
+        app.extensions['tenant_rules'] = TenantRuleSets(
+            app.config['TENANT_RULES_DIR'],
+            app.config['TENANT_CACHE_MAX_ENTRIES'],
+            app.config['TENANT_CACHE_MAX_BYTES'],
+            app.config['RULES_RELOAD_INTERVAL']
+        )
+    
+    # Process large documents in the background
+    if app.config['JOBS_ENABLED']:
+        from services.job_queue import JobQueue
+        app.extensions['job_queue'] = JobQueue(
+            app.config['JOBS_DB_PATH'],
+            lambda body, content_type, tenant: run_job(app, body, content_type, tenant),
+            app.config['JOBS_WORKERS'],
+            app.config['JOBS_MAX_PENDING'],
+            app.config['JOBS_RESULT_TTL'],
+            app.config['JOBS_LEASE']
+        )
+    
+    # Reject oversized bodies up front and clean up spooled ones
+    register_request_hooks(app)
     
     # Register routes
     register_routes(app)
@@ -20,9 +180,141 @@ def create_app():
     # Register error handlers
     register_error_handlers(app)
     
+    # Serve the hottest endpoint from pre-encoded responses
+    if app.config['FAST_PATH_ENABLED']:
+        from views.fast_path import FastPathMiddleware
+        app.wsgi_app = FastPathMiddleware(
+            app.wsgi_app, app.config, app.extensions.get('request_capture'),
+            app.extensions.get('request_profiler')
+        )
+    
+    # Decompress request bodies as they are read and compress large responses
+    if app.config['COMPRESSION_ENABLED']:
+        from views.compression import CompressionMiddleware
+        app.wsgi_app = CompressionMiddleware(app.wsgi_app, app.config)
+    
+    # Shed load before any other work is done for a request
+    if app.config['ADMISSION_ENABLED']:
+        from views.admission import AdmissionMiddleware
+        app.wsgi_app = app.extensions['admission'] = AdmissionMiddleware(app.wsgi_app, app.config)
+    
+    # Set up what the first request would otherwise pay for
+    if warm_up and app.config['WARM_UP_ENABLED']:
+        warm_up_app(app)
+    
     return app
 
 
+def warm_up_requests():
+    """
+    Build the requests sent through a new app before it serves traffic.
+    
+    Returns:
+        List of (method, path, query string, JSON body) tuples
+    """
+    snapshot = get_active_snapshot()
+    fields = {dimension.name: dimension.values[0] for dimension in snapshot.dimensions if dimension.values}
+    return [
+        ('POST', '/match-prompt', '', json.dumps(dict(fields, data='warm-up')).encode('utf-8')),
+        ('GET', '/match-prompt', urlencode(fields), b''),
+        ('GET', '/health', '', b'')
+    ]
+
+
+def warm_up_app(app):
+    """
+    Send the warm-up requests through the full middleware stack.
+    
+    Flask, Werkzeug and the middlewares import modules, compile regular
+    expressions and bind the URL map on first use; doing that here lets
+    the first real request run at full speed. Warm-up requests are not
+    captured and not counted in the metrics.
+    """
+    started = time.perf_counter()
+    capture = app.extensions.get('request_capture')
+    if capture is not None:
+        sample_rate, capture.sample_rate = capture.sample_rate, 0.0
+    try:
+        for method, path, query_string, body in warm_up_requests():
+            environ = EnvironBuilder(path, method=method, query_string=query_string, data=body,
+                                     content_type=JSON_MIMETYPE).get_environ()
+            _, status, _ = run_wsgi_app(app.wsgi_app, environ, buffered=True)
+            if int(status.split(' ', 1)[0]) >= 500:
+                app.logger.warning("Warm-up request %s %s failed with status %s", method, path, status)
+    finally:
+        if capture is not None:
+            capture.sample_rate = sample_rate
+    get_request_metrics().reset()
+    app.logger.info("Warmed up in %.1f ms", (time.perf_counter() - started) * 1000)
+
+
+def run_job(app, body, content_type, tenant):
+    """Process a job body with the app's config and its tenant's rules, as /match-prompt would."""
+    snapshot = None
+    if tenant is not None:
+        tenants = app.extensions.get('tenant_rules')
+        snapshot = tenants.get(tenant) if tenants is not None else None
+        if snapshot is None:
+            return unknown_tenant(tenant), 404
+    
+    token = use_snapshot(snapshot)
+    try:
+        with app.app_context():
+            return PromptController.process_body(body, content_type)
+    finally:
+        reset_snapshot(token)
+
+
+def unknown_tenant(tenant):
+    """Build the error response for a tenant without rules."""
+    return {
+        "success": False,
+        "error": "Unknown Tenant",
+        "message": f"No rules are configured for tenant {tenant!r}"
+    }
+
+
+def register_request_hooks(app):
+    """Register hooks that run around every request."""
+    
+    @app.before_request
+    def reject_oversized_body():
+        """Reject a body whose Content-Length is over the limit before reading it."""
+        max_length = app.config.get('MAX_CONTENT_LENGTH')
+        if max_length is not None and (request.content_length or 0) > max_length:
+            abort(413)
+    
+    # Tenant selection, only when tenants are configured so other deployments skip it
+    if app.config['TENANT_RULES_DIR']:
+        @app.url_value_preprocessor
+        def pull_tenant(endpoint, values):
+            """Take the tenant out of /tenants/<tenant>/ URLs so the views stay tenant-agnostic."""
+            g.tenant = values.pop('tenant', None) if values else None
+        
+        @app.before_request
+        def select_tenant():
+            """Match the request against its tenant's rules, from the path or the tenant header."""
+            tenants = app.extensions['tenant_rules']
+            tenant = g.get('tenant') or request.headers.get(app.config['TENANT_HEADER'])
+            if not tenant:
+                return None
+            snapshot = tenants.get(tenant)
+            if snapshot is None:
+                return jsonify(unknown_tenant(tenant)), 404
+            g.tenant = tenant
+            g.snapshot_token = use_snapshot(snapshot)
+            return None
+        
+        @app.teardown_request
+        def restore_rules(error=None):
+            """Return to the default rules once the request, including a streamed response, is done."""
+            token = g.pop('snapshot_token', None)
+            if token is not None:
+                reset_snapshot(token)
+    
+    app.teardown_request(close_request_body)
+
+
 def register_routes(app):
     """Register all application routes."""
     
@@ -31,6 +323,9 @@ def register_routes(app):
         """
         POST endpoint for matching prompts based on input criteria.
         
+        Takes and returns JSON or MessagePack (application/msgpack); the
+        response format follows the Accept header, else the request's.
+        
         Expected JSON input:
         {
             "situation": "Commercial Auto",
@@ -45,8 +340,183 @@ def register_routes(app):
             "prompt": "Prompt 1"
         }
         """
-        response_data, status_code = PromptController.match_prompt()
-        return jsonify(response_data), status_code
+        # Prefer: respond-async hands the request to the job queue
+        queue = app.extensions.get('job_queue')
+        if queue is not None and 'respond-async' in request.headers.get('Prefer', '').lower():
+            response = submit_job(queue)
+            response.headers['Preference-Applied'] = 'respond-async'
+            return response
+        
+        started = time.perf_counter()
+        profile_id = None
+        profiler = app.extensions.get('request_profiler')
+        trigger = profiler and profiler.should_profile_request(
+            request.environ,
+            request.headers.get(app.config['PROFILE_HEADER'], '').lower() in ('1', 'true', 'yes')
+        )
+        cache = app.extensions.get('response_cache')
+        cache_key = cached = fingerprint = None
+        if trigger:
+            (response_data, status_code), profile_id = profiler.run(
+                PromptController.match_prompt,
+                {"path": request.path, "content_length": request.content_length, "trigger": trigger},
+                lambda result: {"status": result[1], "outcome": PromptController.outcome_of(result[0])}
+            )
+        else:
+            try:
+                if cache is not None:
+                    cache_key = PromptController.response_cache_key(app.config['IDEMPOTENCY_HEADER'])
+                    fingerprint = PromptController.idempotency_fingerprint(app.config['IDEMPOTENCY_HEADER'])
+                    cached = cache.get(cache_key) if cache_key is not None else None
+            except DecompressionError as e:
+                # Hashing the body read it first; answered as match_prompt would
+                response_data, status_code = {
+                    "success": False,
+                    "error": "Missing Data",
+                    "message": f"Invalid compressed body: {e}"
+                }, 400
+                cache_key = fingerprint = None
+            else:
+                if cached is not None and fingerprint is not None and cached.fingerprint not in (b"", fingerprint):
+                    # The key was used for another request; neither replayed nor overwritten
+                    response_data, status_code = PromptController.idempotency_conflict(
+                        app.config['IDEMPOTENCY_HEADER']
+                    )
+                    cached = cache_key = None
+                elif cached is None:
+                    response_data, status_code = PromptController.match_prompt()
+        
+        serializing = time.perf_counter()
+        if cached is not None:
+            # Stored encoded, so a hit skips parsing, matching and serializing
+            response = Response(cached.body, mimetype=PromptController.response_mimetype())
+            response.headers['X-Cache'] = 'HIT'
+            status_code, outcome = cached.status, cached.outcome
+        else:
+            response = negotiated_response(response_data, status_code)
+            outcome = PromptController.outcome_of(response_data)
+        finished = time.perf_counter()
+        metrics = get_request_metrics()
+        metrics.observe("serialize", finished - serializing)
+        metrics.observe("total", finished - started)
+        metrics.count(outcome)
+        
+        # Server errors are not cached, so a retry gets another chance; an
+        # idempotency key only keeps a success, so a fixed request can reuse it
+        cacheable = 200 <= status_code < 300 if fingerprint is not None else status_code < 500
+        if cached is None and cache_key is not None and cacheable:
+            cache.put(cache_key, status_code, response.get_data(), outcome, fingerprint or b"")
+        
+        capture = app.extensions.get('request_capture')
+        if capture is not None:
+            body = get_small_request_body(capture.max_body_bytes)
+            if body is not None:
+                capture.record(request.content_type, body, status_code)
+        
+        if profile_id is not None:
+            response.headers['X-Profile-Id'] = profile_id
+        response.headers[RULES_VERSION_HEADER] = get_active_snapshot().version
+        return response, status_code
+    
+    @app.route('/match-prompt', methods=['GET'])
+    def match_prompt_query():
+        """
+        GET endpoint for matching prompts by query parameters, for lookups without data.
+        
+        GET /match-prompt?situation=Commercial%20Auto&level=Structure&file_type=Summary%20Report
+        
+        Successful responses carry a strong ETag derived from the rules and
+        the query, so a request with a matching If-None-Match gets a 304
+        without being matched again.
+        """
+        started = time.perf_counter()
+        metrics = get_request_metrics()
+        etag = PromptController.query_etag(request.args, PromptController.response_mimetype())
+        if request.if_none_match.contains_weak(etag):
+            metrics.count("Not Modified")
+            return cacheable_response(Response(status=304), etag, 'Accept')
+        
+        response_data, status_code = PromptController.match_query(request.args)
+        response = negotiated_response(response_data, status_code)
+        response.headers[RULES_VERSION_HEADER] = get_active_snapshot().version
+        metrics.observe("total", time.perf_counter() - started)
+        metrics.count(PromptController.outcome_of(response_data))
+        if status_code != 200:
+            return response
+        return cacheable_response(response, etag, 'Accept')
+    
+    @app.route('/match-prompt/batch', methods=['POST'])
+    def match_prompt_batch():
+        """
+        POST endpoint for matching many prompts in one request.
+        
+        Accepts a JSON or MessagePack array of match requests, or an NDJSON
+        body (Content-Type: application/x-ndjson) with one request per line.
+        
+        Returns a JSON or MessagePack object with a "results" list, negotiated
+        like /match-prompt, or an NDJSON stream
+        when the input is NDJSON or the client sends
+        Accept: application/x-ndjson. Each result carries the item
+        "index" and the HTTP "status" it would have had on its own:
+        {"index": 0, "status": 200, "success": true, "prompt": "Prompt 1"}
+        """
+        response_data, status_code = PromptController.match_prompt_batch()
+        if isinstance(response_data, dict):
+            response = negotiated_response(response_data, status_code)
+        else:
+            lines = (json.dumps(result) + "\n" for result in response_data)
+            response = Response(
+                stream_with_context(lines),
+                status=status_code,
+                mimetype='application/x-ndjson'
+            )
+        response.headers[RULES_VERSION_HEADER] = get_active_snapshot().version
+        return response
+    
+    @app.route('/jobs', methods=['POST'])
+    def create_job():
+        """
+        POST endpoint for matching a prompt in the background.
+        
+        Takes the same body as /match-prompt and answers 202 Accepted with
+        {"success": true, "job_id": "...", "status": "queued"} and a
+        Location header to poll, or 503 when too many jobs are waiting.
+        """
+        queue = app.extensions.get('job_queue')
+        if queue is None:
+            abort(404)
+        return submit_job(queue)
+    
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        """
+        GET endpoint for the state of a background job.
+        
+        With ?wait=<seconds> the request is held until the job is done,
+        for at most JOBS_MAX_WAIT seconds. Returns
+        {"success": true, "job_id": "...", "status": "queued" | "running" | "done"}
+        plus "result" and "result_status" (what /match-prompt would have
+        answered) once done.
+        """
+        queue = app.extensions.get('job_queue')
+        if queue is None:
+            abort(404)
+        try:
+            wait = max(0.0, min(float(request.args.get('wait', 0)), app.config['JOBS_MAX_WAIT']))
+        except ValueError:
+            wait = 0.0
+        job = queue.wait(job_id, wait) if wait else queue.get(job_id)
+        if job is None:
+            return negotiated_response({
+                "success": False,
+                "error": "Not Found",
+                "message": "Unknown or expired job"
+            }, 404)
+        
+        response = negotiated_response({"success": True, **job}, 200)
+        if job["status"] != "done":
+            response.headers['Retry-After'] = '1'
+        return response
     
     @app.route('/health', methods=['GET'])
     def health_check():
@@ -54,23 +524,104 @@ def register_routes(app):
         response_data, status_code = PromptController.health_check()
         return jsonify(response_data), status_code
     
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Request counts per outcome, stage latency histograms, cache, admission, job and tenant counters in Prometheus text format."""
+        text = get_request_metrics().render()
+        for extension in ('response_cache', 'admission', 'job_queue', 'tenant_rules'):
+            if extension in app.extensions:
+                text += app.extensions[extension].render_metrics()
+        if app.config['METRICS_WORKER_LABEL']:
+            # Counters are per process; the label tells the workers' scrapes apart
+            text = add_label(text, 'worker', str(os.getpid()))
+        return Response(
+            text,
+            mimetype='text/plain',
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+    
+    @app.route('/profiles', methods=['GET'])
+    def list_profiles():
+        """Summaries of the most recent request profiles, newest first."""
+        profiler = app.extensions.get('request_profiler')
+        if profiler is None:
+            abort(404)
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify({"profiles": profiler.list_profiles(limit)}), 200
+    
+    @app.route('/profiles/<profile_id>', methods=['GET'])
+    def download_profile(profile_id):
+        """Download a request profile as a pstats file."""
+        profiler = app.extensions.get('request_profiler')
+        path = profiler.profile_path(profile_id) if profiler is not None else None
+        if path is None:
+            abort(404)
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True)
+    
     @app.route('/', methods=['GET'])
     def index():
-        """Root endpoint with API information."""
-        return jsonify({
-            "message": "Prompt Matching API",
-            "version": "1.0.0",
-            "endpoints": {
-                "POST /match-prompt": "Match a system prompt based on input criteria",
-                "GET /health": "Health check endpoint",
-                "GET /": "API information"
-            },
-            "supported_values": {
-                "situation": ["Commercial Auto", "General Liability", "Workers Compensation"],
-                "level": ["Structure", "Summarize"],
-                "file_type": ["Medical Records", "Deposition", "Summons", "Summary Report"]
-            }
-        }), 200
+        """Root endpoint with API information, revalidated with its ETag."""
+        etag = PromptController.api_info_etag()
+        if request.if_none_match.contains_weak(etag):
+            return cacheable_response(Response(status=304), etag)
+        response_data, status_code = PromptController.api_info()
+        return cacheable_response(jsonify(response_data), etag)
+    
+    # The same endpoints under /tenants/<tenant>/, matched against that tenant's rules
+    if app.config['TENANT_RULES_DIR']:
+        for url_rule in list(app.url_map.iter_rules()):
+            if url_rule.rule not in ('/match-prompt', '/match-prompt/batch', '/jobs', '/'):
+                continue
+            app.add_url_rule(
+                '/tenants/<tenant>' + url_rule.rule,
+                'tenant_' + url_rule.endpoint,
+                app.view_functions[url_rule.endpoint],
+                methods=url_rule.methods
+            )
+
+
+def negotiated_response(response_data, status_code):
+    """Encode a response as JSON or MessagePack, as the request negotiated."""
+    mimetype = PromptController.response_mimetype()
+    if mimetype == JSON_MIMETYPE:
+        response = jsonify(response_data)
+    else:
+        response = Response(encode_body(response_data, mimetype), mimetype=mimetype)
+    response.status_code = status_code
+    return response
+
+
+def cacheable_response(response, etag, *vary):
+    """
+    Mark a GET response as cacheable by clients and proxies.
+    
+    Args:
+        response: A 200 response, or a 304 for a request that already has it
+        etag: Its unquoted strong entity tag
+        vary: Request headers besides the tenant header the response depends on
+        
+    Returns:
+        The response
+    """
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['HTTP_CACHE_MAX_AGE']
+    if current_app.config['TENANT_RULES_DIR']:
+        vary += (current_app.config['TENANT_HEADER'],)
+    for header in vary:
+        response.vary.add(header)
+    return response
+
+
+def submit_job(queue):
+    """Queue the current request as a job and answer 202 with where to poll it."""
+    response_data, status_code = PromptController.submit_job(queue)
+    response = negotiated_response(response_data, status_code)
+    if status_code == 202:
+        response.headers['Location'] = f"/jobs/{response_data['job_id']}"
+    elif status_code == 503:
+        response.headers['Retry-After'] = '1'
+    return response
 
 
 def register_error_handlers(app):
@@ -94,6 +645,15 @@ def register_error_handlers(app):
             "message": "The requested method is not allowed for this endpoint"
         }), 405
     
+    @app.errorhandler(413)
+    def request_too_large(error):
+        """Handle 413 errors."""
+        return jsonify({
+            "success": False,
+            "error": "Request Too Large",
+            "message": f"Request body exceeds the limit of {app.config.get('MAX_CONTENT_LENGTH')} bytes"
+        }), 413
+    
     @app.errorhandler(500)
     def internal_error(error):
         """Handle 500 errors."""
@@ -0,0 +1,693 @@
+"""
+ASGI application and asyncio HTTP server.
+Serves /match-prompt (POST and GET), /health and / on an event loop with the same
+request and response contract as the Flask app.
+
+Usage:
+    python asgi.py --port 8000
+    uvicorn --factory asgi:create_asgi_app
+"""
+
+import argparse
+import asyncio
+import contextvars
+import functools
+import io
+import json
+import logging
+import mmap
+import tempfile
+import time
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from app import create_app, unknown_tenant, warm_up_requests
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_etags, quote_etag
+
+from services.lazy_json import LazyJSONError
+from services.metrics import get_request_metrics
+from services.msgpack_codec import MsgpackError
+from services.rule_store import get_active_snapshot, reset_snapshot, use_snapshot
+from services.tenant_rules import TenantRuleSets
+from views.compression import DecompressingReader, DecompressionError, request_encodings
+from views.encoding import encode_body, is_json_content_type, is_msgpack_content_type, response_mimetype
+from views.prompt_controller import RULES_VERSION_HEADER, PromptController
+from views.request_body import SpooledBody
+
+
+logger = logging.getLogger(__name__)
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+Headers = List[Tuple[bytes, bytes]]
+
+# Largest request line plus headers accepted by the server
+MAX_HEADER_BYTES = 64 * 1024
+
+# Largest unread request body skipped to keep a connection open
+MAX_DRAIN_BYTES = 64 * 1024
+
+# Seconds an idle keep-alive connection is kept open
+KEEP_ALIVE_TIMEOUT = 75.0
+
+# Smaller uncompressed bodies are parsed on the event loop, where that is
+# cheaper than handing them to a worker thread
+EXECUTOR_MIN_BYTES = 64 * 1024
+
+# Hexadecimal digits of a chunk-size line
+_HEX_DIGITS = frozenset(b"0123456789abcdefABCDEF")
+
+
+class AsgiPromptApp:
+    """
+    ASGI version of the Prompt Matching API.
+    
+    Request bodies are received without blocking the event loop, so a
+    slow client uploading a large data field only costs a suspended
+    coroutine instead of a thread. Parsing and matching reuse the
+    controller of the Flask app, so results, status codes and error
+    messages are the same.
+    """
+    
+    def __init__(self, config: Dict[str, Any], tenants: Optional[TenantRuleSets] = None):
+        """
+        Args:
+            config: The Flask app config (MAX_CONTENT_LENGTH, LAZY_JSON_* ...)
+            tenants: Tenant rule sets, None if tenants are disabled
+        """
+        self.config = config
+        self.tenants = tenants
+        self.tenant_header = config.get("TENANT_HEADER", "X-Tenant-Id").lower().encode("latin-1")
+        self.routes: Dict[str, Dict[str, Callable]] = {
+            "/match-prompt": {"POST": self.match_prompt, "GET": self.match_query},
+            "/health": {"GET": self.health_check},
+            "/": {"GET": self.index}
+        }
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        
+        # /tenants/<tenant>/... or the tenant header selects a tenant's rules
+        path, tenant, snapshot = scope["path"], None, None
+        if self.tenants is not None:
+            if path.startswith("/tenants/"):
+                tenant, _, path = path[len("/tenants/"):].partition("/")
+                path = "/" + path
+            tenant = tenant or self._header(scope, self.tenant_header) or None
+            snapshot = self.tenants.get(tenant) if tenant else None
+        
+        route = self.routes.get(path)
+        handler = None
+        if route is not None:
+            handler = route.get(scope["method"]) or (route.get("GET") if scope["method"] == "HEAD" else None)
+        if tenant and snapshot is None:
+            response = unknown_tenant(tenant), 404
+        elif route is None:
+            response = {
+                "success": False,
+                "error": "Not Found",
+                "message": "The requested endpoint does not exist"
+            }, 404
+        elif handler is None:
+            response = {
+                "success": False,
+                "error": "Method Not Allowed",
+                "message": "The requested method is not allowed for this endpoint"
+            }, 405
+        else:
+            # Context variables are per task, so the selection stays with this request
+            token = use_snapshot(snapshot)
+            try:
+                response = await handler(scope, receive)
+            except Exception:
+                logger.exception("Error handling %s", scope["path"])
+                response = {
+                    "success": False,
+                    "error": "Internal Server Error",
+                    "message": "An internal server error occurred"
+                }, 500
+            finally:
+                reset_snapshot(token)
+        
+        mimetype = response_mimetype(self._header(scope, b"accept"), self._header(scope, b"content-type"))
+        await self._send(send, mimetype, *response)
+    
+    async def match_prompt(self, scope: Scope, receive: Receive) -> Tuple[Dict[str, Any], int, Headers]:
+        """
+        Handle POST /match-prompt.
+        
+        Returns:
+            Tuple of (response_data, status_code, headers)
+        """
+        response_data, status_code = await self._match_body(scope, receive)
+        return response_data, status_code, [self._rules_version_header()]
+    
+    async def _match_body(self, scope: Scope, receive: Receive) -> Tuple[Dict[str, Any], int]:
+        """Read, parse and match a POST /match-prompt body."""
+        try:
+            content_type = self._header(scope, b"content-type")
+            msgpack = is_msgpack_content_type(content_type)
+            if not is_json_content_type(content_type) and not msgpack:
+                return {
+                    "success": False,
+                    "error": "Missing Data",
+                    "message": "Request must contain JSON data"
+                }, 400
+            
+            content_encoding = self._header(scope, b"content-encoding").strip().lower()
+            if content_encoding not in ("", "identity") and content_encoding not in request_encodings():
+                return {
+                    "success": False,
+                    "error": "Unsupported Media Type",
+                    "message": f"Content-Encoding {content_encoding!r} is not supported"
+                }, 415
+            
+            body = await self._read_body(receive)
+            try:
+                encoded = content_encoding not in ("", "identity")
+                if not encoded and not body.spooled and len(body.buffer) < EXECUTOR_MIN_BYTES:
+                    return self._process_body(scope, body, content_encoding, msgpack)
+                # Decompressing and scanning a large body would stall every
+                # other connection; the worker thread keeps the selected rules
+                return await asyncio.get_running_loop().run_in_executor(
+                    None, contextvars.copy_context().run,
+                    self._process_body, scope, body, content_encoding, msgpack
+                )
+            finally:
+                body.close()
+        
+        except MsgpackError:
+            return {
+                "success": False,
+                "error": "Missing Data",
+                "message": "Invalid MessagePack format"
+            }, 400
+        except (json.JSONDecodeError, LazyJSONError, UnicodeDecodeError):
+            return {
+                "success": False,
+                "error": "Missing Data",
+                "message": "Invalid JSON format"
+            }, 400
+        except DecompressionError as e:
+            return {
+                "success": False,
+                "error": "Missing Data",
+                "message": f"Invalid compressed body: {e}"
+            }, 400
+        except RequestEntityTooLarge:
+            return {
+                "success": False,
+                "error": "Request Too Large",
+                "message": f"Request body exceeds the limit of {self.config.get('MAX_CONTENT_LENGTH')} bytes"
+            }, 413
+        except Exception as e:
+            return {
+                "success": False,
+                "error": "Internal Error",
+                "message": f"An unexpected error occurred: {str(e)}"
+            }, 500
+    
+    async def match_query(self, scope: Scope, receive: Receive) -> Tuple[Optional[Dict[str, Any]], int, Headers]:
+        """
+        Handle GET /match-prompt.
+        
+        Returns:
+            Tuple of (response_data, status_code, headers); the data is
+            None for a 304 Not Modified
+        """
+        args = MultiDict(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+        mimetype = response_mimetype(self._header(scope, b"accept"), self._header(scope, b"content-type"))
+        etag = PromptController.query_etag(args, mimetype)
+        headers = self._cache_headers(etag, "Accept")
+        if parse_etags(self._header(scope, b"if-none-match")).contains_weak(etag):
+            return None, 304, headers
+        response_data, status_code = PromptController.match_query(args)
+        return response_data, status_code, (headers if status_code == 200 else []) + [self._rules_version_header()]
+    
+    async def health_check(self, scope: Scope, receive: Receive) -> Tuple[Dict[str, Any], int]:
+        """Handle GET /health."""
+        return PromptController.health_check()
+    
+    async def index(self, scope: Scope, receive: Receive) -> Tuple[Optional[Dict[str, Any]], int, Headers]:
+        """Handle GET /, answering 304 when the client's ETag is current."""
+        etag = PromptController.api_info_etag()
+        headers = self._cache_headers(etag)
+        if parse_etags(self._header(scope, b"if-none-match")).contains_weak(etag):
+            return None, 304, headers
+        return (*PromptController.api_info(), headers)
+    
+    @staticmethod
+    def _rules_version_header() -> Tuple[bytes, bytes]:
+        """Build the header reporting the version of the rules the request was matched against."""
+        return RULES_VERSION_HEADER.lower().encode("ascii"), get_active_snapshot().version.encode("utf-8")
+    
+    def _cache_headers(self, etag: str, *vary: str) -> Headers:
+        """Build the ETag, Cache-Control and Vary headers of a cacheable GET response."""
+        if self.tenants is not None:
+            vary += (self.config.get("TENANT_HEADER", "X-Tenant-Id"),)
+        headers = [
+            (b"etag", quote_etag(etag).encode("ascii")),
+            (b"cache-control", f"public, max-age={self.config.get('HTTP_CACHE_MAX_AGE', 60)}".encode("ascii"))
+        ]
+        if vary:
+            headers.append((b"vary", ", ".join(vary).encode("latin-1")))
+        return headers
+    
+    def _process_body(self, scope: Scope, body: SpooledBody, content_encoding: str,
+                      msgpack: bool) -> Tuple[Dict[str, Any], int]:
+        """
+        Decompress, decode and match a received body.
+        
+        Bodies are decoded the way the Flask app decodes them: those it
+        spools (unknown or above BODY_SPOOL_THRESHOLD size, or compressed)
+        are scanned in place, the others are parsed in full unless
+        LAZY_JSON_PARSING applies. Matching runs before the body is
+        closed, since lazily decoded fields still point into it.
+        """
+        threshold = self.config.get("BODY_SPOOL_THRESHOLD")
+        spool = threshold is not None and (
+            not self._header(scope, b"content-length").isdigit()
+            or int(self._header(scope, b"content-length")) > threshold
+        )
+        decoded = body
+        if content_encoding not in ("", "identity"):
+            raw = body.buffer if body.spooled else io.BytesIO(body.buffer)
+            decoded = SpooledBody.read(
+                DecompressingReader(raw, content_encoding, self.config.get("MAX_CONTENT_LENGTH")),
+                threshold or 0,
+                self.config.get("MAX_CONTENT_LENGTH"),
+                self.config.get("BODY_SPOOL_DIR")
+            )
+            spool = threshold is not None
+        try:
+            if msgpack:
+                request_data = PromptController.scan_msgpack(decoded.buffer)
+            elif spool:
+                request_data = PromptController.parse_spooled(decoded)
+            else:
+                request_data = self._parse_body(decoded.buffer)
+            return PromptController.process_data(request_data)
+        finally:
+            if decoded is not body:
+                decoded.close()
+    
+    def _parse_body(self, body: bytes) -> Any:
+        """Decode a match request body, scanning large ones lazily when enabled."""
+        if not body:
+            return None
+        if (self.config.get("LAZY_JSON_PARSING")
+                and len(body) >= self.config.get("LAZY_JSON_MIN_BYTES", 0)):
+            try:
+                return PromptController.scan_fields(body)
+            except LazyJSONError:
+                pass
+        return json.loads(body)
+    
+    async def _read_body(self, receive: Receive) -> SpooledBody:
+        """
+        Receive the whole request body with bounded memory.
+        
+        Like SpooledBody.read, the body is kept in memory up to
+        BODY_SPOOL_THRESHOLD bytes and written to a memory-mapped
+        temporary file beyond that; the file is written by a worker
+        thread.
+        
+        Raises:
+            RequestEntityTooLarge: If the body is larger than MAX_CONTENT_LENGTH
+        """
+        threshold = self.config.get("BODY_SPOOL_THRESHOLD")
+        max_size = self.config.get("MAX_CONTENT_LENGTH")
+        loop = asyncio.get_running_loop()
+        memory = bytearray()
+        spool_file = None
+        size = 0
+        try:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    raise ConnectionResetError("Client disconnected")
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise RequestEntityTooLarge()
+                
+                if spool_file is not None:
+                    await loop.run_in_executor(None, spool_file.write, chunk)
+                elif threshold is not None and size > threshold:
+                    # Move what has been received so far to disk
+                    memory += chunk
+                    spool_file = await loop.run_in_executor(
+                        None, functools.partial(tempfile.TemporaryFile, dir=self.config.get("BODY_SPOOL_DIR"))
+                    )
+                    await loop.run_in_executor(None, spool_file.write, memory)
+                    memory = bytearray()
+                else:
+                    memory += chunk
+                
+                if not message.get("more_body", False):
+                    break
+            
+            if spool_file is None:
+                return SpooledBody(bytes(memory))
+            await loop.run_in_executor(None, spool_file.flush)
+            return SpooledBody(mmap.mmap(spool_file.fileno(), 0, access=mmap.ACCESS_READ), spool_file)
+        except BaseException:
+            if spool_file is not None:
+                spool_file.close()
+            raise
+    
+    @staticmethod
+    def _header(scope: Scope, name: bytes) -> str:
+        """Get a request header as a string, empty if absent."""
+        for key, value in scope["headers"]:
+            if key == name:
+                return value.decode("latin-1")
+        return ""
+    
+    @staticmethod
+    async def _send(send: Send, mimetype: str, data: Optional[Dict[str, Any]], status_code: int,
+                    headers: Headers = ()) -> None:
+        """Send a JSON or MessagePack response, or a bodiless one for data None."""
+        if data is None:
+            body, content_headers = b"", []
+        else:
+            body = encode_body(data, mimetype)
+            content_headers = [
+                (b"content-type", mimetype.encode("ascii")),
+                (b"content-length", str(len(body)).encode("ascii"))
+            ]
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": content_headers + list(headers)
+        })
+        await send({"type": "http.response.body", "body": body})
+    
+    async def warm_up(self) -> None:
+        """
+        Send the warm-up requests through the app.
+        
+        Like the warm-up of the Flask app, this sets up what the first
+        real request would otherwise pay for; the requests are not
+        counted in the metrics.
+        """
+        started = time.perf_counter()
+        for method, path, query_string, body in warm_up_requests():
+            scope = {
+                "type": "http",
+                "http_version": "1.1",
+                "method": method,
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode("latin-1"),
+                "query_string": query_string.encode("latin-1"),
+                "root_path": "",
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1"))
+                ],
+                "server": None,
+                "client": None
+            }
+            messages = [{"type": "http.request", "body": body, "more_body": False}]
+            statuses = []
+            
+            async def receive() -> Dict[str, Any]:
+                return messages.pop() if messages else {"type": "http.disconnect"}
+            
+            async def send(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    statuses.append(message["status"])
+            
+            await self(scope, receive, send)
+            if not statuses or statuses[0] >= 500:
+                logger.warning("Warm-up request %s %s failed with status %s", method, path, statuses)
+        get_request_metrics().reset()
+        logger.info("Warmed up in %.1f ms", (time.perf_counter() - started) * 1000)
+    
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        """Warm up if enabled before reporting startup complete; the rules are loaded by create_asgi_app."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.config.get("WARM_UP_ENABLED"):
+                    await self.warm_up()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def create_asgi_app(config=None) -> AsgiPromptApp:
+    """
+    Application factory for the ASGI app.
+    
+    Uses the same config defaults, overrides and rule store setup as
+    create_app. With WARM_UP_ENABLED the app warms up in its lifespan
+    startup instead of create_app.
+    
+    Args:
+        config: Optional mapping of config values overriding the defaults
+    """
+    app = create_app(config, warm_up=False)
+    return AsgiPromptApp(dict(app.config), app.extensions.get('tenant_rules'))
+
+
+class HTTPConnection:
+    """
+    One HTTP/1.1 client connection served by an ASGI app.
+    
+    Handles keep-alive, Content-Length and chunked request bodies. The
+    body is handed to the app chunk by chunk as it arrives, so waiting
+    for a slow upload only suspends this connection's coroutine.
+    """
+    
+    def __init__(self, app: Callable, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.app = app
+        self.reader = reader
+        self.writer = writer
+        self.server = writer.get_extra_info("sockname")
+        self.client = writer.get_extra_info("peername")
+    
+    async def serve(self) -> None:
+        """Serve requests until the client or server closes the connection."""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        self.reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT
+                    )
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._write_error(431)
+                    return
+                
+                request = self._parse_head(head)
+                if request is None:
+                    await self._write_error(400)
+                    return
+                if not await self._handle(*request):
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.writer.close()
+    
+    def _parse_head(self, head: bytes) -> Optional[Tuple[str, str, str, List[Tuple[bytes, bytes]]]]:
+        """Parse the request line and headers; None if malformed."""
+        lines = head[:-4].split(b"\r\n")
+        try:
+            method, target, version = lines[0].decode("latin-1").split(" ")
+            headers = []
+            for line in lines[1:]:
+                name, value = line.split(b":", 1)
+                headers.append((name.strip().lower(), value.strip()))
+        except ValueError:
+            return None
+        if not version.startswith("HTTP/1."):
+            return None
+        return method, target, version, headers
+    
+    async def _handle(self, method: str, target: str, version: str,
+                      headers: List[Tuple[bytes, bytes]]) -> bool:
+        """Run one request through the app; returns whether to keep the connection."""
+        header_map = dict(headers)
+        connection = header_map.get(b"connection", b"").lower()
+        keep_alive = connection != b"close" if version == "HTTP/1.1" else connection == b"keep-alive"
+        chunked = b"chunked" in header_map.get(b"transfer-encoding", b"").lower()
+        content_length = header_map.get(b"content-length", b"0")
+        if not chunked and not content_length.isdigit():
+            await self._write_error(400)
+            return False
+        remaining = 0 if chunked else int(content_length)
+        
+        path, _, query = target.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": version[5:],
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode("latin-1"),
+            "query_string": query.encode("latin-1"),
+            "root_path": "",
+            "headers": headers,
+            "server": self.server,
+            "client": self.client
+        }
+        
+        body_done = not chunked and remaining == 0
+        request_complete = False
+        malformed = False
+        
+        async def receive() -> Dict[str, Any]:
+            nonlocal remaining, body_done, request_complete, malformed
+            if request_complete:
+                return {"type": "http.disconnect"}
+            if body_done:
+                chunk = b""
+            elif chunked:
+                try:
+                    chunk = await self._read_chunk()
+                except ValueError:
+                    # Answered with 400 once the app returns
+                    malformed = request_complete = True
+                    return {"type": "http.disconnect"}
+                body_done = not chunk
+            else:
+                chunk = await self.reader.read(min(remaining, 64 * 1024))
+                if not chunk:
+                    raise ConnectionResetError("Client disconnected")
+                remaining -= len(chunk)
+                body_done = remaining == 0
+            request_complete = body_done
+            return {"type": "http.request", "body": chunk, "more_body": not body_done}
+        
+        response_started = False
+        
+        async def send(message: Dict[str, Any]) -> None:
+            nonlocal response_started, keep_alive
+            if malformed and not response_started:
+                return
+            if message["type"] == "http.response.start":
+                # The next request starts after this body: a large unread
+                # rest (e.g. after a 413) is not worth reading to reuse
+                # the connection
+                if not body_done and (chunked or remaining > MAX_DRAIN_BYTES):
+                    keep_alive = False
+                status = message["status"]
+                lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n".encode("latin-1")]
+                lines.extend(name + b": " + value + b"\r\n" for name, value in message.get("headers", []))
+                if not keep_alive:
+                    lines.append(b"connection: close\r\n")
+                lines.append(b"\r\n")
+                self.writer.write(b"".join(lines))
+                response_started = True
+            elif message["type"] == "http.response.body":
+                if method != "HEAD":
+                    self.writer.write(message.get("body", b""))
+                if not message.get("more_body", False):
+                    await self.writer.drain()
+        
+        await self.app(scope, receive, send)
+        if malformed and not response_started:
+            await self._write_error(400)
+            return False
+        if not response_started:
+            await self._write_error(500)
+            return False
+        if malformed:
+            # The response went out before the body turned out malformed
+            return False
+        
+        # Skip the unread rest of the body before the next request
+        while keep_alive and not request_complete:
+            await receive()
+        return keep_alive
+    
+    async def _read_chunk(self) -> bytes:
+        """
+        Read one chunk of a chunked body; empty at the end.
+        
+        Raises:
+            ValueError: If the chunk framing is malformed
+        """
+        size_line = await self.reader.readuntil(b"\r\n")
+        size_field = size_line.split(b";", 1)[0].strip()
+        if not size_field or not _HEX_DIGITS.issuperset(size_field):
+            raise ValueError(f"Invalid chunk size {size_field!r}")
+        size = int(size_field, 16)
+        if size == 0:
+            # Skip trailers
+            while await self.reader.readuntil(b"\r\n") != b"\r\n":
+                pass
+            return b""
+        chunk = await self.reader.readexactly(size)
+        if await self.reader.readexactly(2) != b"\r\n":
+            raise ValueError("Chunk data is not followed by CRLF")
+        return chunk
+    
+    async def _write_error(self, status: int) -> None:
+        """Write a bare error response and let the connection close."""
+        self.writer.write(
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"content-length: 0\r\nconnection: close\r\n\r\n".encode("latin-1")
+        )
+        await self.writer.drain()
+
+
+async def serve(app: Callable, host: str = "0.0.0.0", port: int = 8000, backlog: int = 2048) -> None:
+    """
+    Serve an ASGI app with asyncio until cancelled.
+    
+    Args:
+        app: The ASGI application
+        host: Interface to listen on
+        port: Port to listen on
+        backlog: Listen backlog for bursts of new connections
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await HTTPConnection(app, reader, writer).serve()
+    
+    server = await asyncio.start_server(handle, host, port, backlog=backlog, limit=MAX_HEADER_BYTES)
+    logger.info("Listening on %s:%s", host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None) -> None:
+    """Parse command line arguments and run the asyncio server."""
+    parser = argparse.ArgumentParser(description="Run the Prompt Matching API on an asyncio event loop")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--warm-up", action="store_true",
+                        help="Warm up the app before listening (WARM_UP_ENABLED)")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = create_asgi_app({"WARM_UP_ENABLED": True} if args.warm_up else None)
+    
+    async def run() -> None:
+        # Warm up before listening, as the lifespan startup does under uvicorn
+        if app.config["WARM_UP_ENABLED"]:
+            await app.warm_up()
+        await serve(app, args.host, args.port)
+    
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark for the WSGI fast path of /match-prompt.
+Calls the WSGI app directly, so only the per-request CPU cost of Flask
+versus FastPathMiddleware is measured, without any network I/O.
+
+Run from the repository root:
+    python -m benchmarks.bench_fast_path
+"""
+
+import io
+import json
+from typing import Any, Callable, Dict
+
+from app import create_app
+from benchmarks.bench_matcher import CASES, time_per_call
+
+
+def build_environ(data: Dict[str, Any]) -> Callable[[], Dict[str, Any]]:
+    """Return a factory of fresh WSGI environs for a POST /match-prompt of data."""
+    body = json.dumps(data).encode("utf-8")
+    template = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": "/match-prompt",
+        "SCRIPT_NAME": "",
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.url_scheme": "http",
+        "wsgi.errors": io.StringIO(),
+        "wsgi.multithread": False,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False
+    }
+    return lambda: dict(template, **{"wsgi.input": io.BytesIO(body)})
+
+
+def call_app(app: Callable, environ: Dict[str, Any]) -> bytes:
+    """Run one request through a WSGI app and return the response body."""
+    chunks = app(environ, lambda status, headers, exc_info=None: None)
+    try:
+        return b"".join(chunks)
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def main():
+    """Run the benchmark and print time per request."""
+    flask_app = create_app({"RULES_RELOAD_INTERVAL": 0})
+    fast_app = create_app({"RULES_RELOAD_INTERVAL": 0, "FAST_PATH_ENABLED": True})
+    
+    print(f"{'case':<24}{'flask us':>10}{'fast path us':>14}{'speedup':>9}")
+    print("-" * 57)
+    
+    for name, data in CASES.items():
+        new_environ = build_environ(data)
+        assert call_app(flask_app, new_environ()) == call_app(fast_app, new_environ())
+        
+        flask_us = time_per_call(lambda: call_app(flask_app, new_environ())) / 1000
+        fast_us = time_per_call(lambda: call_app(fast_app, new_environ())) / 1000
+        print(f"{name:<24}{flask_us:>10.1f}{fast_us:>14.1f}{flask_us / fast_us:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark of the file_type inference model.
+Trains FileTypeModel on a synthetic corpus and measures its holdout
+accuracy and the per-document cost of scoring documents one at a time
+versus in batches, for several document sizes.
+
+Run from the repository root:
+    python -m benchmarks.bench_file_type [--documents 400]
+"""
+
+import argparse
+import random
+import time
+from typing import List, Tuple
+
+from services.file_type_model import FileTypeModel
+from services.rule_store import get_rule_store
+
+
+# Words typical of each file type, mixed with COMMON_WORDS into documents
+CLASS_WORDS = {
+    "Medical Records": "patient diagnosis dosage mg physician chart vitals prescribed "
+                       "symptoms treatment clinic admitted discharge radiology lab",
+    "Deposition": "Q. A. witness counsel objection sworn testimony examination "
+                  "exhibit record deponent attorney recess stenographer",
+    "Summons": "summoned hereby court plaintiff defendant answer within days "
+               "default judgment served clerk complaint notice appear",
+    "Summary Report": "summary findings overview conclusion recommendations report "
+                      "key points analysis results period highlights"
+}
+COMMON_WORDS = (
+    "the of and to in that is was for on with as by at from this be are have not "
+    "claim policy insured vehicle accident date incident information provided"
+).split()
+
+
+def synthetic_corpus(per_class: int, words: int, seed: int = 0) -> Tuple[List[str], List[str]]:
+    """
+    Build documents that use their type's words one time in twenty.
+    
+    Args:
+        per_class: Documents per file type
+        words: Words per document
+        seed: Random seed
+        
+    Returns:
+        Tuple of (documents, labels)
+    """
+    rng = random.Random(seed)
+    texts, labels = [], []
+    for label, vocabulary in CLASS_WORDS.items():
+        class_words = vocabulary.split()
+        for _ in range(per_class):
+            texts.append(" ".join(
+                rng.choice(class_words) if rng.random() < 0.05 else rng.choice(COMMON_WORDS)
+                for _ in range(words)
+            ))
+            labels.append(label)
+    return texts, labels
+
+
+def main():
+    """Train on a synthetic corpus and print accuracy and scoring costs."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--documents", type=int, default=400, help="Training documents per file type")
+    args = parser.parse_args()
+    
+    classes = next(d for d in get_rule_store().snapshot.dimensions if d.name == "file_type").values
+    texts, labels = synthetic_corpus(args.documents, 300)
+    started = time.perf_counter()
+    model = FileTypeModel.train(texts, labels, classes)
+    print(f"Trained on {len(texts)} documents in {time.perf_counter() - started:.1f}s")
+    
+    test_texts, test_labels = synthetic_corpus(100, 300, seed=1)
+    predictions = model.predict(test_texts)
+    correct = sum(label == expected for (label, _), expected in zip(predictions, test_labels))
+    print(f"Holdout accuracy: {correct / len(test_texts):.1%}")
+    print()
+    
+    print(f"{'document':>10}{'single µs/doc':>15}{'batch of 256 µs/doc':>21}")
+    print("-" * 46)
+    for words in (20, 300, 3000):
+        documents, _ = synthetic_corpus(64, words, seed=2)
+        documents = documents * 4
+        
+        started = time.perf_counter()
+        for document in documents:
+            model.predict([document])
+        single = (time.perf_counter() - started) / len(documents)
+        
+        started = time.perf_counter()
+        model.predict(documents)
+        batched = (time.perf_counter() - started) / len(documents)
+        
+        size = sum(len(document) for document in documents) // len(documents)
+        print(f"{size:>8} B{single * 1e6:>15.0f}{batched * 1e6:>21.0f}")
+
+
+if __name__ == "__main__":
+    main()
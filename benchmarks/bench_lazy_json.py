@@ -0,0 +1,74 @@
+"""
+Benchmark for lazy JSON scanning of match request bodies.
+Compares a full json.loads of the body with scan_object, which decodes
+only the routing fields, for several sizes of the data field.
+
+Run from the repository root:
+    python -m benchmarks.bench_lazy_json
+"""
+
+import itertools
+import json
+import tracemalloc
+from typing import Any, Callable
+
+from benchmarks.bench_matcher import time_per_call
+from services.lazy_json import scan_object
+
+
+ROUTING_FIELDS = frozenset(["situation", "level", "file_type"])
+
+# Sizes of the data field in bytes
+DATA_SIZES = [1_000, 100_000, 1_000_000, 5_000_000]
+
+
+# Document texts: ordinary prose, and text with a quoted phrase on every line
+TEXTS = {
+    "prose": (
+        "The claimant was seen in the emergency department on the day of the "
+        "accident and reported lower back pain radiating to the left leg. "
+        "Imaging showed no fracture. Follow-up was scheduled in two weeks.\n"
+    ) * 3 + 'Claimant stated "I felt it right away."\n',
+    "quote-heavy": 'Patient reported "lower back pain" after the accident.\n'
+}
+
+
+def build_body(text: str, data_size: int) -> bytes:
+    """Build a match request body whose data field holds data_size characters of text."""
+    data = (text * (data_size // len(text) + 1))[:data_size]
+    return json.dumps({
+        "situation": "Workers Compensation",
+        "level": "Structure",
+        "file_type": "Medical Records",
+        "data": data
+    }).encode("utf-8")
+
+
+def peak_memory(func: Callable[[], Any]) -> int:
+    """Return the peak traced memory in bytes while running func."""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    """Run the benchmark and print time and peak memory per body size."""
+    print(f"{'text':<13}{'data bytes':>11}{'json.loads us':>15}{'scan us':>10}{'speedup':>9}"
+          f"{'json.loads peak':>17}{'scan peak':>11}")
+    print("-" * 86)
+    
+    for (text_name, text), data_size in itertools.product(TEXTS.items(), DATA_SIZES):
+        body = build_body(text, data_size)
+        full = lambda: json.loads(body)
+        lazy = lambda: scan_object(body, ROUTING_FIELDS)
+        
+        full_us = time_per_call(full, repeat=3) / 1000
+        lazy_us = time_per_call(lazy, repeat=3) / 1000
+        print(f"{text_name:<13}{data_size:>11}{full_us:>15.1f}{lazy_us:>10.1f}{full_us / lazy_us:>8.1f}x"
+              f"{peak_memory(full):>17}{peak_memory(lazy):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark for the wildcard and priority rule engine.
+Shows that lookup latency stays flat as the number of rules grows,
+while a linear scan over the rules grows with it.
+
+Run from the repository root:
+    python -m benchmarks.bench_rule_engine
+"""
+
+import random
+import time
+from typing import Any, Dict, List
+
+from benchmarks.bench_matcher import time_per_call
+from services.compiled_matcher import CompiledPromptMatcher
+from services.rules import RuleSet
+
+
+# Synthetic dimensions: 4 fields with 20 values each (160,000 combinations)
+DIMENSIONS = [
+    {"name": f"field_{position}", "values": [f"value_{value}" for value in range(20)]}
+    for position in range(4)
+]
+
+RULE_COUNTS = [5, 100, 1000, 10000, 100000]
+
+# Linear scans beyond this many rules take too long to be worth timing
+MAX_LINEAR_RULES = 10000
+
+
+def build_rule_data(rule_count: int, seed: int = 42) -> Dict[str, Any]:
+    """
+    Build the contents of a rule file of random rules with wildcards and priorities.
+    
+    Args:
+        rule_count: Number of rules
+        seed: Random seed, so every run benchmarks the same rules
+        
+    Returns:
+        The rule file as a JSON object
+    """
+    rng = random.Random(seed)
+    rules = []
+    for position in range(rule_count):
+        rule: Dict[str, Any] = {"prompt": f"Prompt {position}", "priority": rng.randint(0, 9)}
+        for dimension in DIMENSIONS:
+            # About one condition in five is a wildcard
+            if rng.random() < 0.8:
+                rule[dimension["name"]] = rng.choice(dimension["values"])
+        rules.append(rule)
+    return {"version": str(rule_count), "dimensions": DIMENSIONS, "rules": rules}
+
+
+def build_rule_set(rule_count: int, seed: int = 42) -> RuleSet:
+    """
+    Build a rule set of random rules with wildcards and priorities.
+    
+    Args:
+        rule_count: Number of rules
+        seed: Random seed, so every run benchmarks the same rules
+        
+    Returns:
+        The rule set
+    """
+    return RuleSet.from_dict(build_rule_data(rule_count, seed))
+
+
+def build_requests(count: int = 256, seed: int = 7) -> List[Dict[str, str]]:
+    """Build random request bodies over the synthetic dimensions."""
+    rng = random.Random(seed)
+    return [
+        dict({d["name"]: rng.choice(d["values"]) for d in DIMENSIONS}, data="test data")
+        for _ in range(count)
+    ]
+
+
+def main():
+    """Run the benchmark and print latency per rule count."""
+    requests = build_requests()
+    
+    print(f"{'rules':>8}{'compile s':>11}{'matcher ns':>12}{'tree ns':>10}{'linear ns':>12}")
+    print("-" * 53)
+    
+    for rule_count in RULE_COUNTS:
+        rules = build_rule_set(rule_count)
+        
+        started = time.perf_counter()
+        matcher = CompiledPromptMatcher(rules)
+        compile_seconds = time.perf_counter() - started
+        
+        keys = [[request[d["name"]] for d in DIMENSIONS] for request in requests]
+        ordinal_keys = [[int(value.split("_")[1]) for value in key] for key in keys]
+        
+        def run_matcher():
+            for request in requests:
+                matcher.process_request(request)
+        
+        def run_tree():
+            for key in ordinal_keys:
+                matcher.tree.lookup(key)
+        
+        def run_linear():
+            for key in keys:
+                rules.match(key)
+        
+        matcher_ns = time_per_call(run_matcher, repeat=3) / len(requests)
+        tree_ns = time_per_call(run_tree, repeat=3) / len(requests)
+        linear = "-"
+        if rule_count <= MAX_LINEAR_RULES:
+            linear = f"{time_per_call(run_linear, repeat=1) / len(requests):.0f}"
+        
+        print(f"{rule_count:>8}{compile_seconds:>11.2f}{matcher_ns:>12.0f}{tree_ns:>10.0f}{linear:>12}")
+
+
+if __name__ == "__main__":
+    main()
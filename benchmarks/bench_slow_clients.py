@@ -0,0 +1,194 @@
+"""
+Benchmark of the Flask and ASGI servers under many slow clients.
+Slow clients upload a large data field a few bytes at a time while fast
+clients send small match requests over keep-alive connections; the
+throughput and latency of the fast clients show how well each server
+copes with connections that are waiting on their body.
+
+Run from the repository root:
+    python -m benchmarks.bench_slow_clients [--slow 1000] [--fast 32] [--duration 5]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import resource
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+PORT = 8765
+
+FAST_BODY = json.dumps({
+    "situation": "Commercial Auto",
+    "level": "Structure",
+    "file_type": "Summary Report",
+    "data": "test data"
+}).encode("utf-8")
+
+# Size of the body each slow client uploads over the whole run
+SLOW_BODY_BYTES = 64 * 1024
+
+
+def run_flask(port: int) -> None:
+    """Serve the Flask app with the threaded development server (one thread per connection)."""
+    from werkzeug.serving import WSGIRequestHandler, run_simple
+    
+    from app import create_app
+    
+    WSGIRequestHandler.log_request = lambda *args, **kwargs: None
+    run_simple("127.0.0.1", port, create_app({"RULES_RELOAD_INTERVAL": 0}), threaded=True)
+
+
+def run_asgi(port: int) -> None:
+    """Serve the ASGI app on one asyncio event loop."""
+    from asgi import create_asgi_app, serve
+    
+    asyncio.run(serve(create_asgi_app({"RULES_RELOAD_INTERVAL": 0}), "127.0.0.1", port))
+
+
+SERVERS = {"flask": run_flask, "asgi": run_asgi}
+
+
+def request_bytes(body: bytes, length: int = None) -> bytes:
+    """Build the head of a keep-alive POST /match-prompt request."""
+    return (
+        b"POST /match-prompt HTTP/1.1\r\nHost: localhost\r\n"
+        b"Content-Type: application/json\r\n"
+        b"Content-Length: " + str(len(body) if length is None else length).encode() + b"\r\n\r\n"
+    )
+
+
+async def read_response(reader: asyncio.StreamReader) -> Tuple[int, bool]:
+    """Read one response and return its status code and whether the connection stays open."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    keep_alive = True
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"connection" and value.strip().lower() == b"close":
+            keep_alive = False
+    await reader.readexactly(length)
+    return int(head.split(b" ", 2)[1]), keep_alive
+
+
+async def slow_client(port: int, duration: float, stats: Dict[str, int]) -> None:
+    """Upload one large body in small pieces spread over the run."""
+    prefix = b'{"situation":"Commercial Auto","level":"Structure","file_type":"Summary Report","data":"'
+    body = prefix + b"x" * (SLOW_BODY_BYTES - len(prefix) - 2) + b'"}'
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request_bytes(body))
+        pieces = 50
+        piece = len(body) // pieces + 1
+        for start in range(0, len(body), piece):
+            writer.write(body[start:start + piece])
+            await writer.drain()
+            await asyncio.sleep(duration / pieces)
+        status, _ = await read_response(reader)
+        if status == 200:
+            stats["slow_ok"] += 1
+        writer.close()
+    except (OSError, asyncio.IncompleteReadError):
+        stats["slow_errors"] += 1
+
+
+async def fast_client(port: int, deadline: float, latencies: List[float], stats: Dict[str, int]) -> None:
+    """Send small requests back to back, reusing the connection when the server allows it."""
+    message = request_bytes(FAST_BODY) + FAST_BODY
+    try:
+        writer = None
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(message)
+            status, keep_alive = await asyncio.wait_for(read_response(reader), 10)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                stats["fast_errors"] += 1
+            if not keep_alive:
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+    except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+        stats["fast_errors"] += 1
+
+
+async def run_load(port: int, slow: int, fast: int, duration: float) -> Dict[str, float]:
+    """Run slow and fast clients against a server and summarize the fast ones."""
+    stats = {"slow_ok": 0, "slow_errors": 0, "fast_errors": 0}
+    latencies: List[float] = []
+    
+    slow_tasks = [asyncio.create_task(slow_client(port, duration, stats)) for _ in range(slow)]
+    # Let the slow clients occupy their connections first
+    await asyncio.sleep(min(1.0, duration / 4))
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        fast_client(port, started + duration, latencies, stats) for _ in range(fast)
+    ))
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*slow_tasks)
+    
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else float("nan"),
+        **stats
+    }
+
+
+def wait_for_port(port: int, timeout: float = 10.0) -> None:
+    """Wait until a server accepts connections."""
+    import socket
+    
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def main():
+    """Run the load against each server and print a comparison."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--slow", type=int, default=1000, help="Slow uploading clients")
+    parser.add_argument("--fast", type=int, default=32, help="Fast keep-alive clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of load")
+    args = parser.parse_args()
+    
+    # Each slow client needs a socket on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, 4 * args.slow + 1024)), hard))
+    
+    print(f"{args.slow} slow clients uploading {SLOW_BODY_BYTES // 1024} KiB over {args.duration:g}s, "
+          f"{args.fast} fast keep-alive clients")
+    print(f"{'server':<8}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'fast err':>10}{'slow ok':>9}{'slow err':>10}")
+    print("-" * 64)
+    
+    for name, target in SERVERS.items():
+        server = multiprocessing.Process(target=target, args=(PORT,), daemon=True)
+        server.start()
+        try:
+            wait_for_port(PORT)
+            result = asyncio.run(run_load(PORT, args.slow, args.fast, args.duration))
+        finally:
+            server.terminate()
+            server.join()
+        
+        print(f"{name:<8}{result['rps']:>9.0f}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+              f"{result['fast_errors']:>10}{result['slow_ok']:>9}{result['slow_errors']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Startup benchmark.
+Starts the app in fresh processes and measures the import time,
+create_app, the time from spawning the process to its first response
+and the latency of the first requests, with and without a prebuilt rule
+snapshot and warm-up, and compares them with a committed baseline.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup                   # compare with the baseline
+    python -m benchmarks.bench_startup --save-baseline   # record a new baseline
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.bench_rule_engine import DIMENSIONS, build_rule_data
+from services.rule_snapshot import compile_rules, save_snapshot, snapshot_key
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "bench_startup_baseline.json")
+
+# Repository root, the working directory of the server processes
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rules in the synthetic large rule file
+LARGE_RULE_COUNT = 10000
+
+# Seconds a started process may take to listen
+START_TIMEOUT = 30.0
+
+DEFAULT_BODY = json.dumps({
+    "situation": "Commercial Auto",
+    "level": "Structure",
+    "file_type": "Summary Report",
+    "data": "test data"
+}).encode("utf-8")
+
+LARGE_BODY = json.dumps(dict(
+    {dimension["name"]: dimension["values"][1] for dimension in DIMENSIONS},
+    data="test data"
+)).encode("utf-8")
+
+# Measurements compared with the baseline, all in milliseconds
+TRACKED = ("import_ms", "first_response_ms")
+
+# Run by each server process, so nothing but the app is imported before the clock starts
+SERVE_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(json.loads(sys.argv[1]))
+created = time.perf_counter()
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+WSGIRequestHandler.log_request = lambda *args, **kwargs: None
+server = make_server("127.0.0.1", 0, app)
+print(json.dumps({
+    "port": server.server_port,
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000
+}), flush=True)
+server.serve_forever()
+"""
+
+
+def post(port: int, body: bytes) -> float:
+    """POST a match request on a new connection; returns the seconds until the response was read."""
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=START_TIMEOUT)
+    try:
+        connection.request("POST", "/match-prompt", body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"Unexpected status {response.status}")
+    finally:
+        connection.close()
+    return time.perf_counter() - started
+
+
+def start(config: Dict[str, Any], body: bytes) -> Dict[str, float]:
+    """
+    Start a server process and time its startup and first requests.
+    
+    Args:
+        config: Config values passed to create_app
+        body: Match request sent once the server listens
+        
+    Returns:
+        Timings in milliseconds
+    """
+    spawned = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, "-c", SERVE_SCRIPT, json.dumps(config)],
+        stdout=subprocess.PIPE,
+        cwd=ROOT,
+        text=True
+    )
+    try:
+        line = child.stdout.readline()
+        if not line:
+            raise RuntimeError("Server process exited before listening")
+        listening = time.perf_counter()
+        result = json.loads(line)
+        first_request = post(result["port"], body)
+        answered = time.perf_counter()
+        steady = statistics.median(post(result["port"], body) for _ in range(20))
+    finally:
+        child.kill()
+        child.wait()
+    return {
+        "import_ms": result["import_ms"],
+        "create_app_ms": result["create_app_ms"],
+        "ready_ms": (listening - spawned) * 1000,
+        "first_response_ms": (answered - spawned) * 1000,
+        "first_request_ms": first_request * 1000,
+        "steady_request_ms": steady * 1000
+    }
+
+
+def build_scenarios(directory: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Write the rule files and snapshots of the benchmarked scenarios.
+    
+    Args:
+        directory: Directory for the generated files
+        
+    Returns:
+        Scenarios keyed by name, each with the create_app config and the request body
+    """
+    large_rules = os.path.join(directory, "large_rules.json")
+    with open(large_rules, "w", encoding="utf-8") as rule_file:
+        json.dump(build_rule_data(LARGE_RULE_COUNT), rule_file)
+    
+    # Prebuild the large snapshot, as a deployment would with services.rule_snapshot
+    large_snapshot = os.path.join(directory, "large_rules.snapshot")
+    with open(large_rules, "rb") as rule_file:
+        rule_bytes = rule_file.read()
+    save_snapshot(large_snapshot, snapshot_key(rule_bytes), compile_rules(rule_bytes))
+    
+    base = {"RULES_RELOAD_INTERVAL": 0}
+    fast = dict(base, WARM_UP_ENABLED=True)
+    return {
+        "default": {"config": base, "body": DEFAULT_BODY},
+        "default+warm-up": {"config": fast, "body": DEFAULT_BODY},
+        f"{LARGE_RULE_COUNT}-rules": {
+            "config": dict(base, RULES_PATH=large_rules),
+            "body": LARGE_BODY
+        },
+        f"{LARGE_RULE_COUNT}-rules+snapshot+warm-up": {
+            "config": dict(fast, RULES_PATH=large_rules, RULES_SNAPSHOT_PATH=large_snapshot),
+            "body": LARGE_BODY
+        }
+    }
+
+
+def measure(scenario: Dict[str, Any], runs: int) -> Dict[str, float]:
+    """Start a scenario several times and take the median of each timing."""
+    samples: List[Dict[str, float]] = [start(scenario["config"], scenario["body"]) for _ in range(runs)]
+    return {name: round(statistics.median(sample[name] for sample in samples), 2) for name in samples[0]}
+
+
+def compare(name: str, result: Dict[str, float], baseline: Optional[Dict[str, float]],
+            tolerance: float) -> List[str]:
+    """
+    Compare the tracked timings of a scenario with its baseline.
+    
+    Args:
+        name: Scenario name
+        result: This run's timings
+        baseline: The baseline timings, None if there are none
+        tolerance: Allowed relative increase
+        
+    Returns:
+        Descriptions of the regressions
+    """
+    if baseline is None:
+        return []
+    return [
+        f"{name}: {metric} {result[metric]} ms > baseline {baseline[metric]} ms"
+        for metric in TRACKED
+        if metric in baseline and result[metric] > baseline[metric] * (1 + tolerance)
+    ]
+
+
+def main():
+    """Run the scenarios and compare with, or record, the baseline."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Record this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative increase of a timing")
+    parser.add_argument("--runs", type=int, default=5, help="Process starts per scenario")
+    parser.add_argument("--filter", default="", help="Only run scenarios whose name contains this")
+    args = parser.parse_args()
+    
+    baseline: Dict[str, Any] = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        machine = baseline.get("machine", {})
+        if machine.get("python") != platform.python_version() or machine.get("platform") != platform.platform():
+            print(f"Note: baseline recorded on {machine}; timings may not be comparable")
+    
+    columns = ("import_ms", "create_app_ms", "ready_ms", "first_response_ms", "first_request_ms", "steady_request_ms")
+    print(f"{'scenario':<36}" + "".join(f"{column[:-3]:>18}" for column in columns))
+    print("-" * (36 + 18 * len(columns)))
+    
+    results: Dict[str, Dict[str, float]] = {}
+    regressions = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, scenario in build_scenarios(directory).items():
+            if args.filter not in name:
+                continue
+            result = results[name] = measure(scenario, args.runs)
+            reference = baseline.get("scenarios", {}).get(name, {})
+            print(f"{name:<36}" + "".join(
+                f"{result[column]:>10.2f}" + (f" ({reference[column]:>5.1f})" if column in reference else " " * 8)
+                for column in columns
+            ))
+            regressions.extend(compare(name, result, reference or None, args.tolerance))
+    print("Milliseconds, median of each timing; baseline in parentheses")
+    
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump({
+                "machine": {"python": platform.python_version(), "platform": platform.platform()},
+                "scenarios": {
+                    name: {metric: result[metric] for metric in TRACKED} for name, result in results.items()
+                }
+            }, baseline_file, indent=2)
+            baseline_file.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return
+    
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
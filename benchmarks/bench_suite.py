@@ -0,0 +1,189 @@
+"""
+Microbenchmark suite for the service and controller layers.
+Measures PromptMatchingService.validate_input, match_prompt and
+process_request, and PromptController.match_prompt through Flask's test
+client, on the valid-match, missing-field, invalid-value and large-data
+paths, and compares ops/sec and allocations with a committed baseline.
+
+Run from the repository root:
+    python -m benchmarks.bench_suite                   # compare with the baseline
+    python -m benchmarks.bench_suite --save-baseline   # record a new baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+from typing import Any, Callable, Dict, Optional
+
+from app import create_app
+from benchmarks.bench_matcher import allocations_per_call, time_per_call
+from services.prompt_service import PromptMatchingService
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "bench_suite_baseline.json")
+
+# Size of the data field of the large-data case; below BODY_SPOOL_THRESHOLD
+LARGE_DATA_BYTES = 512 * 1024
+
+# Request bodies for each benchmarked path
+CASES: Dict[str, Dict[str, Any]] = {
+    "valid-match": {
+        "situation": "Commercial Auto",
+        "level": "Structure",
+        "file_type": "Summary Report",
+        "data": "test data"
+    },
+    "missing-field": {
+        "level": "Structure",
+        "file_type": "Summary Report",
+        "data": "test data"
+    },
+    "invalid-value": {
+        "situation": "Invalid Situation",
+        "level": "Structure",
+        "file_type": "Summary Report",
+        "data": "test data"
+    },
+    "large-data": {
+        "situation": "Commercial Auto",
+        "level": "Structure",
+        "file_type": "Summary Report",
+        "data": "x" * LARGE_DATA_BYTES
+    }
+}
+
+
+def expect_errors(func: Callable[[], Any]) -> Callable[[], Any]:
+    """Wrap a call that raises ValueError on some paths, like its callers do."""
+    def call():
+        try:
+            return func()
+        except ValueError as e:
+            return e
+    return call
+
+
+def build_benchmarks() -> Dict[str, Callable[[], Any]]:
+    """
+    Build the benchmarked calls.
+    
+    Returns:
+        Zero-argument callables keyed by "function/case"
+    """
+    client = create_app({"RULES_RELOAD_INTERVAL": 0}).test_client()
+    
+    benchmarks = {}
+    for case, data in CASES.items():
+        benchmarks[f"validate_input/{case}"] = expect_errors(
+            lambda data=data: PromptMatchingService.validate_input(data)
+        )
+    for case, data in CASES.items():
+        if "situation" in data:
+            # match_prompt takes the fields as arguments, so it has no missing-field path
+            benchmarks[f"match_prompt/{case}"] = expect_errors(
+                lambda data=data: PromptMatchingService.match_prompt(
+                    data["situation"], data["level"], data["file_type"]
+                )
+            )
+    for case, data in CASES.items():
+        benchmarks[f"process_request/{case}"] = (
+            lambda data=data: PromptMatchingService.process_request(data)
+        )
+    for case, data in CASES.items():
+        body = json.dumps(data).encode("utf-8")
+        benchmarks[f"controller/{case}"] = (
+            lambda body=body: client.post("/match-prompt", data=body, content_type="application/json")
+        )
+    return benchmarks
+
+
+def measure(func: Callable[[], Any]) -> Dict[str, float]:
+    """Measure ops/sec and net allocations per call of a benchmark."""
+    return {
+        "ops_per_sec": round(1e9 / time_per_call(func)),
+        # Warm-up effects only ever add blocks, so the fewest is the steady state
+        "allocs_per_call": round(min(allocations_per_call(func, calls=500) for _ in range(3)), 1)
+    }
+
+
+def compare(name: str, result: Dict[str, float], baseline: Optional[Dict[str, float]],
+            tolerance: float) -> Optional[str]:
+    """
+    Compare a result with its baseline.
+    
+    Args:
+        name: Benchmark name
+        result: This run's measurements
+        baseline: The baseline measurements, None if there are none
+        tolerance: Allowed relative drop in ops/sec
+        
+    Returns:
+        A description of the regression, or None
+    """
+    if baseline is None:
+        return None
+    if result["ops_per_sec"] < baseline["ops_per_sec"] * (1 - tolerance):
+        return f"{name}: {result['ops_per_sec']} ops/s < baseline {baseline['ops_per_sec']}"
+    # Allocation counts barely vary between runs, so any real increase is flagged
+    if result["allocs_per_call"] > baseline["allocs_per_call"] * 1.05 + 0.5:
+        return f"{name}: {result['allocs_per_call']} allocs/call > baseline {baseline['allocs_per_call']}"
+    return None
+
+
+def main():
+    """Run the suite and compare with, or record, the baseline."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Record this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative drop in ops/sec")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    args = parser.parse_args()
+    
+    baseline: Dict[str, Any] = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        machine = baseline.get("machine", {})
+        if machine.get("python") != platform.python_version() or machine.get("platform") != platform.platform():
+            print(f"Note: baseline recorded on {machine}; ops/sec may not be comparable")
+    
+    print(f"{'benchmark':<32}{'ops/s':>12}{'baseline':>12}{'change':>9}{'allocs':>9}{'baseline':>10}")
+    print("-" * 84)
+    
+    results: Dict[str, Dict[str, float]] = {}
+    regressions = []
+    for name, func in build_benchmarks().items():
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(func)
+        reference = baseline.get("benchmarks", {}).get(name)
+        if reference:
+            change = f"{result['ops_per_sec'] / reference['ops_per_sec'] - 1:+.0%}"
+            print(f"{name:<32}{result['ops_per_sec']:>12}{reference['ops_per_sec']:>12}{change:>9}"
+                  f"{result['allocs_per_call']:>9}{reference['allocs_per_call']:>10}")
+        else:
+            print(f"{name:<32}{result['ops_per_sec']:>12}{'-':>12}{'':>9}{result['allocs_per_call']:>9}{'-':>10}")
+        regression = compare(name, result, reference, args.tolerance)
+        if regression:
+            regressions.append(regression)
+    
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump({
+                "machine": {"python": platform.python_version(), "platform": platform.platform()},
+                "benchmarks": results
+            }, baseline_file, indent=2)
+            baseline_file.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return
+    
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Replay of captured /match-prompt traffic.
+Sends the requests of a capture file (see CAPTURE_PATH) to a live server
+or to the in-process app at a fixed rate and concurrency, reports the
+throughput and latency percentiles and can fail the run when they
+regress past a stored baseline.
+
+Run from the repository root:
+    python -m benchmarks.replay capture.ndjson [--url http://localhost:5000]
+        [--rate 500] [--concurrency 8] [--requests 10000 | --duration 30]
+        [--baseline benchmarks/replay_baseline.json [--save-baseline]] [--tolerance 0.2]
+"""
+
+import argparse
+import http.client
+import io
+import itertools
+import json
+import math
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from services.capture import read_capture
+
+
+# Percentiles reported, as (result key, quantile)
+PERCENTILES = (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99), ("p999_ms", 0.999))
+
+
+class HTTPTarget:
+    """Sends requests to a live server over one keep-alive connection per thread."""
+    
+    def __init__(self, url: str):
+        """
+        Args:
+            url: Base URL of the server, http or https
+            
+        Raises:
+            ValueError: If the URL scheme is not http or https
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme: {url!r}")
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if self.https else 80)
+        self.path = parts.path.rstrip("/") + "/match-prompt"
+        self._local = threading.local()
+    
+    def send(self, entry: Dict[str, Any]) -> int:
+        """Send one captured request and return the response status."""
+        try:
+            return self._post(entry)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # The server closed an idle keep-alive connection; retry once on a new one
+            self._close()
+            return self._post(entry)
+    
+    def _post(self, entry: Dict[str, Any]) -> int:
+        """POST a captured body on this thread's connection."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            connection = self._local.connection = connection_class(self.host, self.port, timeout=30)
+        connection.request("POST", self.path, body=entry["body"],
+                           headers={"Content-Type": entry.get("ct") or "application/json"})
+        response = connection.getresponse()
+        response.read()
+        if response.getheader("Connection", "").lower() == "close":
+            self._close()
+        return response.status
+    
+    def _close(self) -> None:
+        """Close this thread's connection."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+        self._local.connection = None
+
+
+class InProcessTarget:
+    """Calls the WSGI app of an in-process Flask app, without any network I/O."""
+    
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        from app import create_app
+        
+        self.app = create_app({"RULES_RELOAD_INTERVAL": 0, **(config or {})}).wsgi_app
+    
+    def send(self, entry: Dict[str, Any]) -> int:
+        """Send one captured request and return the response status."""
+        body = entry["body"]
+        environ = {
+            "REQUEST_METHOD": "POST",
+            "PATH_INFO": "/match-prompt",
+            "SCRIPT_NAME": "",
+            "QUERY_STRING": "",
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "CONTENT_TYPE": entry.get("ct") or "",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.url_scheme": "http",
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False
+        }
+        statuses = []
+        chunks = self.app(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            for _ in chunks:
+                pass
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+        return int(statuses[-1][:3])
+
+
+def run_replay(target: Any, entries: List[Dict[str, Any]], rate: float, concurrency: int,
+               requests: Optional[int] = None, duration: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Replay captured requests against a target.
+    
+    With a rate, request i is due at start + i / rate and its latency is
+    measured from that moment, so time spent queued behind slow requests
+    counts (no coordinated omission). Without a rate every worker sends
+    back to back.
+    
+    Args:
+        target: HTTPTarget or InProcessTarget
+        entries: Captured requests, cycled through in order
+        rate: Requests per second, 0 for as fast as possible
+        concurrency: Number of sending threads
+        requests: Number of requests to send
+        duration: Seconds to send for, instead of a request count
+        
+    Returns:
+        The results: counts, throughput and latency percentiles
+    """
+    if requests is None and duration is None:
+        requests = len(entries)
+    counter = itertools.count()
+    latencies: List[List[float]] = [[] for _ in range(concurrency)]
+    stats = [{"errors": 0, "mismatches": 0} for _ in range(concurrency)]
+    started = time.perf_counter()
+    deadline = started + duration if duration is not None else math.inf
+    
+    def worker(own_latencies: List[float], own_stats: Dict[str, int]) -> None:
+        while True:
+            index = next(counter)
+            if requests is not None and index >= requests:
+                return
+            due = started + index / rate if rate else time.perf_counter()
+            if due >= deadline:
+                return
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            entry = entries[index % len(entries)]
+            try:
+                status = target.send(entry)
+            except (OSError, http.client.HTTPException):
+                own_stats["errors"] += 1
+                continue
+            own_latencies.append(time.perf_counter() - due)
+            if entry.get("status") is not None and status != entry["status"]:
+                own_stats["mismatches"] += 1
+    
+    threads = [
+        threading.Thread(target=worker, args=(latencies[number], stats[number]), daemon=True)
+        for number in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    samples = sorted(itertools.chain.from_iterable(latencies))
+    results: Dict[str, Any] = {
+        "requests": len(samples),
+        "errors": sum(own["errors"] for own in stats),
+        "mismatches": sum(own["mismatches"] for own in stats),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(samples) / elapsed, 1) if elapsed else 0.0
+    }
+    for key, quantile in PERCENTILES:
+        results[key] = round(percentile(samples, quantile) * 1000, 3)
+    return results
+
+
+def percentile(samples: List[float], quantile: float) -> float:
+    """Nearest-rank percentile of sorted samples; NaN when there are none."""
+    if not samples:
+        return float("nan")
+    return samples[min(len(samples) - 1, max(math.ceil(quantile * len(samples)) - 1, 0))]
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compare results against a baseline.
+    
+    Args:
+        results: Results of this run
+        baseline: Stored results of a reference run
+        tolerance: Allowed relative regression, e.g. 0.2 for 20%
+        
+    Returns:
+        Descriptions of the regressions, empty if there are none
+    """
+    regressions = []
+    if "throughput" in baseline and results["throughput"] < baseline["throughput"] * (1 - tolerance):
+        regressions.append(f"throughput {results['throughput']:.1f} req/s < baseline {baseline['throughput']:.1f}")
+    for key, _ in PERCENTILES:
+        if key in baseline and not results[key] <= baseline[key] * (1 + tolerance):
+            regressions.append(f"{key} {results[key]:.3f} > baseline {baseline[key]:.3f}")
+    for key in ("errors", "mismatches"):
+        if results[key] > baseline.get(key, 0):
+            regressions.append(f"{key} {results[key]} > baseline {baseline.get(key, 0)}")
+    return regressions
+
+
+def parse_config(values: List[str]) -> Dict[str, Any]:
+    """Parse KEY=VALUE app config overrides; values are JSON where they parse as JSON."""
+    config = {}
+    for value in values:
+        key, _, raw = value.partition("=")
+        try:
+            config[key] = json.loads(raw)
+        except ValueError:
+            config[key] = raw
+    return config
+
+
+def main():
+    """Replay a capture and print, store or check the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("capture", help="Capture file written by CAPTURE_PATH")
+    parser.add_argument("--url", help="Base URL of a live server; the in-process app if omitted")
+    parser.add_argument("--config", action="append", default=[], metavar="KEY=VALUE",
+                        help="App config override for the in-process app, e.g. FAST_PATH_ENABLED=true")
+    parser.add_argument("--rate", type=float, default=0.0, help="Requests per second, 0 for unlimited")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent senders")
+    parser.add_argument("--requests", type=int, help="Requests to send (default: the capture once)")
+    parser.add_argument("--duration", type=float, help="Seconds to send for, instead of --requests")
+    parser.add_argument("--baseline", help="Baseline results JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+    
+    entries = list(read_capture(args.capture))
+    if not entries:
+        parser.error(f"{args.capture} holds no requests")
+    if args.url:
+        try:
+            target = HTTPTarget(args.url)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        target = InProcessTarget(parse_config(args.config))
+    
+    results = run_replay(target, entries, args.rate, args.concurrency, args.requests, args.duration)
+    print(f"{results['requests']} requests in {results['seconds']:.2f}s: {results['throughput']:.1f} req/s, "
+          f"{results['errors']} errors, {results['mismatches']} status mismatches")
+    print("  ".join(f"{key[:-3]} {results[key]:.3f} ms" for key, _ in PERCENTILES))
+    
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"Within {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""
+Python client for the Prompt Matching API.
+
+PromptClient (threads) and AsyncPromptClient (asyncio) keep pooled
+keep-alive connections, batch concurrent calls into /match-prompt/batch
+requests and cache matched prompts per rules version.
+"""
+
+from client.async_client import AsyncPromptClient
+from client.base import PromptClientError
+from client.cache import ResultCache
+from client.sync_client import PromptClient
+
+__all__ = ["AsyncPromptClient", "PromptClient", "PromptClientError", "ResultCache"]
@@ -0,0 +1,288 @@
+"""
+Asyncio client.
+Matches prompts over pooled keep-alive connections on the event loop,
+batching the calls of concurrent tasks.
+"""
+
+import asyncio
+import ssl
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from client.base import RULES_VERSION_HEADER, BaseClient, PromptClientError
+
+
+class AsyncConnection:
+    """One keep-alive HTTP/1.1 connection on asyncio streams."""
+    
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+    
+    @classmethod
+    async def open(cls, host: str, port: int, https: bool) -> "AsyncConnection":
+        """Connect to a server."""
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl.create_default_context() if https else None)
+        return cls(reader, writer)
+    
+    async def request(self, method: str, path: str, body: bytes,
+                      headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Send a request and read its response.
+        
+        Returns:
+            Tuple of (status, headers with lower-case names, body)
+        """
+        lines = [f"{method} {path} HTTP/1.1"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        lines.append(f"Content-Length: {len(body)}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+        
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split(b" ", 2)[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+                if size == 0:
+                    # Skip trailers
+                    while await self.reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            data = b"".join(chunks)
+        elif "content-length" in response_headers:
+            data = await self.reader.readexactly(int(response_headers["content-length"]))
+        else:
+            # Delimited by the end of the connection
+            data = await self.reader.read()
+            self.closed = True
+        
+        if response_headers.get("connection", "").lower() == "close":
+            self.closed = True
+        return status, response_headers, data
+    
+    def close(self) -> None:
+        """Close the connection."""
+        self.closed = True
+        self.writer.close()
+
+
+class AsyncPromptClient(BaseClient):
+    """
+    Asyncio client of the Prompt Matching API.
+    
+    Example:
+        async with AsyncPromptClient("http://localhost:5000") as client:
+            result = await client.match("Commercial Auto", "Structure", "Summary Report", data)
+            
+    A client belongs to the event loop it is first used on.
+    """
+    
+    def __init__(self, base_url: str = "http://localhost:5000", **options: Any):
+        """
+        Args:
+            base_url: URL of the API
+            options: Settings, see BaseClient
+        """
+        super().__init__(base_url, **options)
+        self._idle: List[AsyncConnection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending: List[Tuple[bytes, Any, asyncio.Future]] = []
+        self._in_flight = 0
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def match(self, situation: Optional[str], level: Optional[str], file_type: Optional[str] = None,
+                    data: Any = "", **fields: Any) -> Dict[str, Any]:
+        """
+        Match a prompt.
+        
+        Args:
+            situation: The situation
+            level: The level
+            file_type: The file type, None to have the server infer it from data
+            data: The document data
+            fields: Further fields and options, e.g. render=True
+            
+        Returns:
+            The /match-prompt response, with "success" and "prompt" or "error"
+            
+        Raises:
+            PromptClientError: If the server cannot be reached
+        """
+        return await self.match_request(self.build_request(situation, level, file_type, data, fields))
+    
+    async def match_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Match a prompt for a request object as POSTed to /match-prompt.
+        
+        Args:
+            request: The request object
+            
+        Returns:
+            The /match-prompt response; results from the cache are shared,
+            so do not modify them
+            
+        Raises:
+            PromptClientError: If the server cannot be reached
+        """
+        result, key = self.cached(request)
+        if result is not None:
+            return result
+        body = self.encode(request)
+        if not self.batch_window or not self.batch_endpoint or len(body) > self.max_batch_bytes:
+            return await self._send_one(body, key)
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((body, key, future))
+        if len(self._pending) >= self.max_batch or (len(self._pending) == 1 and not self._in_flight):
+            # A full batch, or an idle client: send without waiting
+            self._flush()
+        elif len(self._pending) == 1:
+            # Collect the calls made during the window
+            loop.call_later(self.batch_window, self._flush)
+        return await future
+    
+    async def match_many(self, requests: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Match prompts for many request objects in bulk requests.
+        
+        Args:
+            requests: The request objects
+            
+        Returns:
+            The responses, in order
+            
+        Raises:
+            PromptClientError: If the server cannot be reached
+        """
+        requests = list(requests)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        misses = []
+        for index, request in enumerate(requests):
+            results[index], key = self.cached(request)
+            if results[index] is None:
+                misses.append((index, self.encode(request), key))
+        for (index, _, _), result in zip(misses, await self._send([(body, key) for _, body, key in misses])):
+            results[index] = result
+        return results
+    
+    async def aclose(self) -> None:
+        """Close the pooled connections."""
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+    
+    async def __aenter__(self) -> "AsyncPromptClient":
+        return self
+    
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+    
+    def _flush(self) -> None:
+        """Send the pending calls in a task of their own, so a cancelled caller does not strand the others."""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self._in_flight += 1
+        task = asyncio.ensure_future(self._dispatch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _dispatch(self, batch: List[Tuple[bytes, Any, asyncio.Future]]) -> None:
+        """Send a batch of pending calls, counted in flight by _flush, and resolve their futures."""
+        try:
+            results = await self._send([(body, key) for body, key, _ in batch])
+        except asyncio.CancelledError:
+            for _, _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._in_flight -= 1
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+    
+    async def _send(self, items: List[Tuple[bytes, Any]]) -> List[Dict[str, Any]]:
+        """POST encoded requests in concurrent batches, see BaseClient.batches, and cache the results."""
+        responses = await asyncio.gather(*(self._send_batch(batch) for batch in self.batches(items)))
+        return [result for results in responses for result in results]
+    
+    async def _send_batch(self, items: List[Tuple[bytes, Any]]) -> List[Dict[str, Any]]:
+        """POST several requests to /match-prompt/batch, or each to /match-prompt, and cache the results."""
+        if len(items) > 1 and self.batch_endpoint:
+            status, headers, body = await self._request(
+                "/match-prompt/batch", self.batch_body([body for body, _ in items])
+            )
+            if not self.batch_rejected(status, body):
+                data = self.decode(status, body)
+                if not self.lacks_batch_endpoint(status, data):
+                    results = self.split_batch(status, data, len(items))
+                    version = headers.get(RULES_VERSION_HEADER.lower())
+                    for (_, key), result in zip(items, results):
+                        self.remember(key, result, version)
+                    return results
+        return list(await asyncio.gather(*(self._send_one(body, key) for body, key in items)))
+    
+    async def _send_one(self, body: bytes, key: Any) -> Dict[str, Any]:
+        """POST one encoded request to /match-prompt and cache the result."""
+        status, headers, body = await self._request("/match-prompt", body)
+        result = self.decode(status, body)
+        self.remember(key, result, headers.get(RULES_VERSION_HEADER.lower()))
+        return result
+    
+    async def _request(self, path: str, body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        POST a body on a pooled connection, retrying once if a reused one was closed by the server.
+        
+        Raises:
+            PromptClientError: If the request fails
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            reused = connection is not None
+            while True:
+                try:
+                    if connection is None:
+                        connection = await asyncio.wait_for(
+                            AsyncConnection.open(self.host, self.port, self.https), self.timeout
+                        )
+                    response = await asyncio.wait_for(
+                        connection.request("POST", self.prefix + path, body, self.headers), self.timeout
+                    )
+                    break
+                except (asyncio.IncompleteReadError, ConnectionResetError, BrokenPipeError) as e:
+                    if connection is not None:
+                        connection.close()
+                    connection = None
+                    if not reused:
+                        raise PromptClientError(f"Request to {self.host}:{self.port} failed: {e}") from e
+                    reused = False
+                except (OSError, ValueError, asyncio.TimeoutError, asyncio.LimitOverrunError) as e:
+                    if connection is not None:
+                        connection.close()
+                    raise PromptClientError(f"Request to {self.host}:{self.port} failed: {e!r}") from e
+            
+            if connection.closed:
+                connection.close()
+            else:
+                self._idle.append(connection)
+            return response
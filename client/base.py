@@ -0,0 +1,184 @@
+"""
+Client base.
+Settings, request encoding and response decoding shared by the sync and
+asyncio clients.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from client.cache import ResultCache
+
+
+# Response header reporting the rules version a request was matched against
+RULES_VERSION_HEADER = "X-Rules-Version"
+
+# Header selecting a tenant's rules
+TENANT_HEADER = "X-Tenant-Id"
+
+
+class PromptClientError(Exception):
+    """Raised when the server cannot be reached or sends an unreadable response."""
+
+
+class BaseClient:
+    """
+    Settings and protocol helpers of the Prompt Matching API clients.
+    
+    Calls made while another request is in flight are held for up to
+    batch_window seconds and sent together as one /match-prompt/batch
+    request of at most max_batch items and max_batch_bytes bytes; a call
+    made while the client is idle is sent at once, so sequential callers
+    never wait. Calls are encoded before they are queued, so one that
+    cannot be encoded only fails its own caller, and a call larger than
+    max_batch_bytes is sent on its own. Against a server without the
+    batch endpoint, or when it rejects a batch as a whole, every call is
+    sent on its own.
+    """
+    
+    def __init__(self, base_url: str = "http://localhost:5000", tenant: Optional[str] = None,
+                 headers: Optional[Dict[str, str]] = None, timeout: float = 30.0, pool_size: int = 10,
+                 batch_window: float = 0.002, max_batch: int = 100, max_batch_bytes: int = 1024 * 1024,
+                 cache_ttl: float = 60.0, cache_size: int = 10000):
+        """
+        Args:
+            base_url: URL of the API, e.g. http://localhost:5000 or https://host/tenants/acme
+            tenant: Tenant whose rules requests are matched against, None for the default rules
+            headers: Extra headers sent with every request, e.g. X-Client-Id
+            timeout: Seconds to wait for the server
+            pool_size: Connections kept open and used at once
+            batch_window: Seconds concurrent calls are collected into one batch, 0 disables batching
+            max_batch: Calls sent in one batch at most
+            max_batch_bytes: Encoded size of one batch at most
+            cache_ttl: Seconds a matched prompt is reused, 0 disables the cache
+            cache_size: Results kept in the cache
+        """
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme: {base_url!r}")
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if self.https else 80)
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_batch_bytes = max_batch_bytes
+        self.cache = ResultCache(cache_size, cache_ttl) if cache_ttl > 0 else None
+        # Cleared once the server turns out not to serve /match-prompt/batch, like asgi.py
+        self.batch_endpoint = True
+        self.headers = {
+            "Host": parts.netloc,
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        if tenant is not None:
+            self.headers[TENANT_HEADER] = tenant
+        self.headers.update(headers or {})
+    
+    @staticmethod
+    def build_request(situation: Optional[str], level: Optional[str], file_type: Optional[str],
+                      data: Any, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a match request object, leaving out fields given as None."""
+        request = {"situation": situation, "level": level, "file_type": file_type, "data": data, **fields}
+        return {name: value for name, value in request.items() if value is not None}
+    
+    def cached(self, request: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Any]:
+        """Look a request up in the cache; returns (result or None, cache key or None)."""
+        if self.cache is None:
+            return None, None
+        key = ResultCache.key_of(request)
+        return (self.cache.get(key) if key is not None else None), key
+    
+    def remember(self, key: Any, result: Dict[str, Any], version: Optional[str]) -> None:
+        """Cache a result if it can be reused, and note the rules version it came from."""
+        if self.cache is None:
+            return
+        if key is not None and ResultCache.is_cacheable(result):
+            self.cache.put(key, result, version)
+        else:
+            self.cache.observe_version(version)
+    
+    @staticmethod
+    def encode(data: Any) -> bytes:
+        """Encode a request body."""
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
+    
+    @staticmethod
+    def decode(status: int, body: bytes) -> Dict[str, Any]:
+        """
+        Decode a response body.
+        
+        Raises:
+            PromptClientError: If the body is not a JSON object
+        """
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            raise PromptClientError(f"Unexpected response with status {status}: {body[:200]!r}")
+        return data
+    
+    def batches(self, items: List[Tuple[bytes, Any]]) -> List[List[Tuple[bytes, Any]]]:
+        """
+        Group encoded calls into batches of at most max_batch calls and max_batch_bytes bytes.
+        
+        Args:
+            items: Tuples of (encoded request, cache key), in order
+            
+        Returns:
+            The batches, in order; a call larger than max_batch_bytes is a batch of its own
+        """
+        batches: List[List[Tuple[bytes, Any]]] = []
+        size = 0
+        for item in items:
+            # One byte per call for the separating comma or a bracket
+            if (not batches or len(batches[-1]) >= self.max_batch
+                    or size + len(item[0]) + 1 > self.max_batch_bytes):
+                batches.append([])
+                size = 1
+            batches[-1].append(item)
+            size += len(item[0]) + 1
+        return batches
+    
+    @staticmethod
+    def batch_body(bodies: List[bytes]) -> bytes:
+        """Join encoded requests into a /match-prompt/batch body."""
+        return b"[" + b",".join(bodies) + b"]"
+    
+    @staticmethod
+    def batch_rejected(status: int, body: bytes) -> bool:
+        """Check whether a batch failed as a whole (e.g. too large), so its calls are worth sending on their own."""
+        if status not in (400, 413):
+            return False
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return True
+        return not isinstance(data, dict) or not isinstance(data.get("results"), list)
+    
+    def lacks_batch_endpoint(self, status: int, data: Dict[str, Any]) -> bool:
+        """Check whether a batch response says the endpoint does not exist, and stop batching if so."""
+        if status == 404 and data.get("error") == "Not Found":
+            self.batch_endpoint = False
+        return not self.batch_endpoint
+    
+    @staticmethod
+    def split_batch(status: int, data: Dict[str, Any], size: int) -> List[Dict[str, Any]]:
+        """
+        Split a /match-prompt/batch response into the results of single calls.
+        
+        Raises:
+            PromptClientError: If the batch as a whole failed
+        """
+        results = data.get("results")
+        if not isinstance(results, list) or len(results) != size:
+            raise PromptClientError(f"Batch request failed with status {status}: {data}")
+        # Drop the batch bookkeeping so results look like /match-prompt responses
+        return [
+            {name: value for name, value in result.items() if name not in ("index", "status")}
+            for result in sorted(results, key=lambda result: result["index"])
+        ]
@@ -0,0 +1,138 @@
+"""
+Client result cache.
+Keeps match results in memory for a limited time, per version of the
+server's rules, so repeated lookups do not reach the server.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class ResultCache:
+    """
+    Thread-safe TTL cache of match results in LRU order.
+    
+    Results are stored under the rules version reported by the server
+    (the X-Rules-Version response header). Once a response reports
+    another version every cached result is dropped, so a rule change is
+    picked up by the first request that reaches the server; until then
+    results are served for at most ttl seconds.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl: float = 60.0):
+        """
+        Args:
+            max_entries: Results kept
+            ttl: Seconds a result is served from the cache
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version: Optional[str] = None
+        self._entries: "OrderedDict[Hashable, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0}
+    
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached result.
+        
+        Args:
+            key: The result key, see key_of
+            
+        Returns:
+            The result, or None if it is not cached or has expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self._counts["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counts["hits"] += 1
+            return entry[1]
+    
+    def put(self, key: Hashable, result: Dict[str, Any], version: Optional[str]) -> None:
+        """
+        Cache a result.
+        
+        Args:
+            key: The result key, see key_of
+            result: The match result
+            version: Rules version of the response the result came from
+        """
+        with self._lock:
+            self._observe(version)
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def observe_version(self, version: Optional[str]) -> None:
+        """
+        Note the rules version of a response, dropping the results of any other.
+        
+        Args:
+            version: The reported version, None if the response had none
+        """
+        if version is None or version == self.version:
+            return
+        with self._lock:
+            self._observe(version)
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the cache counters.
+        
+        Returns:
+            Hits, misses and the results held
+        """
+        with self._lock:
+            return dict(self._counts, entries=len(self._entries))
+    
+    @staticmethod
+    def key_of(request: Dict[str, Any]) -> Optional[Hashable]:
+        """
+        Get the cache key of a match request.
+        
+        A result only depends on the routing fields, not on data, unless
+        the prompt is rendered; requests whose fields are not all strings
+        are not cached.
+        
+        Args:
+            request: The match request object
+            
+        Returns:
+            The key, or None if the request's result is not cacheable
+        """
+        if request.get("render"):
+            return None
+        fields = tuple(sorted((name, value) for name, value in request.items() if name != "data"))
+        if not all(value.__class__ is str for _, value in fields):
+            return None
+        return fields
+    
+    @staticmethod
+    def is_cacheable(result: Dict[str, Any]) -> bool:
+        """
+        Check whether a result may be reused for other requests with the same key.
+        
+        Only matched prompts are cached; a file type inferred from the
+        data makes the result depend on it.
+        
+        Args:
+            result: The match result
+            
+        Returns:
+            True if the result may be cached
+        """
+        return result.get("success") is True and "inferred_file_type" not in result
+    
+    def _observe(self, version: Optional[str]) -> None:
+        """Switch to a newly reported version; lock held."""
+        if version is not None and version != self.version:
+            self._entries.clear()
+            self.version = version
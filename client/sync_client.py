@@ -0,0 +1,258 @@
+"""
+Synchronous client.
+Matches prompts over pooled keep-alive connections, batching the calls
+of concurrent threads.
+"""
+
+import http.client
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from client.base import RULES_VERSION_HEADER, BaseClient, PromptClientError
+
+
+class ConnectionPool:
+    """Keep-alive HTTP connections to one server, shared by threads."""
+    
+    def __init__(self, host: str, port: int, https: bool = False, max_size: int = 10, timeout: float = 30.0):
+        """
+        Args:
+            host: Server host name
+            port: Server port
+            https: Whether to use TLS
+            max_size: Connections open at once; further requests wait for one
+            timeout: Seconds to wait for the server
+        """
+        self.host = host
+        self.port = port
+        self.https = https
+        self.timeout = timeout
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+    
+    def request(self, method: str, path: str, body: Optional[bytes],
+                headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Send a request on a pooled connection.
+        
+        A request failing on a reused connection, which the server may
+        have closed while it was idle, is retried once on a new one.
+        
+        Returns:
+            Tuple of (status, headers with lower-case names, body)
+            
+        Raises:
+            PromptClientError: If the request fails
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PromptClientError("Timed out waiting for a free connection")
+        try:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            reused = connection is not None
+            while True:
+                if connection is None:
+                    connection = self._connect()
+                try:
+                    connection.request(method, path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                    break
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                    connection.close()
+                    connection = None
+                    if not reused:
+                        raise PromptClientError(f"Request to {self.host}:{self.port} failed: {e}") from e
+                    reused = False
+                except (OSError, http.client.HTTPException) as e:
+                    connection.close()
+                    raise PromptClientError(f"Request to {self.host}:{self.port} failed: {e}") from e
+            
+            if response.will_close:
+                connection.close()
+            else:
+                with self._lock:
+                    self._idle.append(connection)
+            return response.status, {name.lower(): value for name, value in response.getheaders()}, data
+        finally:
+            self._slots.release()
+    
+    def close(self) -> None:
+        """Close the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+    
+    def _connect(self) -> http.client.HTTPConnection:
+        """Open a new connection."""
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+
+class PromptClient(BaseClient):
+    """
+    Thread-safe client of the Prompt Matching API.
+    
+    Example:
+        with PromptClient("http://localhost:5000") as client:
+            result = client.match("Commercial Auto", "Structure", "Summary Report", data)
+            if result["success"]:
+                prompt = result["prompt"]
+    """
+    
+    def __init__(self, base_url: str = "http://localhost:5000", **options: Any):
+        """
+        Args:
+            base_url: URL of the API
+            options: Settings, see BaseClient
+        """
+        super().__init__(base_url, **options)
+        self.pool = ConnectionPool(self.host, self.port, self.https, self.pool_size, self.timeout)
+        self._pending: List[Tuple[bytes, Any, Future]] = []
+        self._in_flight = 0
+        self._lock = threading.Lock()
+    
+    def match(self, situation: Optional[str], level: Optional[str], file_type: Optional[str] = None,
+              data: Any = "", **fields: Any) -> Dict[str, Any]:
+        """
+        Match a prompt.
+        
+        Args:
+            situation: The situation
+            level: The level
+            file_type: The file type, None to have the server infer it from data
+            data: The document data
+            fields: Further fields and options, e.g. render=True
+            
+        Returns:
+            The /match-prompt response, with "success" and "prompt" or "error"
+            
+        Raises:
+            PromptClientError: If the server cannot be reached
+        """
+        return self.match_request(self.build_request(situation, level, file_type, data, fields))
+    
+    def match_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Match a prompt for a request object as POSTed to /match-prompt.
+        
+        Args:
+            request: The request object
+            
+        Returns:
+            The /match-prompt response; results from the cache are shared,
+            so do not modify them
+            
+        Raises:
+            PromptClientError: If the server cannot be reached
+        """
+        result, key = self.cached(request)
+        if result is not None:
+            return result
+        body = self.encode(request)
+        if not self.batch_window or not self.batch_endpoint or len(body) > self.max_batch_bytes:
+            return self._send_one(body, key)
+        
+        future: Future = Future()
+        with self._lock:
+            self._pending.append((body, key, future))
+            batch = None
+            if len(self._pending) >= self.max_batch or (len(self._pending) == 1 and not self._in_flight):
+                # A full batch, or an idle client: send without waiting
+                batch, self._pending = self._pending, []
+                self._in_flight += 1
+            lead = batch is None and len(self._pending) == 1
+        if lead:
+            # The first call of a batch collects the calls made while it waits
+            time.sleep(self.batch_window)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                if batch:
+                    self._in_flight += 1
+        if batch:
+            self._dispatch(batch)
+        return future.result()
+    
+    def match_many(self, requests: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Match prompts for many request objects in bulk requests.
+        
+        Args:
+            requests: The request objects
+            
+        Returns:
+            The responses, in order
+            
+        Raises:
+            PromptClientError: If the server cannot be reached
+        """
+        requests = list(requests)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        misses = []
+        for index, request in enumerate(requests):
+            results[index], key = self.cached(request)
+            if results[index] is None:
+                misses.append((index, self.encode(request), key))
+        for (index, _, _), result in zip(misses, self._send([(body, key) for _, body, key in misses])):
+            results[index] = result
+        return results
+    
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.pool.close()
+    
+    def __enter__(self) -> "PromptClient":
+        return self
+    
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+    
+    def _dispatch(self, batch: List[Tuple[bytes, Any, Future]]) -> None:
+        """Send a batch of pending calls, counted in flight by the caller, and resolve their futures."""
+        try:
+            results = self._send([(body, key) for body, key, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+    
+    def _send(self, items: List[Tuple[bytes, Any]]) -> List[Dict[str, Any]]:
+        """POST encoded requests in batches, see BaseClient.batches, and cache the results."""
+        results = []
+        for batch in self.batches(items):
+            results.extend(self._send_batch(batch))
+        return results
+    
+    def _send_batch(self, items: List[Tuple[bytes, Any]]) -> List[Dict[str, Any]]:
+        """POST several requests to /match-prompt/batch, or each to /match-prompt, and cache the results."""
+        if len(items) > 1 and self.batch_endpoint:
+            status, headers, body = self.pool.request(
+                "POST", self.prefix + "/match-prompt/batch", self.batch_body([body for body, _ in items]),
+                self.headers
+            )
+            if not self.batch_rejected(status, body):
+                data = self.decode(status, body)
+                if not self.lacks_batch_endpoint(status, data):
+                    results = self.split_batch(status, data, len(items))
+                    version = headers.get(RULES_VERSION_HEADER.lower())
+                    for (_, key), result in zip(items, results):
+                        self.remember(key, result, version)
+                    return results
+        return [self._send_one(body, key) for body, key in items]
+    
+    def _send_one(self, body: bytes, key: Any) -> Dict[str, Any]:
+        """POST one encoded request to /match-prompt and cache the result."""
+        status, headers, body = self.pool.request("POST", self.prefix + "/match-prompt", body, self.headers)
+        result = self.decode(status, body)
+        self.remember(key, result, headers.get(RULES_VERSION_HEADER.lower()))
+        return result
@@ -0,0 +1,295 @@
+"""
+Production server entry point.
+Runs the app in pre-forked worker processes that share one listening
+socket and the compiled rule tables built before forking.
+
+Usage:
+    python server.py --workers 4 --port 8000
+    python server.py --workers 4 --job-workers 2
+
+Signals sent to the master process:
+    SIGTERM, SIGINT: drain the workers and exit
+    SIGHUP: reload the rule and template files and replace the workers one at a time
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+from werkzeug.serving import BaseWSGIServer
+
+from app import create_app
+from services.rule_store import get_rule_store
+
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerServer(BaseWSGIServer):
+    """Single-threaded WSGI server of one worker, counting handled requests."""
+    
+    requests_handled = 0
+    
+    def process_request(self, request, client_address) -> None:
+        self.requests_handled += 1
+        super().process_request(request, client_address)
+
+
+class PreforkServer:
+    """
+    Master process of a pre-forked WSGI server.
+    
+    The app, and with it the compiled prompt tables, is created once in
+    the master. Everything allocated up to that point is moved out of
+    garbage collector tracking with gc.freeze(), so collections in the
+    workers never write to those objects and their memory pages stay
+    shared copy-on-write. Each worker accepts connections from the
+    shared socket and handles one request at a time; throughput scales
+    with the number of workers. Job workers are separate processes that
+    only run background jobs, so documents submitted to /jobs never
+    occupy a request worker.
+    """
+    
+    def __init__(self, host: str = "0.0.0.0", port: int = 8000, workers: Optional[int] = None,
+                 graceful_timeout: float = 30.0, max_requests: int = 0, config: Optional[Dict] = None,
+                 job_workers: int = 0):
+        """
+        Build the app and bind the listening socket.
+        
+        Args:
+            host: Interface to listen on
+            port: Port to listen on
+            workers: Number of worker processes, defaults to the CPU count
+            graceful_timeout: Seconds a worker may take to drain before it is killed
+            max_requests: Requests after which a worker is replaced, 0 for never
+            config: Config values passed to create_app
+            job_workers: Number of job worker processes; enables the job queue
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.graceful_timeout = graceful_timeout
+        self.max_requests = max_requests
+        
+        # The master must not run the rule watcher thread: threads do not
+        # survive fork. Every worker starts its own after forking.
+        config = dict(config or {})
+        self.reload_interval = config.get("RULES_RELOAD_INTERVAL", 2.0)
+        config["RULES_RELOAD_INTERVAL"] = 0
+        # Every worker counts its own requests; /metrics shows whose they are
+        config.setdefault("METRICS_WORKER_LABEL", True)
+        # Jobs run in their own processes instead of request worker threads
+        self.job_workers = job_workers
+        if job_workers:
+            config["JOBS_ENABLED"] = True
+            config["JOBS_WORKERS"] = 0
+        self.app = create_app(config)
+        
+        self.socket = socket.create_server((host, port), backlog=2048)
+        # Idle workers all wake up for a new connection; the ones that lose
+        # the race get EAGAIN instead of blocking in accept()
+        self.socket.setblocking(False)
+        
+        # pid -> role of the child, "http" or "jobs"
+        self._children: Dict[int, str] = {}
+        self._stopping = False
+        self._restart_requested = False
+    
+    def run(self) -> None:
+        """Start the workers and supervise them until told to stop."""
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_restart)
+        
+        self._freeze()
+        logger.info("Listening on %s:%s with %d workers and %d job workers",
+                    *self.socket.getsockname()[:2], self.workers, self.job_workers)
+        if self.app.config.get("ADMISSION_ENABLED"):
+            logger.info("Admission limits apply per worker: ADMISSION_RATE allows %d times the rate in total, "
+                        "and single-threaded workers never reach the concurrency limit", self.workers)
+        for _ in range(self.workers):
+            self._spawn_worker()
+        for _ in range(self.job_workers):
+            self._spawn_worker("jobs")
+        
+        while not self._stopping:
+            if self._restart_requested:
+                self._restart_requested = False
+                self._rolling_restart()
+            self._reap_workers()
+            time.sleep(0.2)
+        
+        self._stop_workers(list(self._children))
+        self.socket.close()
+    
+    def _handle_stop(self, signum, frame) -> None:
+        self._stopping = True
+    
+    def _handle_restart(self, signum, frame) -> None:
+        self._restart_requested = True
+    
+    def _freeze(self) -> None:
+        """Move everything allocated so far out of garbage collector tracking."""
+        gc.collect()
+        gc.freeze()
+    
+    def _spawn_worker(self, role: str = "http") -> int:
+        """Fork a request worker, or a job worker for role "jobs"."""
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                if role == "jobs":
+                    self._run_job_worker()
+                else:
+                    self._run_worker()
+            except Exception:
+                logger.exception("Worker %d crashed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        
+        self._children[pid] = role
+        return pid
+    
+    def _run_worker(self) -> None:
+        """Serve requests in a worker process until asked to stop."""
+        stopping = False
+        
+        def handle_stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+        
+        signal.signal(signal.SIGTERM, handle_stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        
+        if self.reload_interval > 0:
+            get_rule_store().start_watching(self.reload_interval)
+        
+        host, port = self.socket.getsockname()[:2]
+        server = WorkerServer(host, port, self.app, fd=self.socket.fileno())
+        server.timeout = 0.5
+        
+        # Finish the request in progress, then exit: SIGTERM only stops the
+        # loop between requests
+        while not stopping:
+            server.handle_request()
+            if self.max_requests and server.requests_handled >= self.max_requests:
+                break
+        server.server_close()
+    
+    def _run_job_worker(self) -> None:
+        """Run background jobs in a job worker process until asked to stop."""
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        self.socket.close()
+        
+        if self.reload_interval > 0:
+            get_rule_store().start_watching(self.reload_interval)
+        
+        # The job in progress is finished before the loop ends
+        self.app.extensions['job_queue'].work(stop)
+    
+    def _reap_workers(self, stopped=()) -> None:
+        """
+        Collect exited workers and replace them.
+        
+        Args:
+            stopped: Workers that were asked to exit and are not replaced
+        """
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            role = self._children.pop(pid, None)
+            if role is None:
+                continue
+            if pid not in stopped and not self._stopping:
+                logger.info("Worker %d exited with status %d, starting a new one",
+                            pid, os.waitstatus_to_exitcode(status))
+                self._spawn_worker(role)
+    
+    def _rolling_restart(self) -> None:
+        """Reload the rules and templates and replace the workers one at a time."""
+        # Imported here so servers without templates never load the module
+        from services.prompt_templates import get_template_library
+        get_rule_store().reload()
+        if get_template_library() is not None:
+            get_template_library().reload()
+        gc.unfreeze()
+        self._freeze()
+        
+        for pid, role in list(self._children.items()):
+            if self._stopping:
+                return
+            # Start the replacement first so capacity never drops
+            self._spawn_worker(role)
+            self._stop_workers([pid])
+        logger.info("Restarted %d workers with rules version %s",
+                    len(self._children), get_rule_store().version)
+    
+    def _stop_workers(self, pids) -> None:
+        """Ask workers to drain and wait for them, killing stragglers."""
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        
+        deadline = time.monotonic() + self.graceful_timeout
+        while any(pid in self._children for pid in pids):
+            if time.monotonic() >= deadline:
+                for pid in pids:
+                    if pid in self._children:
+                        logger.warning("Worker %d did not drain in time, killing it", pid)
+                        os.kill(pid, signal.SIGKILL)
+                deadline = float("inf")
+            self._reap_workers(stopped=pids)
+            time.sleep(0.05)
+
+
+def main(argv=None) -> None:
+    """Parse command line arguments and run the server."""
+    parser = argparse.ArgumentParser(description="Run the Prompt Matching API with pre-forked workers")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 0)),
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0,
+                        help="Seconds a worker may take to finish its request on shutdown")
+    parser.add_argument("--max-requests", type=int, default=0,
+                        help="Replace a worker after this many requests (default: never)")
+    parser.add_argument("--job-workers", type=int, default=0,
+                        help="Number of processes running /jobs requests (default: 0, jobs disabled)")
+    parser.add_argument("--access-log", action="store_true",
+                        help="Log every request")
+    parser.add_argument("--warm-up", action="store_true",
+                        help="Warm up the app before the workers start (WARM_UP_ENABLED)")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(message)s")
+    if not args.access_log:
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    PreforkServer(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        graceful_timeout=args.graceful_timeout,
+        max_requests=args.max_requests,
+        job_workers=args.job_workers,
+        config={"WARM_UP_ENABLED": True} if args.warm_up else None
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Admission control.
+Per-client token bucket rate limits and an adaptive concurrency limit
+that shrinks when request latency rises above its no-load baseline.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class TokenBucketLimiter:
+    """
+    A token bucket per client key.
+    
+    Each client may send burst requests at once and rate requests per
+    second on average. Buckets are refilled lazily when a client sends a
+    request, so idle clients cost nothing. Only the max_clients most
+    recently seen clients keep a bucket; a client whose bucket was
+    dropped starts over with a full one.
+    """
+    
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        """
+        Args:
+            rate: Requests per second allowed per client
+            burst: Requests a client may send at once
+            max_clients: Clients whose buckets are kept
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # client key -> (tokens, time of the last refill)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def acquire(self, client: str) -> float:
+        """
+        Take a token from a client's bucket.
+        
+        Args:
+            client: The client key
+            
+        Returns:
+            0 if the request is admitted, otherwise the seconds until a
+            token is available
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(client, None)
+            if bucket is None:
+                tokens = self.burst
+                if len(self._buckets) >= self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            
+            if tokens >= 1:
+                self._buckets[client] = (tokens - 1, now)
+                return 0.0
+            self._buckets[client] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    A limit on requests in flight that adapts to observed latency.
+    
+    Follows the gradient algorithm of Netflix's concurrency-limits. The
+    lowest moving average of latency seen stands in for the no-load
+    latency; it only rises again while the server is lightly loaded, so
+    sustained overload cannot ratchet it up. While the current latency
+    is within tolerance times that baseline the limit grows by about its
+    square root per sample; beyond that it shrinks in proportion, down to
+    half per sample. Requests over the limit are rejected at once instead
+    of queueing, so latency stays bounded under overload.
+    """
+    
+    def __init__(self, initial: int = 20, min_limit: int = 1, max_limit: int = 200,
+                 tolerance: float = 2.0, smoothing: float = 0.2):
+        """
+        Args:
+            initial: Starting limit
+            min_limit: Smallest limit
+            max_limit: Largest limit
+            tolerance: Latency increase over the baseline that is tolerated
+            smoothing: Weight of each new estimate in the limit
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.limit = float(initial)
+        self.in_flight = 0
+        # Moving average of latency and its lowest value, the no-load latency
+        self._latency: Optional[float] = None
+        self._baseline: Optional[float] = None
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> bool:
+        """
+        Take a slot for a request.
+        
+        Returns:
+            True if the request is admitted; it must call release later
+        """
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+    
+    def release(self, latency: Optional[float] = None) -> None:
+        """
+        Return a slot and update the limit.
+        
+        Args:
+            latency: Seconds the request took, None to not sample it
+        """
+        with self._lock:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            if latency is None:
+                return
+            
+            if self._latency is None:
+                self._latency = self._baseline = latency
+                return
+            self._latency += (latency - self._latency) * 0.1
+            app_limited = in_flight < self.limit / 2
+            if self._latency < self._baseline:
+                self._baseline = self._latency
+            elif app_limited:
+                # Lightly loaded, so the current latency is the no-load latency;
+                # follow a genuine slowdown, but never while saturated
+                self._baseline += (self._latency - self._baseline) * 0.01
+            
+            gradient = max(0.5, min(1.0, self.tolerance * self._baseline / self._latency))
+            if gradient == 1.0 and app_limited:
+                # The app is not using the limit, so it has not earned a higher one
+                return
+            estimate = self.limit * gradient + math.sqrt(self.limit)
+            limit = self.limit + (estimate - self.limit) * self.smoothing
+            self.limit = max(float(self.min_limit), min(float(self.max_limit), limit))
+    
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the current limit, requests in flight and latency estimates.
+        
+        Returns:
+            Dictionary of the limit state
+        """
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "baseline_latency": self._baseline or 0.0,
+                "latency": self._latency or 0.0
+            }
@@ -0,0 +1,89 @@
+"""
+Traffic capture.
+Appends incoming /match-prompt requests to an NDJSON log that
+benchmarks/replay.py can send again.
+"""
+
+import base64
+import json
+import os
+import random
+import time
+from typing import Any, Dict, Iterator, Optional
+
+
+class RequestCapture:
+    """
+    Appends captured requests to an NDJSON file, one request per line:
+    
+        {"ts": 1718000000.123, "ct": "application/json", "status": 200, "body": "{...}"}
+        
+    ts is the arrival time, ct the Content-Type, status the response
+    status and body the raw request body as text ("body_b64" instead for
+    bodies that are not UTF-8). Each line is written with a single
+    O_APPEND write, so several threads and worker processes can capture
+    to the same file without interleaving lines.
+    """
+    
+    def __init__(self, path: str, sample_rate: float = 1.0, max_body_bytes: int = 64 * 1024):
+        """
+        Args:
+            path: File to append to
+            sample_rate: Fraction of requests captured
+            max_body_bytes: Larger bodies are not captured
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_body_bytes = max_body_bytes
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    
+    def record(self, content_type: Optional[str], body: bytes, status: int) -> bool:
+        """
+        Capture a request, subject to sampling and the body size limit.
+        
+        Args:
+            content_type: The request Content-Type
+            body: The raw request body
+            status: The response status code
+            
+        Returns:
+            True if the request was written
+        """
+        if len(body) > self.max_body_bytes:
+            return False
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return False
+        
+        entry: Dict[str, Any] = {"ts": round(time.time(), 6), "ct": content_type, "status": status}
+        try:
+            entry["body"] = body.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_b64"] = base64.b64encode(body).decode("ascii")
+        os.write(self._fd, json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n")
+        return True
+    
+    def close(self) -> None:
+        """Close the capture file."""
+        os.close(self._fd)
+
+
+def read_capture(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read a capture file.
+    
+    Args:
+        path: The capture file
+        
+    Yields:
+        Entries with "ts", "ct", "status" and the raw "body" as bytes
+    """
+    with open(path, "r", encoding="utf-8") as capture_file:
+        for line in capture_file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "body_b64" in entry:
+                entry["body"] = base64.b64decode(entry.pop("body_b64"))
+            else:
+                entry["body"] = entry.get("body", "").encode("utf-8")
+            yield entry
@@ -0,0 +1,339 @@
+"""
+Compiled prompt matcher.
+Interns every field value to an ordinal once at startup and resolves a
+request with a single index into a flat table of prebuilt results.
+"""
+
+import hashlib
+import itertools
+import sys
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
+
+from services.rule_engine import DecisionTree
+from services.rules import RuleSet, normalize_value
+
+
+# Largest flat table built eagerly; bigger rule sets walk the decision tree
+MAX_TABLE_CELLS = 1 << 18
+
+# Bytes counted per rule for its decision tree nodes and rule objects
+RULE_BYTES = 1024
+
+
+class CompiledPromptMatcher:
+    """
+    Lookup-table version of PromptMatchingService.process_request.
+    
+    Each dimension (situation, level, file_type, ...) maps its valid values,
+    their aliases and the normalized spellings of both to ordinals, and the
+    ordinals of a request are combined into one index of a flat table.
+    Each matched prompt and "no matching prompt" is built once here, and
+    the result for a combination of invalid or missing fields is built the
+    first time it is seen and memoized by its bitmask, so resolving a
+    request only does dict lookups and returns shared, read-only result
+    dictionaries.
+    
+    The rules themselves, including wildcards and priorities, are compiled
+    into a DecisionTree. The flat table is filled from the tree when it
+    has at most MAX_TABLE_CELLS cells; otherwise the tree is walked per
+    request, which still costs one step per dimension.
+    """
+    
+    def __init__(self, rules: RuleSet):
+        """
+        Compile the rule tables.
+        
+        Args:
+            rules: The rule set to compile
+        """
+        self.rules = rules
+        self.version = rules.version
+        # Changes with any edit of the rules, even one that keeps the version
+        self.digest = hashlib.sha256(repr(rules).encode("utf-8")).hexdigest()[:16]
+        self.dimensions = rules.dimensions
+        self.routing_fields = frozenset(dimension.name for dimension in rules.dimensions)
+        self.required_fields = tuple(
+            dimension.name for dimension in rules.dimensions if dimension.required
+        ) + ("data",)
+        
+        # Intern each dimension's values to ordinals and compute the
+        # mixed-radix stride of that dimension in the flat table. Optional
+        # dimensions get one extra ordinal for "field absent".
+        self._dims: List[Tuple[int, str, Dict[str, int], int, Optional[int]]] = []
+        self._radixes: List[Tuple[int, int]] = []
+        stride = 1
+        for position, dimension in reversed(list(enumerate(rules.dimensions))):
+            ordinals = {value: ordinal for ordinal, value in enumerate(dimension.values)}
+            absent = None if dimension.required else len(ordinals)
+            size = len(ordinals) + (0 if dimension.required else 1)
+            # Aliases and normalized spellings resolve to the same ordinal
+            ordinals.update(
+                (spelling, ordinals[canonical]) for spelling, canonical in dimension.lookup.items()
+            )
+            self._dims.append((1 << position, dimension.name, ordinals, stride, absent))
+            self._radixes.append((stride, size))
+            stride *= size
+        self._dims.reverse()
+        self._radixes.reverse()
+        
+        # Compile the rules into a decision tree keyed by ordinals
+        self.tree = DecisionTree(len(self._dims), [
+            (
+                tuple(
+                    None if condition is None else dim[2][condition]
+                    for condition, dim in zip(rule.conditions, self._dims)
+                ),
+                rule.prompt,
+                rule.priority
+            )
+            for rule in rules.rules
+        ])
+        
+        # Prebuild the result for every possible prompt
+        self._no_match = {
+            "success": False,
+            "error": "Invalid Prompt",
+            "message": "Invalid Prompt: No matching prompt found for the given criteria"
+        }
+        self._successes: Dict[str, Dict[str, Any]] = {
+            rule.prompt: {"success": True, "prompt": rule.prompt} for rule in rules.rules
+        }
+        
+        # Fill the flat table from the tree when it is small enough
+        self._table: Optional[List[Dict[str, Any]]] = None
+        if stride <= MAX_TABLE_CELLS:
+            self._table = [
+                self._result_for(self.tree.lookup(keys))
+                for keys in itertools.product(*(range(size) for _, size in self._radixes))
+            ]
+        
+        # Error results per bitmask of invalid or missing fields, built on
+        # first use: there are 2^dimensions combinations, few of them seen
+        self._invalid_messages = [
+            f"Invalid {dimension.name}. Must be one of: {', '.join(dimension.values)}"
+            for dimension in self.dimensions
+        ]
+        self._invalid_results: Dict[int, Dict[str, Any]] = {}
+        self._missing_results: Dict[int, Dict[str, Any]] = {}
+    
+    @classmethod
+    def from_rule_set(cls, rules: RuleSet) -> "CompiledPromptMatcher":
+        """
+        Compile a rule set loaded from a rule file.
+        
+        Args:
+            rules: The rule set to compile
+            
+        Returns:
+            A compiled matcher
+        """
+        return cls(rules)
+    
+    def process_request(self, data: Any) -> Dict[str, Union[str, bool]]:
+        """
+        Validate and match a request in one pass.
+        
+        Returns the same results as PromptMatchingService.process_request.
+        Inputs the tables cannot represent (non-dict bodies, non-string
+        field values) are handed to the service so their error results
+        stay identical.
+        
+        Args:
+            data: Dictionary containing the request data
+            
+        Returns:
+            Dictionary with success status and result/error message. The
+            dictionary may be shared between requests and must not be mutated.
+        """
+        checked = self.validate(data)
+        if checked.__class__ is int:
+            return self.match(checked)
+        return checked
+    
+    def validate(self, data: Any) -> Union[int, Dict[str, Any]]:
+        """
+        Validate a request and resolve its fields to a table index.
+        
+        This is the first half of process_request, split out so the two
+        phases can be timed separately.
+        
+        Args:
+            data: Dictionary containing the request data
+            
+        Returns:
+            The table index to pass to match, or the final result
+            dictionary if the request is invalid
+        """
+        if not isinstance(data, dict):
+            return self._process_with_service(data)
+        
+        # Collect missing fields as a bitmask
+        missing = 0
+        bit = 1
+        for field in self.required_fields:
+            if data.get(field) is None:
+                missing |= bit
+            bit <<= 1
+        if missing:
+            result = self._missing_results.get(missing)
+            return result if result is not None else self._build_missing_result(missing)
+        
+        # Resolve every dimension to its ordinal
+        index = 0
+        invalid = 0
+        for bit, name, ordinals, stride, absent in self._dims:
+            value = data.get(name)
+            if value.__class__ is not str:
+                if value is None and absent is not None:
+                    index += absent * stride
+                    continue
+                return self._process_with_service(data)
+            ordinal = ordinals.get(value)
+            if ordinal is None:
+                ordinal = ordinals.get(value.strip())
+                if ordinal is None:
+                    ordinal = ordinals.get(normalize_value(value))
+                    if ordinal is None:
+                        invalid |= bit
+                        continue
+            index += ordinal * stride
+        if invalid:
+            result = self._invalid_results.get(invalid)
+            return result if result is not None else self._build_invalid_result(invalid)
+        return index
+    
+    def match(self, index: int) -> Dict[str, Any]:
+        """
+        Get the result for a table index returned by validate.
+        
+        Args:
+            index: The table index
+            
+        Returns:
+            The shared result dictionary of the matched prompt, or the
+            no-match result
+        """
+        if self._table is not None:
+            return self._table[index]
+        return self._result_for(self.tree.lookup([
+            index // stride % size for stride, size in self._radixes
+        ]))
+    
+    def match_values(self, values: Sequence[Optional[str]]) -> Optional[str]:
+        """
+        Find the prompt for canonical field values with the decision tree.
+        
+        Same semantics as RuleSet.match: an absent (None) or unknown value
+        only matches wildcard conditions.
+        
+        Args:
+            values: One value per dimension, None for an absent optional field
+            
+        Returns:
+            The matched prompt, or None if no rule matches
+        """
+        return self.tree.lookup([
+            dim[2].get(value, -1) if value is not None else -1
+            for dim, value in zip(self._dims, values)
+        ])
+    
+    def prebuilt_results(self) -> List[Dict[str, Any]]:
+        """
+        List the shared result dictionaries built so far.
+        
+        Error results are built on first use, so later calls may list
+        more of them; see is_shared_result. Results built by the service
+        fallback are not included.
+        
+        Returns:
+            The prebuilt result dictionaries
+        """
+        return (
+            [self._no_match]
+            + list(self._successes.values())
+            + list(self._invalid_results.values())
+            + list(self._missing_results.values())
+        )
+    
+    def is_shared_result(self, result: Dict[str, Any]) -> bool:
+        """
+        Check whether a result is a shared dictionary owned by this matcher.
+        
+        Shared results live as long as the matcher; results built by the
+        service fallback are new dictionaries on every call.
+        
+        Args:
+            result: A result returned by process_request or match
+            
+        Returns:
+            True if the result is shared
+        """
+        if result is self._no_match or result is self._successes.get(result.get("prompt")):
+            return True
+        results = self._missing_results if result.get("error") == "Missing Data" else self._invalid_results
+        return any(result is shared for shared in list(results.values()))
+    
+    def footprint(self) -> int:
+        """
+        Estimate the memory held by the compiled tables.
+        
+        Counts the containers and result dictionaries, not the strings
+        they share with the rule set, so it is meant for bounding caches
+        of matchers rather than exact accounting.
+        
+        Returns:
+            Approximate size in bytes
+        """
+        size = sys.getsizeof(self._table) if self._table is not None else 0
+        for _, _, ordinals, _, _ in self._dims:
+            size += sys.getsizeof(ordinals)
+        for results in (self._successes, self._invalid_results, self._missing_results):
+            size += sys.getsizeof(results) + sum(sys.getsizeof(result) for result in results.values())
+        return size + RULE_BYTES * len(self.rules.rules)
+    
+    def _result_for(self, prompt: Optional[str]) -> Dict[str, Any]:
+        """Get the prebuilt result for a matched prompt, or the no-match result."""
+        if prompt is None:
+            return self._no_match
+        return self._successes[prompt]
+    
+    def _process_with_service(self, data: Any) -> Dict[str, Union[str, bool]]:
+        """Process a request the tables cannot represent with the service."""
+        # Imported here: the service depends on the rule store, which
+        # compiles matchers
+        from services.prompt_service import PromptMatchingService
+        from services.rule_store import reset_snapshot, use_snapshot
+        
+        # Select this matcher so the service matches with its decision tree
+        token = use_snapshot(self)
+        try:
+            return PromptMatchingService.process_request(data, self.rules)
+        finally:
+            reset_snapshot(token)
+    
+    def _build_invalid_result(self, mask: int) -> Dict[str, Any]:
+        """Build and memoize the validation error result for a set of invalid fields."""
+        result = {
+            "success": False,
+            "error": "Invalid Prompt",
+            "details": {
+                dimension.name: self._invalid_messages[position]
+                for position, dimension in enumerate(self.dimensions)
+                if mask & (1 << position)
+            }
+        }
+        # setdefault keeps one shared result if two threads build it at once
+        return self._invalid_results.setdefault(mask, result)
+    
+    def _build_missing_result(self, mask: int) -> Dict[str, Any]:
+        """Build and memoize the missing data result for a set of missing fields."""
+        missing_fields = [
+            field for position, field in enumerate(self.required_fields)
+            if mask & (1 << position)
+        ]
+        result = {
+            "success": False,
+            "error": "Missing Data",
+            "message": f"Missing Data: Required fields missing: {', '.join(missing_fields)}"
+        }
+        return self._missing_results.setdefault(mask, result)
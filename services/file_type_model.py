@@ -0,0 +1,412 @@
+"""
+Content-based file_type inference.
+A linear model over hashed character n-grams of the "data" field,
+vectorized with NumPy and trainable from a local labeled corpus.
+
+Train a model from the repository root:
+    python -m services.file_type_model CORPUS -o file_type_model.npz
+
+CORPUS is a directory with one subdirectory of .txt documents per file
+type (the directory name may be any spelling the rule file accepts), or
+an NDJSON file of match requests with "file_type" and "data" fields.
+"""
+
+import json
+import os
+from typing import Any, List, Optional, Sequence, Tuple
+
+from services.rules import DEFAULT_RULES_PATH, load_rule_set
+
+
+# log2 of the number of hashed features
+DEFAULT_FEATURE_BITS = 18
+
+# Character n-gram sizes
+NGRAM_SIZES = (3, 4, 5)
+
+# Characters of a document the model looks at
+DEFAULT_MAX_CHARS = 16 * 1024
+
+# N-grams scored in one vectorized step
+BATCH_NGRAMS = 32 * 1024
+
+# Odd multipliers for the rolling n-gram hash and the final bit mix
+_HASH_PRIME = 16777619
+_HASH_MIX = 2654435761
+
+# NumPy, imported on first use so a server without a model starts faster
+np: Any = None
+
+
+def _import_numpy() -> None:
+    """
+    Import NumPy on first use.
+    
+    Raises:
+        RuntimeError: If NumPy is not installed
+    """
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise RuntimeError("File type inference requires numpy (pip install numpy)") from None
+        np = numpy
+
+
+class FileTypeModel:
+    """
+    Predicts a file type from document text.
+    
+    A document is case-folded, its whitespace collapsed and its first
+    max_chars characters encoded to UTF-8. Every byte n-gram of the sizes
+    in NGRAM_SIZES is hashed into one of 2**feature_bits features with a
+    vectorized rolling hash, and the document's feature vector holds the
+    n-gram counts divided by the square root of the n-gram total. A
+    softmax over weights[features] + bias gives the class probabilities.
+    
+    Scoring a batch gathers the weight rows of all documents at once and
+    sums them per document with one np.add.reduceat, so bulk requests
+    pay the NumPy call overhead once per batch rather than per document.
+    """
+    
+    def __init__(self, labels: Sequence[str], weights: Any, bias: Any,
+                 feature_bits: int = DEFAULT_FEATURE_BITS, max_chars: int = DEFAULT_MAX_CHARS):
+        """
+        Args:
+            labels: The file types, one per weight column
+            weights: Array of shape (2**feature_bits, len(labels))
+            bias: Array of shape (len(labels),)
+            feature_bits: log2 of the number of hashed features
+            max_chars: Characters of a document the model looks at
+            
+        Raises:
+            RuntimeError: If NumPy is not installed
+            ValueError: If the array shapes do not match
+        """
+        _import_numpy()
+        self.labels = tuple(labels)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.feature_bits = feature_bits
+        self.max_chars = max_chars
+        if self.weights.shape != (1 << feature_bits, len(self.labels)) or self.bias.shape != (len(self.labels),):
+            raise ValueError("Model weights do not match its labels and feature size")
+        # Minimum probability for a prediction to be used; set by configure_file_type_model
+        self.min_confidence = 0.0
+    
+    def features(self, text: str) -> Any:
+        """
+        Get the hashed n-gram features of a document.
+        
+        Args:
+            text: The document
+            
+        Returns:
+            Array of feature indices (np.intp), one per n-gram, with repeats
+        """
+        encoded = (" " + " ".join(text[:self.max_chars].casefold().split()) + " ").encode("utf-8")
+        data = np.frombuffer(encoded, dtype=np.uint8).astype(np.uint32)
+        shift = np.uint32(32 - self.feature_bits)
+        indices = []
+        for size in NGRAM_SIZES:
+            count = len(data) - size + 1
+            if count <= 0:
+                continue
+            hashes = np.full(count, size, dtype=np.uint32)
+            for offset in range(size):
+                hashes *= np.uint32(_HASH_PRIME)
+                hashes += data[offset:offset + count]
+            hashes *= np.uint32(_HASH_MIX)
+            indices.append(hashes >> shift)
+        if not indices:
+            return np.zeros(0, dtype=np.intp)
+        # np.take is much faster with native-width indices
+        return np.concatenate(indices).astype(np.intp)
+    
+    def scores(self, texts: Sequence[str]) -> Any:
+        """
+        Score a batch of documents.
+        
+        Args:
+            texts: The documents
+            
+        Returns:
+            Array of shape (len(texts), len(labels)) with class probabilities
+        """
+        # Featurize and score in chunks of about BATCH_NGRAMS n-grams, so
+        # the features and gathered weight rows stay small enough for the
+        # CPU caches
+        probabilities = []
+        chunk, size = [], 0
+        for text in texts:
+            features = self.features(text)
+            if chunk and size + len(features) > BATCH_NGRAMS:
+                probabilities.append(self._probabilities(chunk, self.weights, self.bias))
+                chunk, size = [], 0
+            chunk.append(features)
+            size += len(features)
+        probabilities.append(self._probabilities(chunk, self.weights, self.bias))
+        return np.concatenate(probabilities)
+    
+    def predict(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """
+        Predict the file type of a batch of documents.
+        
+        Args:
+            texts: The documents
+            
+        Returns:
+            One (file type, probability) tuple per document
+        """
+        if not texts:
+            return []
+        probabilities = self.scores(texts)
+        best = probabilities.argmax(axis=1)
+        return [
+            (self.labels[label], float(probabilities[row, label]))
+            for row, label in enumerate(best)
+        ]
+    
+    @classmethod
+    def train(cls, texts: Sequence[str], labels: Sequence[str], classes: Sequence[str],
+              feature_bits: int = DEFAULT_FEATURE_BITS, max_chars: int = DEFAULT_MAX_CHARS,
+              epochs: int = 50, learning_rate: float = 2.0, l2: float = 1e-5,
+              batch_size: int = 64, seed: int = 0) -> "FileTypeModel":
+        """
+        Train a model with mini-batch gradient descent on the softmax loss.
+        
+        Args:
+            texts: The training documents
+            labels: The file type of each document
+            classes: All file types, in the order of the weight columns
+            feature_bits: log2 of the number of hashed features
+            max_chars: Characters of a document the model looks at
+            epochs: Passes over the corpus
+            learning_rate: Step size
+            l2: L2 regularization strength
+            batch_size: Documents per gradient step
+            seed: Seed of the shuffling between epochs
+            
+        Returns:
+            The trained model
+            
+        Raises:
+            ValueError: If a label is not one of classes
+        """
+        _import_numpy()
+        classes = tuple(classes)
+        unknown = sorted(set(labels) - set(classes))
+        if unknown:
+            raise ValueError(f"Unknown file types in corpus: {', '.join(unknown)}")
+        
+        model = cls(
+            classes,
+            np.zeros((1 << feature_bits, len(classes)), dtype=np.float32),
+            np.zeros(len(classes), dtype=np.float32),
+            feature_bits,
+            max_chars
+        )
+        documents = [model.features(text) for text in texts]
+        targets = np.zeros((len(texts), len(classes)), dtype=np.float32)
+        targets[np.arange(len(texts)), [classes.index(label) for label in labels]] = 1
+        
+        weights, bias = model.weights, model.bias
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(documents))
+            for start in range(0, len(order), batch_size):
+                rows = order[start:start + batch_size]
+                batch = [documents[row] for row in rows]
+                errors = (cls._probabilities(batch, weights, bias) - targets[rows]) / len(rows)
+                
+                # Each n-gram adds its document's error, scaled like the
+                # feature value, to the gradient of its weight row
+                lengths = np.array([len(features) for features in batch])
+                flat = np.concatenate(batch)
+                owners = np.repeat(np.arange(len(batch)), lengths)
+                scale = np.repeat(1 / np.sqrt(np.maximum(lengths, 1)), lengths)
+                for column in range(len(classes)):
+                    gradient = np.bincount(flat, weights=errors[owners, column] * scale, minlength=len(weights))
+                    weights[:, column] -= learning_rate * (gradient + l2 * weights[:, column])
+                bias -= learning_rate * errors.sum(axis=0)
+        return model
+    
+    def save(self, path: str) -> None:
+        """
+        Save the model as a compressed .npz file.
+        
+        Args:
+            path: The file to write
+        """
+        np.savez_compressed(
+            path,
+            labels=np.array(self.labels),
+            weights=self.weights,
+            bias=self.bias,
+            feature_bits=self.feature_bits,
+            max_chars=self.max_chars
+        )
+    
+    @classmethod
+    def load(cls, path: str) -> "FileTypeModel":
+        """
+        Load a model saved with save.
+        
+        Args:
+            path: The .npz file
+            
+        Returns:
+            The model
+            
+        Raises:
+            RuntimeError: If NumPy is not installed
+            OSError: If the file cannot be read
+            ValueError: If the file is not a valid model
+        """
+        _import_numpy()
+        with np.load(path) as saved:
+            try:
+                return cls(
+                    [str(label) for label in saved["labels"]],
+                    saved["weights"],
+                    saved["bias"],
+                    int(saved["feature_bits"]),
+                    int(saved["max_chars"])
+                )
+            except KeyError as e:
+                raise ValueError(f"Not a file type model: {path} has no {e}")
+    
+    @staticmethod
+    def _probabilities(documents: List[Any], weights: Any, bias: Any) -> Any:
+        """Softmax probabilities of documents given as feature index arrays."""
+        lengths = np.array([len(features) for features in documents], dtype=np.int64)
+        logits = np.tile(bias, (len(documents), 1))
+        present = lengths > 0
+        if present.any():
+            flat = np.concatenate([features for features in documents if len(features)])
+            starts = np.concatenate(([0], np.cumsum(lengths[present])[:-1]))
+            # np.take and np.add.reduceat avoid the slow paths of fancy
+            # indexing and of sum(axis=0) over tall arrays
+            sums = np.add.reduceat(np.take(weights, flat, axis=0), starts, axis=0)
+            logits[present] += sums / np.sqrt(lengths[present])[:, None]
+        logits -= logits.max(axis=1, keepdims=True)
+        exponentials = np.exp(logits)
+        return exponentials / exponentials.sum(axis=1, keepdims=True)
+
+
+def load_corpus(path: str) -> Tuple[List[str], List[str]]:
+    """
+    Load a labeled corpus.
+    
+    Args:
+        path: Directory with one subdirectory of .txt files per file type,
+            or an NDJSON file of objects with "file_type" and "data"
+            
+    Returns:
+        Tuple of (documents, file type labels as written in the corpus)
+    """
+    texts, labels = [], []
+    if os.path.isdir(path):
+        for label in sorted(os.listdir(path)):
+            directory = os.path.join(path, label)
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".txt"):
+                    with open(os.path.join(directory, name), "r", encoding="utf-8", errors="replace") as document:
+                        texts.append(document.read())
+                    labels.append(label)
+        return texts, labels
+    
+    with open(path, "r", encoding="utf-8") as corpus_file:
+        for line in corpus_file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if isinstance(entry.get("file_type"), str) and isinstance(entry.get("data"), str):
+                texts.append(entry["data"])
+                labels.append(entry["file_type"])
+    return texts, labels
+
+
+# Model used by the controllers, None while inference is disabled
+_file_type_model: Optional[FileTypeModel] = None
+
+
+def get_file_type_model() -> Optional[FileTypeModel]:
+    """
+    Get the model used to infer missing file types.
+    
+    Returns:
+        The model, or None if file type inference is disabled
+    """
+    return _file_type_model
+
+
+def configure_file_type_model(path: Optional[str], min_confidence: float = 0.0) -> Optional[FileTypeModel]:
+    """
+    Load the model used to infer missing file types.
+    
+    Args:
+        path: The .npz model file, None to disable inference
+        min_confidence: Minimum probability for a prediction to be used
+        
+    Returns:
+        The model, or None if inference is disabled
+    """
+    global _file_type_model
+    model = None
+    if path is not None:
+        model = FileTypeModel.load(path)
+        model.min_confidence = min_confidence
+    _file_type_model = model
+    return model
+
+
+def main():
+    """Train a model from a corpus and report its accuracy on a holdout split."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Train the file_type inference model.")
+    parser.add_argument("corpus", help="Corpus directory or NDJSON file")
+    parser.add_argument("-o", "--output", required=True, help="Model file to write (.npz)")
+    parser.add_argument("--rules", default=DEFAULT_RULES_PATH, help="Rule file with the file types")
+    parser.add_argument("--feature-bits", type=int, default=DEFAULT_FEATURE_BITS)
+    parser.add_argument("--max-chars", type=int, default=DEFAULT_MAX_CHARS)
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction held out for evaluation")
+    args = parser.parse_args()
+    
+    dimension = next(d for d in load_rule_set(args.rules).dimensions if d.name == "file_type")
+    texts, raw_labels = load_corpus(args.corpus)
+    labels = []
+    for label in raw_labels:
+        canonical = dimension.canonical(label.strip())
+        if canonical is None:
+            parser.error(f"Corpus label {label!r} is not a file type of {args.rules}")
+        labels.append(canonical)
+    if not texts:
+        parser.error(f"{args.corpus} holds no documents")
+    
+    order = np.random.default_rng(0).permutation(len(texts))
+    held_out = int(len(texts) * args.holdout)
+    train_rows, test_rows = order[held_out:], order[:held_out]
+    model = FileTypeModel.train(
+        [texts[row] for row in train_rows],
+        [labels[row] for row in train_rows],
+        dimension.values,
+        args.feature_bits,
+        args.max_chars,
+        args.epochs
+    )
+    model.save(args.output)
+    print(f"Trained on {len(train_rows)} documents, saved to {args.output}")
+    if held_out:
+        predictions = model.predict([texts[row] for row in test_rows])
+        correct = sum(label == labels[row] for (label, _), row in zip(predictions, test_rows))
+        print(f"Holdout accuracy: {correct / held_out:.1%} ({correct}/{held_out})")
+
+
+if __name__ == "__main__":
+    main()
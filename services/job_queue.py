@@ -0,0 +1,297 @@
+"""
+Job queue.
+Runs match requests in the background: submitted bodies are stored in a
+SQLite database on local disk and processed by worker threads or
+processes, and their results are kept there until they expire.
+"""
+
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for work or results made by other processes
+POLL_INTERVAL = 0.25
+
+# Seconds between purges of expired results
+PURGE_INTERVAL = 60.0
+
+# Processes a stored body: (body, content_type, tenant) -> (response_data, status_code)
+JobHandler = Callable[[bytes, str, Optional[str]], Tuple[Dict[str, Any], int]]
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while max_pending jobs are waiting or running."""
+
+
+class JobQueue:
+    """
+    Match requests queued in SQLite and processed in the background.
+    
+    Any thread of any process that opens the same database can submit,
+    poll or work on jobs, so the forked workers of server.py share one
+    queue and its results. A worker claims the oldest queued job with a
+    lease; a job whose worker died is claimed again once its lease
+    expires. Submissions beyond max_pending unfinished jobs are refused,
+    so a flood of documents backs up into clients instead of disk.
+    """
+    
+    def __init__(self, path: str, handler: JobHandler, workers: int = 2, max_pending: int = 1000,
+                 result_ttl: float = 3600.0, lease: float = 300.0):
+        """
+        Create the database if it does not exist.
+        
+        Args:
+            path: Path of the SQLite database file
+            handler: Processes a job body into a response and status code
+            workers: Worker threads started in each process that submits or polls, 0 for none
+            max_pending: Unfinished jobs allowed before submissions are refused
+            result_ttl: Seconds a result is kept after the job finished
+            lease: Seconds a worker may take before its job is given to another
+            
+        Raises:
+            sqlite3.Error: If the database cannot be opened
+        """
+        self.path = path
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.lease = lease
+        self._local = threading.local()
+        # Wakes this process's workers on submit and its pollers on completion
+        self._changed = threading.Condition()
+        self._started_pid: Optional[int] = None
+        self._last_purge = 0.0
+        self._counts = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0}
+        
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, state TEXT NOT NULL, content_type TEXT, tenant TEXT, body BLOB, "
+            "status_code INTEGER, result TEXT, created REAL, lease REAL, expires REAL)"
+        )
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(jobs)")]
+        if "tenant" not in columns:
+            # Databases created before tenant rule sets
+            connection.execute("ALTER TABLE jobs ADD COLUMN tenant TEXT")
+        connection.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created)")
+    
+    def submit(self, body: Any, content_type: str, tenant: Optional[str] = None) -> str:
+        """
+        Queue a match request.
+        
+        Args:
+            body: The raw request body, any buffer (bytes or a memory map)
+            content_type: The request Content-Type
+            tenant: Tenant whose rules the request is matched against, None for the default rules
+            
+        Returns:
+            The job id
+            
+        Raises:
+            QueueFullError: If max_pending jobs are unfinished
+            sqlite3.Error: If the job cannot be stored
+        """
+        self._start_workers()
+        connection = self._connection()
+        pending = connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')"
+        ).fetchone()[0]
+        if pending >= self.max_pending:
+            self._counts["rejected"] += 1
+            raise QueueFullError(f"{pending} jobs are waiting")
+        
+        job_id = secrets.token_hex(16)
+        connection.execute(
+            "INSERT INTO jobs (id, state, content_type, tenant, body, created) VALUES (?, 'queued', ?, ?, ?, ?)",
+            (job_id, content_type, tenant, memoryview(body), time.time())
+        )
+        self._counts["submitted"] += 1
+        with self._changed:
+            self._changed.notify_all()
+        return job_id
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the state of a job.
+        
+        Args:
+            job_id: The job id
+            
+        Returns:
+            Dictionary with the job id, its status (queued, running or
+            done) and, once done, its result and result_status; None for
+            an unknown or expired job
+        """
+        self._start_workers()
+        row = self._connection().execute(
+            "SELECT state, status_code, result FROM jobs WHERE id = ? AND (expires IS NULL OR expires > ?)",
+            (job_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        
+        job: Dict[str, Any] = {"job_id": job_id, "status": row[0]}
+        if row[0] == "done":
+            job["result"] = json.loads(row[2])
+            job["result_status"] = row[1]
+        return job
+    
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Get the state of a job once it is done or the timeout has passed.
+        
+        Args:
+            job_id: The job id
+            timeout: Seconds to wait at most
+            
+        Returns:
+            The job like get() returns it
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] == "done" or remaining <= 0:
+                return job
+            # Results from other processes are only seen by polling
+            with self._changed:
+                self._changed.wait(min(remaining, POLL_INTERVAL))
+    
+    def work(self, stop: threading.Event) -> None:
+        """
+        Process jobs in the calling thread until stop is set.
+        
+        The job in progress is finished before returning.
+        
+        Args:
+            stop: Event that ends the loop
+        """
+        while not stop.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                logger.warning("Job queue read failed: %s", e)
+                job = None
+            if job is None:
+                self._purge()
+                with self._changed:
+                    self._changed.wait(POLL_INTERVAL)
+                continue
+            
+            job_id, body, content_type, tenant = job
+            try:
+                response, status_code = self.handler(body, content_type, tenant)
+            except Exception as e:
+                logger.exception("Job %s failed", job_id)
+                response, status_code = {
+                    "success": False,
+                    "error": "Internal Error",
+                    "message": f"An unexpected error occurred: {str(e)}"
+                }, 500
+            self._finish(job_id, response, status_code)
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the jobs per state and this process's counters.
+        
+        Returns:
+            Queued, running and done jobs in the database, plus jobs
+            submitted, rejected, completed and failed by this process
+        """
+        states = {"queued": 0, "running": 0, "done": 0}
+        states.update(self._connection().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return dict(states, **self._counts)
+    
+    def render_metrics(self) -> str:
+        """
+        Render the job counts in the Prometheus text exposition format.
+        
+        Returns:
+            The metrics text
+        """
+        try:
+            stats = self.stats()
+        except sqlite3.Error as e:
+            logger.warning("Job queue read failed: %s", e)
+            return ""
+        lines = [
+            "# HELP prompt_jobs Jobs in the queue by state.",
+            "# TYPE prompt_jobs gauge"
+        ]
+        for state in ("queued", "running", "done"):
+            lines.append(f'prompt_jobs{{state="{state}"}} {stats[state]}')
+        lines += [
+            "# HELP prompt_jobs_total Jobs submitted, rejected, completed and failed by this process.",
+            "# TYPE prompt_jobs_total counter"
+        ]
+        for result in ("submitted", "rejected", "completed", "failed"):
+            lines.append(f'prompt_jobs_total{{result="{result}"}} {stats[result]}')
+        return "\n".join(lines) + "\n"
+    
+    def _start_workers(self) -> None:
+        """Start this process's worker threads, once per process: threads do not survive fork."""
+        if not self.workers or self._started_pid == os.getpid():
+            return
+        with self._changed:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            stop = threading.Event()
+            for index in range(self.workers):
+                threading.Thread(target=self.work, args=(stop,), name=f"job-worker-{index}", daemon=True).start()
+    
+    def _claim(self) -> Optional[Tuple[str, bytes, str, Optional[str]]]:
+        """Lease the oldest queued job, or one whose lease expired; returns (id, body, content_type, tenant)."""
+        now = time.time()
+        row = self._connection().execute(
+            "UPDATE jobs SET state = 'running', lease = ? WHERE id = ("
+            "SELECT id FROM jobs WHERE state = 'queued' OR (state = 'running' AND lease < ?) "
+            "ORDER BY created LIMIT 1) RETURNING id, body, content_type, tenant",
+            (now + self.lease, now)
+        ).fetchone()
+        return (row[0], bytes(row[1] or b""), row[2], row[3]) if row else None
+    
+    def _finish(self, job_id: str, response: Dict[str, Any], status_code: int) -> None:
+        """Store a job's result and drop its body."""
+        try:
+            self._connection().execute(
+                "UPDATE jobs SET state = 'done', body = NULL, status_code = ?, result = ?, expires = ? WHERE id = ?",
+                (status_code, json.dumps(response), time.time() + self.result_ttl, job_id)
+            )
+        except sqlite3.Error as e:
+            logger.warning("Job queue write failed: %s", e)
+            return
+        self._counts["completed" if status_code < 500 else "failed"] += 1
+        with self._changed:
+            self._changed.notify_all()
+    
+    def _purge(self) -> None:
+        """Delete expired results now and then."""
+        now = time.monotonic()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        try:
+            self._connection().execute("DELETE FROM jobs WHERE expires <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            logger.warning("Job queue purge failed: %s", e)
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Get the calling thread's connection, opening it on first use in this process."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
@@ -0,0 +1,400 @@
+"""
+Lazy JSON scanning.
+Extracts selected top-level fields from a raw JSON object without
+decoding the values of the other fields.
+"""
+
+import codecs
+import io
+import json
+import re
+from typing import Any, Collection, Dict, Optional, TextIO, Tuple
+
+
+# JSON insignificant whitespace
+_WHITESPACE = b" \t\n\r"
+
+_BACKSLASH = ord("\\")
+
+# Strings with _DENSE_QUOTES escaped quotes less than _DENSE_GAP bytes
+# apart on average are scanned _WINDOW bytes at a time
+_DENSE_QUOTES = 64
+_DENSE_GAP = 128
+_WINDOW = 1 << 16
+
+# Numbers and literals, the only values that do not start with " [ or {
+_SCALAR = re.compile(rb"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?|true|false|null")
+
+# Characters that matter while skipping a nested object or array
+_STRUCTURAL = re.compile(rb'["\[\]{}]')
+
+# Encoded bytes decoded at a time by JSONStringReader; escape sequences
+# are at most 12 characters long (a surrogate pair)
+_READ_CHUNK = 1 << 16
+_MAX_ESCAPE = 12
+
+# Escaped first half of a UTF-16 surrogate pair
+_HIGH_SURROGATE = re.compile(r"\\u[dD][89abAB][0-9a-fA-F]{2}")
+
+
+class LazyJSONError(ValueError):
+    """Raised when a body cannot be scanned as a JSON object."""
+
+
+class LazyValue:
+    """
+    A JSON value that has been located in a buffer but not decoded.
+    
+    Holds the buffer and the byte span of the value, so a large value
+    costs nothing until something actually needs it.
+    """
+    
+    __slots__ = ("buffer", "start", "end")
+    
+    def __init__(self, buffer: Any, start: int, end: int):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+    
+    def __len__(self) -> int:
+        """Size of the encoded value in bytes."""
+        return self.end - self.start
+    
+    def raw(self) -> bytes:
+        """Return the encoded JSON value."""
+        return bytes(self.buffer[self.start:self.end])
+    
+    def decode(self) -> Any:
+        """Decode the value into Python objects."""
+        return json.loads(self.raw())
+    
+    def is_string(self) -> bool:
+        """Check whether the value is a JSON string."""
+        return self.buffer[self.start] == ord('"')
+    
+    def open(self) -> TextIO:
+        """
+        Open the value for reading as text without decoding it all at once.
+        
+        Returns:
+            A text file object yielding the decoded string for string
+            values, or the JSON text for any other value
+        """
+        if self.is_string():
+            return JSONStringReader(self.buffer, self.start + 1, self.end - 1)
+        return io.TextIOWrapper(_BufferReader(self.buffer, self.start, self.end), encoding="utf-8")
+
+
+class _BufferReader(io.RawIOBase):
+    """Binary file object reading a byte range of a buffer without copying it."""
+    
+    def __init__(self, buffer: Any, start: int, end: int):
+        super().__init__()
+        self._view = memoryview(buffer)[start:end]
+        self._pos = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, target: Any) -> int:
+        size = min(len(target), len(self._view) - self._pos)
+        target[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+    
+    def close(self) -> None:
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+class JSONStringReader(io.TextIOBase):
+    """
+    Text file object that decodes the contents of a JSON string in chunks.
+    
+    Reads _READ_CHUNK encoded bytes at a time, so a multi-megabyte string
+    can be consumed with bounded memory. Escape sequences are never split
+    between chunks.
+    """
+    
+    def __init__(self, buffer: Any, start: int, end: int):
+        """
+        Args:
+            buffer: Buffer holding the encoded string
+            start: Position just after the opening quote
+            end: Position of the closing quote
+        """
+        super().__init__()
+        self._buffer = buffer
+        self._pos = start
+        self._end = end
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._pending = ""
+        self._text = ""
+    
+    def readable(self) -> bool:
+        return True
+    
+    def read(self, size: Optional[int] = -1) -> str:
+        """
+        Read up to size characters, or everything left if size is negative.
+        
+        Raises:
+            ValueError: If the string contains an invalid escape sequence
+        """
+        if size is None or size < 0:
+            parts = [self._text]
+            self._text = ""
+            while self._fill():
+                parts.append(self._text)
+                self._text = ""
+            return "".join(parts)
+        
+        while len(self._text) < size and self._fill():
+            pass
+        text, self._text = self._text[:size], self._text[size:]
+        return text
+    
+    def _fill(self) -> bool:
+        """Decode the next chunk into the text buffer; False at the end."""
+        if self._pos >= self._end and not self._pending:
+            return False
+        
+        chunk_end = min(self._pos + _READ_CHUNK, self._end)
+        final = chunk_end == self._end
+        encoded = self._buffer[self._pos:chunk_end]
+        self._pos = chunk_end
+        
+        chunk = self._pending + self._decoder.decode(encoded, final)
+        self._pending = ""
+        if not final:
+            # Hold back a possibly incomplete escape sequence, starting at
+            # the beginning of its run of backslashes
+            cut = chunk.find("\\", max(len(chunk) - _MAX_ESCAPE, 0))
+            if cut >= 0:
+                cut = _escape_start(chunk, cut)
+                # Keep both halves of an escaped surrogate pair together
+                if cut >= 6 and _HIGH_SURROGATE.fullmatch(chunk, cut - 6, cut):
+                    cut = _escape_start(chunk, cut - 6)
+                chunk, self._pending = chunk[:cut], chunk[cut:]
+        
+        self._text += json.loads('"' + chunk + '"') if "\\" in chunk else chunk
+        return True
+
+
+def _escape_start(text: str, pos: int) -> int:
+    """Return the start of the run of backslashes that includes pos."""
+    while pos > 0 and text[pos - 1] == "\\":
+        pos -= 1
+    return pos
+
+
+def open_text(value: Any) -> TextIO:
+    """
+    Open a request field for reading as text.
+    
+    Works the same for fields decoded into strings and for LazyValue
+    fields, so callers can read a large "data" field without caring how
+    the body was parsed.
+    
+    Args:
+        value: A str, a LazyValue, or any other decoded JSON value
+        
+    Returns:
+        A text file object
+    """
+    if isinstance(value, LazyValue):
+        return value.open()
+    if isinstance(value, str):
+        return io.StringIO(value)
+    return io.StringIO(json.dumps(value))
+
+
+def scan_object(buffer: Any, decode_fields: Collection[str]) -> Tuple[Dict[str, Any], Dict[str, LazyValue]]:
+    """
+    Scan a JSON object and decode only the requested top-level fields.
+    
+    String values are skipped by searching for their closing quote, so a
+    multi-megabyte field is never copied or decoded. Skipped values are
+    only checked for terminated strings and balanced brackets. When a key
+    appears more than once, the last occurrence wins, as with json.loads.
+    
+    Args:
+        buffer: bytes, bytearray or mmap holding the JSON document
+        decode_fields: Names of the fields to decode
+        
+    Returns:
+        Tuple of (decoded_fields, lazy_fields): decode_fields that are
+        present mapped to their values, and every other field mapped to
+        a LazyValue
+        
+    Raises:
+        LazyJSONError: If the buffer is not a well-formed JSON object
+    """
+    decoded: Dict[str, Any] = {}
+    lazy: Dict[str, LazyValue] = {}
+    length = len(buffer)
+    
+    pos = _skip_whitespace(buffer, 0, length)
+    if pos >= length or buffer[pos] != ord("{"):
+        raise LazyJSONError("Expected a JSON object")
+    pos = _skip_whitespace(buffer, pos + 1, length)
+    
+    if pos < length and buffer[pos] == ord("}"):
+        pos += 1
+    else:
+        while True:
+            # Key
+            if pos >= length or buffer[pos] != ord('"'):
+                raise LazyJSONError(f"Expected a key at byte {pos}")
+            key_end = _string_end(buffer, pos, length)
+            key = _decode_string(buffer, pos, key_end)
+            
+            pos = _skip_whitespace(buffer, key_end, length)
+            if pos >= length or buffer[pos] != ord(":"):
+                raise LazyJSONError(f"Expected ':' at byte {pos}")
+            pos = _skip_whitespace(buffer, pos + 1, length)
+            
+            # Value
+            value_end = _value_end(buffer, pos, length)
+            if key in decode_fields:
+                if buffer[pos] == ord('"'):
+                    decoded[key] = _decode_string(buffer, pos, value_end)
+                else:
+                    decoded[key] = _loads(buffer[pos:value_end])
+                lazy.pop(key, None)
+            else:
+                lazy[key] = LazyValue(buffer, pos, value_end)
+                decoded.pop(key, None)
+            
+            pos = _skip_whitespace(buffer, value_end, length)
+            if pos < length and buffer[pos] == ord(","):
+                pos = _skip_whitespace(buffer, pos + 1, length)
+                continue
+            if pos < length and buffer[pos] == ord("}"):
+                pos += 1
+                break
+            raise LazyJSONError(f"Expected ',' or '}}' at byte {pos}")
+    
+    if _skip_whitespace(buffer, pos, length) != length:
+        raise LazyJSONError("Extra data after the JSON object")
+    
+    return decoded, lazy
+
+
+def _loads(encoded: Any) -> Any:
+    """Decode a small JSON value, converting decoder errors."""
+    try:
+        return json.loads(bytes(encoded))
+    except ValueError as e:
+        raise LazyJSONError(str(e))
+
+
+def _decode_string(buffer: Any, start: int, end: int) -> str:
+    """Decode the JSON string between start and end, including its quotes."""
+    encoded = buffer[start + 1:end - 1]
+    if b"\\" in encoded:
+        return _loads(buffer[start:end])
+    try:
+        return encoded.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise LazyJSONError(str(e))
+
+
+def _skip_whitespace(buffer: Any, pos: int, length: int) -> int:
+    """Return the position of the next non-whitespace byte."""
+    while pos < length and buffer[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def _string_end(buffer: Any, pos: int, length: int) -> int:
+    """Return the position just past the string starting at pos."""
+    search = pos + 1
+    escaped_quotes = 0
+    while True:
+        quote = buffer.find(b'"', search, length)
+        if quote < 0:
+            raise LazyJSONError(f"Unterminated string starting at byte {pos}")
+        if buffer[quote - 1] != _BACKSLASH or _is_unescaped(buffer, quote):
+            return quote + 1
+        search = quote + 1
+        
+        # Text dense with escaped quotes is cheaper to skip in windows
+        escaped_quotes += 1
+        if escaped_quotes == _DENSE_QUOTES and search - pos < _DENSE_QUOTES * _DENSE_GAP:
+            return _string_end_windowed(buffer, pos, search, length)
+
+
+def _string_end_windowed(buffer: Any, pos: int, search: int, length: int) -> int:
+    """
+    Return the position just past the string starting at pos, searching from search.
+    
+    Whole windows in which every quote is escaped are skipped with
+    C-level counts; single quotes are only examined in the window where
+    the string ends.
+    """
+    while search < length:
+        end = min(search + _WINDOW, length)
+        window = buffer[search:end]
+        if (buffer[search - 1] != _BACKSLASH and window[-1] != _BACKSLASH
+                and b"\\\\" not in window
+                and window.count(b'"') == window.count(b'\\"')):
+            search = end
+            continue
+        
+        quote = _closing_quote(buffer, search, end)
+        if quote >= 0:
+            return quote + 1
+        search = end
+    
+    raise LazyJSONError(f"Unterminated string starting at byte {pos}")
+
+
+def _is_unescaped(buffer: Any, quote: int) -> bool:
+    """Check whether the quote at a position is preceded by an even number of backslashes."""
+    backslash = quote - 1
+    while buffer[backslash] == _BACKSLASH:
+        backslash -= 1
+    return (quote - 1 - backslash) % 2 == 0
+
+
+def _closing_quote(buffer: Any, search: int, end: int) -> int:
+    """Return the position of the first unescaped quote in a range, or -1."""
+    while True:
+        quote = buffer.find(b'"', search, end)
+        if quote < 0 or _is_unescaped(buffer, quote):
+            return quote
+        search = quote + 1
+
+
+def _value_end(buffer: Any, pos: int, length: int) -> int:
+    """Return the position just past the value starting at pos."""
+    if pos >= length:
+        raise LazyJSONError("Expected a value")
+    
+    first = buffer[pos]
+    if first == ord('"'):
+        return _string_end(buffer, pos, length)
+    
+    if first == ord("{") or first == ord("["):
+        depth = 0
+        search = pos
+        while True:
+            match = _STRUCTURAL.search(buffer, search, length)
+            if match is None:
+                raise LazyJSONError(f"Unterminated value starting at byte {pos}")
+            found = match.start()
+            char = buffer[found]
+            if char == ord('"'):
+                search = _string_end(buffer, found, length)
+                continue
+            depth += 1 if char in b"[{" else -1
+            search = found + 1
+            if depth == 0:
+                return search
+    
+    match = _SCALAR.match(buffer, pos, length)
+    if match is None:
+        raise LazyJSONError(f"Invalid value at byte {pos}")
+    return match.end()
@@ -0,0 +1,209 @@
+"""
+Request metrics.
+Counts match outcomes and records per-stage latency histograms in
+per-thread shards, rendered in the Prometheus text format.
+"""
+
+import threading
+import weakref
+from bisect import bisect_left
+from typing import Dict, List
+
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+)
+
+# Stages of a /match-prompt request, in order
+STAGES = ("body_read", "json_parse", "infer", "validate", "match", "render", "serialize", "total")
+
+
+class _Shard:
+    """Counters owned by one thread; only that thread ever writes them."""
+    
+    __slots__ = ("buckets", "sums", "outcomes")
+    
+    def __init__(self):
+        self.buckets: Dict[str, List[int]] = {}
+        self.sums: Dict[str, float] = {}
+        self.outcomes: Dict[str, int] = {}
+    
+    def merge(self, other: "_Shard", size: int) -> None:
+        """
+        Add the counters of another shard to this one.
+        
+        Args:
+            other: The shard to add
+            size: Number of histogram buckets per stage
+        """
+        for stage, counts in list(other.buckets.items()):
+            total = self.buckets.setdefault(stage, [0] * size)
+            for position, count in enumerate(counts):
+                total[position] += count
+            self.sums[stage] = self.sums.get(stage, 0.0) + other.sums.get(stage, 0.0)
+        for outcome, count in list(other.outcomes.items()):
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + count
+
+
+class _ThreadMarker:
+    """Held in a thread's local storage; collected when the thread ends."""
+    
+    __slots__ = ("__weakref__",)
+
+
+class RequestMetrics:
+    """
+    Outcome counters and stage latency histograms.
+    
+    Every thread writes to its own shard, so recording a value takes no
+    lock and never contends with other threads; it costs a thread-local
+    lookup, a bisect over the bucket bounds and two additions. Shards
+    are only summed when the metrics are rendered, which may see a
+    shard mid-update - acceptable for monitoring counters. When a
+    thread ends its shard is folded into a shared retired shard, so
+    servers that start a thread per connection keep a bounded number
+    of shards.
+    """
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.bounds = tuple(buckets)
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._retired = _Shard()
+        self._shards_lock = threading.Lock()
+    
+    def observe(self, stage: str, seconds: float) -> None:
+        """
+        Record the duration of a request stage.
+        
+        Args:
+            stage: Stage name, one of STAGES
+            seconds: Duration in seconds
+        """
+        shard = self._shard()
+        counts = shard.buckets.get(stage)
+        if counts is None:
+            counts = shard.buckets[stage] = [0] * (len(self.bounds) + 1)
+            shard.sums[stage] = 0.0
+        counts[bisect_left(self.bounds, seconds)] += 1
+        shard.sums[stage] += seconds
+    
+    def count(self, outcome: str) -> None:
+        """
+        Count a request outcome.
+        
+        Args:
+            outcome: The matched prompt or the error type
+        """
+        outcomes = self._shard().outcomes
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    
+    def reset(self) -> None:
+        """Clear all counters and histograms, e.g. after warm-up requests."""
+        with self._shards_lock:
+            for shard in self._shards + [self._retired]:
+                shard.buckets.clear()
+                shard.sums.clear()
+                shard.outcomes.clear()
+    
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+        
+        Returns:
+            The metrics text
+        """
+        # The lock keeps a shard from being counted twice while it is retired
+        totals = _Shard()
+        with self._shards_lock:
+            for shard in self._shards + [self._retired]:
+                totals.merge(shard, len(self.bounds) + 1)
+        buckets, sums, outcomes = totals.buckets, totals.sums, totals.outcomes
+        
+        lines = [
+            "# HELP prompt_requests_total Match requests by outcome (matched prompt or error type).",
+            "# TYPE prompt_requests_total counter"
+        ]
+        for outcome in sorted(outcomes):
+            lines.append(f'prompt_requests_total{{outcome="{_escape(outcome)}"}} {outcomes[outcome]}')
+        
+        lines += [
+            "# HELP prompt_stage_seconds Latency of each stage of a /match-prompt request.",
+            "# TYPE prompt_stage_seconds histogram"
+        ]
+        ordered = [stage for stage in STAGES if stage in buckets] + sorted(set(buckets) - set(STAGES))
+        for stage in ordered:
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), buckets[stage]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'prompt_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'prompt_stage_seconds_sum{{stage="{stage}"}} {sums[stage]!r}')
+            lines.append(f'prompt_stage_seconds_count{{stage="{stage}"}} {cumulative}')
+        
+        return "\n".join(lines) + "\n"
+    
+    def _shard(self) -> _Shard:
+        """Get the calling thread's shard, creating it on first use."""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            marker = self._local.marker = _ThreadMarker()
+            weakref.finalize(marker, self._retire, shard)
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+    
+    def _retire(self, shard: _Shard) -> None:
+        """Fold the shard of an ended thread into the retired shard."""
+        with self._shards_lock:
+            self._retired.merge(shard, len(self.bounds) + 1)
+            self._shards.remove(shard)
+
+
+def add_label(text: str, name: str, value: str) -> str:
+    """
+    Add a label to every sample of a Prometheus text exposition.
+    
+    Args:
+        text: The metrics text
+        name: Label name
+        value: Label value
+        
+    Returns:
+        The metrics text with the label first on every sample
+    """
+    label = f'{name}="{_escape(value)}"'
+    lines = []
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            brace, space = line.find("{"), line.find(" ")
+            if brace != -1 and brace < space:
+                closing = "," if line[brace + 1] != "}" else ""
+                line = f"{line[:brace + 1]}{label}{closing}{line[brace + 1:]}"
+            else:
+                line = f"{line[:space]}{{{label}}}{line[space:]}"
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process-wide metrics recorded by the controllers
+_request_metrics = RequestMetrics()
+
+
+def get_request_metrics() -> RequestMetrics:
+    """
+    Get the process-wide request metrics.
+    
+    Returns:
+        The request metrics
+    """
+    return _request_metrics
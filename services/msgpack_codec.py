@@ -0,0 +1,377 @@
+"""
+MessagePack encoding and lazy decoding.
+A small implementation of the MessagePack format for match requests and
+responses: responses are encoded in full, while request maps are scanned
+like services.lazy_json scans JSON objects, decoding only the routing
+fields and keeping every other field as a zero-copy span of the body.
+"""
+
+import io
+import struct
+from typing import Any, Collection, Dict, Iterator, Optional, TextIO, Tuple
+
+from services.lazy_json import LazyValue, _BufferReader
+
+
+class MsgpackError(ValueError):
+    """Raised when a body is not valid MessagePack."""
+
+
+# Value kinds of type bytes
+_NIL, _BOOL, _INT, _FLOAT, _STR, _BIN, _ARRAY, _MAP, _EXT = range(9)
+
+# Fixed-size type bytes: type byte -> (kind, struct format of the value or length)
+_FIXED = {
+    0xc0: (_NIL, None), 0xc2: (_BOOL, None), 0xc3: (_BOOL, None),
+    0xca: (_FLOAT, ">f"), 0xcb: (_FLOAT, ">d"),
+    0xcc: (_INT, ">B"), 0xcd: (_INT, ">H"), 0xce: (_INT, ">I"), 0xcf: (_INT, ">Q"),
+    0xd0: (_INT, ">b"), 0xd1: (_INT, ">h"), 0xd2: (_INT, ">i"), 0xd3: (_INT, ">q"),
+    0xd9: (_STR, ">B"), 0xda: (_STR, ">H"), 0xdb: (_STR, ">I"),
+    0xc4: (_BIN, ">B"), 0xc5: (_BIN, ">H"), 0xc6: (_BIN, ">I"),
+    0xdc: (_ARRAY, ">H"), 0xdd: (_ARRAY, ">I"),
+    0xde: (_MAP, ">H"), 0xdf: (_MAP, ">I"),
+    0xc7: (_EXT, ">B"), 0xc8: (_EXT, ">H"), 0xc9: (_EXT, ">I")
+}
+
+# Payload sizes of the fixext types
+_FIXEXT = {0xd4: 1, 0xd5: 2, 0xd6: 4, 0xd7: 8, 0xd8: 16}
+
+
+class MsgpackValue(LazyValue):
+    """
+    A MessagePack value that has been located in a buffer but not decoded.
+    
+    Strings and binary values are opened as text straight from the
+    buffer, so a large "data" field is never copied or decoded as a whole.
+    """
+    
+    __slots__ = ("payload",)
+    
+    def __init__(self, buffer: Any, start: int, end: int, payload: int):
+        super().__init__(buffer, start, end)
+        # Start of the bytes of a str or bin value
+        self.payload = payload
+    
+    def decode(self) -> Any:
+        """Decode the value into Python objects; bin values become bytes."""
+        return _unpack(self.buffer, self.start, self.end)[0]
+    
+    def is_string(self) -> bool:
+        """Check whether the value is a str or bin value."""
+        return _header(self.buffer, self.start, self.end)[0] in (_STR, _BIN)
+    
+    def open(self) -> TextIO:
+        """
+        Open the value for reading as text without decoding it all at once.
+        
+        Returns:
+            A text file object yielding the UTF-8 text of a str or bin value
+            
+        Raises:
+            MsgpackError: If the value is not a str or bin value
+        """
+        if not self.is_string():
+            raise MsgpackError("Only str and bin values can be opened as text")
+        reader = _BufferReader(self.buffer, self.payload, self.end)
+        return io.TextIOWrapper(io.BufferedReader(reader), encoding="utf-8", errors="replace")
+
+
+def packb(value: Any) -> bytes:
+    """
+    Encode a value as MessagePack.
+    
+    Args:
+        value: None, bool, int, float, str, bytes, list, tuple or dict
+        
+    Returns:
+        The encoded value
+        
+    Raises:
+        TypeError: If the value contains anything else
+    """
+    out = bytearray()
+    _pack(value, out)
+    return bytes(out)
+
+
+def unpackb(buffer: Any) -> Any:
+    """
+    Decode a MessagePack document.
+    
+    Args:
+        buffer: bytes, bytearray, memoryview or mmap holding one value
+        
+    Returns:
+        The decoded value; str values become str and bin values bytes
+        
+    Raises:
+        MsgpackError: If the buffer is not exactly one valid value
+    """
+    value, pos = _unpack(buffer, 0, len(buffer))
+    if pos != len(buffer):
+        raise MsgpackError("Extra data after the MessagePack value")
+    return value
+
+
+def scan_map(buffer: Any, decode_fields: Collection[str],
+             start: int = 0, end: Optional[int] = None) -> Tuple[Dict[str, Any], Dict[str, MsgpackValue]]:
+    """
+    Scan a MessagePack map and decode only the requested fields.
+    
+    Other values are skipped by their encoded lengths, so a multi-megabyte
+    field costs the same as a short one. When a key appears more than
+    once, the last occurrence wins.
+    
+    Args:
+        buffer: bytes, bytearray, memoryview or mmap holding the map
+        decode_fields: Names of the fields to decode
+        start: Offset of the map in the buffer
+        end: End of the map in the buffer, None for the end of the buffer
+        
+    Returns:
+        Tuple of (decoded_fields, lazy_fields) like lazy_json.scan_object
+        
+    Raises:
+        MsgpackError: If the span is not exactly one map with string keys
+    """
+    end = len(buffer) if end is None else end
+    kind, count, pos = _header(buffer, start, end)
+    if kind != _MAP:
+        raise MsgpackError("Expected a MessagePack map")
+    
+    decoded: Dict[str, Any] = {}
+    lazy: Dict[str, MsgpackValue] = {}
+    for _ in range(count):
+        key, pos = _unpack(buffer, pos, end)
+        if not isinstance(key, str):
+            raise MsgpackError("Map keys must be strings")
+        if key in decode_fields:
+            decoded[key], pos = _unpack(buffer, pos, end)
+            lazy.pop(key, None)
+        else:
+            value_end, payload = _skip(buffer, pos, end)
+            lazy[key] = MsgpackValue(buffer, pos, value_end, payload)
+            decoded.pop(key, None)
+            pos = value_end
+    
+    if pos != end:
+        raise MsgpackError("Extra data after the MessagePack map")
+    return decoded, lazy
+
+
+def iter_array(buffer: Any) -> Iterator[Tuple[int, int]]:
+    """
+    Locate the items of a MessagePack array without decoding them.
+    
+    Args:
+        buffer: bytes, bytearray, memoryview or mmap holding the array
+        
+    Yields:
+        (start, end) spans of the items
+        
+    Raises:
+        MsgpackError: If the buffer is not exactly one valid array
+    """
+    end = len(buffer)
+    kind, count, pos = _header(buffer, 0, end)
+    if kind != _ARRAY:
+        raise MsgpackError("Expected a MessagePack array")
+    for _ in range(count):
+        item_end = _skip(buffer, pos, end)[0]
+        yield pos, item_end
+        pos = item_end
+    if pos != end:
+        raise MsgpackError("Extra data after the MessagePack array")
+
+
+def is_map(buffer: Any, start: int = 0) -> bool:
+    """Check whether the value at start is a map."""
+    return start < len(buffer) and (0x80 <= buffer[start] <= 0x8f or buffer[start] in (0xde, 0xdf))
+
+
+def is_nil(value: MsgpackValue) -> bool:
+    """Check whether a lazy value is nil."""
+    return value.buffer[value.start] == 0xc0
+
+
+def _header(buffer: Any, pos: int, end: int) -> Tuple[int, int, int]:
+    """
+    Read the type byte and length of the value at pos.
+    
+    Returns:
+        Tuple of (kind, size, payload_pos): size is the byte length of
+        str, bin and ext payloads, the item count of arrays and maps, and
+        0 for scalars, whose encoding ends at payload_pos plus their
+        struct size
+    """
+    if pos >= end:
+        raise MsgpackError(f"Unexpected end of data at byte {pos}")
+    code = buffer[pos]
+    if code <= 0x7f or code >= 0xe0:
+        return _INT, 0, pos + 1
+    if code <= 0x8f:
+        return _MAP, code & 0x0f, pos + 1
+    if code <= 0x9f:
+        return _ARRAY, code & 0x0f, pos + 1
+    if code <= 0xbf:
+        return _STR, code & 0x1f, pos + 1
+    if code in _FIXEXT:
+        return _EXT, _FIXEXT[code] + 1, pos + 1
+    
+    fixed = _FIXED.get(code)
+    if fixed is None:
+        raise MsgpackError(f"Invalid type byte 0x{code:02x} at byte {pos}")
+    kind, fmt = fixed
+    if kind in (_NIL, _BOOL, _INT, _FLOAT):
+        return kind, 0, pos + 1
+    size = struct.calcsize(fmt)
+    if pos + 1 + size > end:
+        raise MsgpackError(f"Unexpected end of data at byte {pos}")
+    length = struct.unpack_from(fmt, buffer, pos + 1)[0]
+    # ext payloads carry a type byte before their data
+    return kind, length + (1 if kind == _EXT else 0), pos + 1 + size
+
+
+def _skip(buffer: Any, pos: int, end: int) -> Tuple[int, int]:
+    """
+    Find the end of the value at pos without decoding it.
+    
+    Returns:
+        Tuple of (value_end, payload_pos) where payload_pos is where the
+        bytes of a str or bin value start
+    """
+    kind, size, payload = _header(buffer, pos, end)
+    first_payload = payload
+    remaining = 1
+    while True:
+        if kind in (_STR, _BIN, _EXT):
+            payload += size
+        elif kind in (_INT, _FLOAT):
+            code = buffer[payload - 1]
+            if code in _FIXED:
+                payload += struct.calcsize(_FIXED[code][1])
+        elif kind == _ARRAY:
+            remaining += size
+        elif kind == _MAP:
+            remaining += 2 * size
+        if payload > end:
+            raise MsgpackError(f"Unexpected end of data at byte {pos}")
+        remaining -= 1
+        if not remaining:
+            return payload, first_payload
+        kind, size, payload = _header(buffer, payload, end)
+
+
+def _unpack(buffer: Any, pos: int, end: int) -> Tuple[Any, int]:
+    """Decode the value at pos; returns (value, end of the value)."""
+    code = buffer[pos] if pos < end else None
+    kind, size, payload = _header(buffer, pos, end)
+    if kind == _INT:
+        if code <= 0x7f:
+            return code, payload
+        if code >= 0xe0:
+            return code - 0x100, payload
+    if kind in (_INT, _FLOAT):
+        fmt = _FIXED[code][1]
+        value_end = payload + struct.calcsize(fmt)
+        if value_end > end:
+            raise MsgpackError(f"Unexpected end of data at byte {pos}")
+        return struct.unpack_from(fmt, buffer, payload)[0], value_end
+    if kind == _NIL:
+        return None, payload
+    if kind == _BOOL:
+        return code == 0xc3, payload
+    if kind in (_STR, _BIN, _EXT):
+        value_end = payload + size
+        if value_end > end:
+            raise MsgpackError(f"Unexpected end of data at byte {pos}")
+        if kind == _EXT:
+            raise MsgpackError(f"Unsupported extension type at byte {pos}")
+        data = bytes(buffer[payload:value_end])
+        if kind == _BIN:
+            return data, value_end
+        try:
+            return data.decode("utf-8"), value_end
+        except UnicodeDecodeError as e:
+            raise MsgpackError(f"Invalid UTF-8 in string at byte {pos}: {e}")
+    if kind == _ARRAY:
+        items = []
+        for _ in range(size):
+            item, payload = _unpack(buffer, payload, end)
+            items.append(item)
+        return items, payload
+    
+    result = {}
+    for _ in range(size):
+        key, payload = _unpack(buffer, payload, end)
+        try:
+            result[key], payload = _unpack(buffer, payload, end)
+        except TypeError:
+            raise MsgpackError(f"Unhashable map key at byte {pos}")
+    return result, payload
+
+
+def _pack(value: Any, out: bytearray) -> None:
+    """Append the encoding of a value."""
+    if value is None:
+        out.append(0xc0)
+    elif value is True:
+        out.append(0xc3)
+    elif value is False:
+        out.append(0xc2)
+    elif isinstance(value, int):
+        if 0 <= value <= 0x7f or -32 <= value < 0:
+            out += struct.pack(">b" if value < 0 else ">B", value)
+        elif value > 0:
+            for code, fmt, limit in ((0xcc, ">B", 1 << 8), (0xcd, ">H", 1 << 16),
+                                     (0xce, ">I", 1 << 32), (0xcf, ">Q", 1 << 64)):
+                if value < limit:
+                    out.append(code)
+                    out += struct.pack(fmt, value)
+                    return
+            raise TypeError(f"Integer {value} is too large for MessagePack")
+        else:
+            for code, fmt, limit in ((0xd0, ">b", 1 << 7), (0xd1, ">h", 1 << 15),
+                                     (0xd2, ">i", 1 << 31), (0xd3, ">q", 1 << 63)):
+                if value >= -limit:
+                    out.append(code)
+                    out += struct.pack(fmt, value)
+                    return
+            raise TypeError(f"Integer {value} is too small for MessagePack")
+    elif isinstance(value, float):
+        out.append(0xcb)
+        out += struct.pack(">d", value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        _pack_length(out, len(data), 0xa0, 32, (0xd9, 0xda, 0xdb))
+        out += data
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        _pack_length(out, len(value), None, 0, (0xc4, 0xc5, 0xc6))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        _pack_length(out, len(value), 0x90, 16, (None, 0xdc, 0xdd))
+        for item in value:
+            _pack(item, out)
+    elif isinstance(value, dict):
+        _pack_length(out, len(value), 0x80, 16, (None, 0xde, 0xdf))
+        for key, item in value.items():
+            _pack(key, out)
+            _pack(item, out)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__} as MessagePack")
+
+
+def _pack_length(out: bytearray, length: int, fix_code: Optional[int], fix_limit: int,
+                 codes: Tuple[Optional[int], int, int]) -> None:
+    """Append the type byte and length of a str, bin, array or map."""
+    if length < fix_limit:
+        out.append(fix_code | length)
+    elif length < 1 << 8 and codes[0] is not None:
+        out.append(codes[0])
+        out.append(length)
+    elif length < 1 << 16:
+        out.append(codes[1])
+        out += struct.pack(">H", length)
+    else:
+        out.append(codes[2])
+        out += struct.pack(">I", length)
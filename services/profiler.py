@@ -0,0 +1,194 @@
+"""
+On-demand request profiling.
+Runs selected requests under cProfile and keeps their profiles, with a
+short summary of each, in a rotating directory.
+"""
+
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Functions listed in a profile summary
+SUMMARY_FUNCTIONS = 15
+
+# WSGI environ key holding a request's profiling decision
+TRIGGER_ENVIRON_KEY = "prompt.profile_trigger"
+
+
+class RequestProfiler:
+    """
+    Profiles requests chosen by a header or at random.
+    
+    Each profile is written as a .prof file that pstats, snakeviz or
+    gprof2dot can read, next to a .json summary with the request and
+    the functions with the most cumulative time. Only the newest
+    max_profiles profiles are kept.
+    """
+    
+    def __init__(self, directory: str, sample_rate: float = 0.0, max_profiles: int = 100):
+        """
+        Args:
+            directory: Directory the profiles are written to
+            sample_rate: Fraction of requests profiled without the header
+            max_profiles: Number of profiles kept
+        """
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_profiles = max_profiles
+        self._sequence = itertools.count()
+        os.makedirs(directory, exist_ok=True)
+    
+    def should_profile(self, requested: bool) -> Optional[str]:
+        """
+        Decide whether to profile a request.
+        
+        Args:
+            requested: Whether the client asked for a profile
+            
+        Returns:
+            The trigger ("header" or "sample"), or None to skip profiling
+        """
+        if requested:
+            return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+    
+    def should_profile_request(self, environ: Dict[str, Any], requested: bool) -> Optional[str]:
+        """
+        Decide once whether to profile a request, see should_profile.
+        
+        The decision is kept in the WSGI environ, so the fast path and the
+        Flask view agree on it and a request is only sampled once.
+        
+        Args:
+            environ: The request's WSGI environ
+            requested: Whether the client asked for a profile
+            
+        Returns:
+            The trigger ("header" or "sample"), or None to skip profiling
+        """
+        if TRIGGER_ENVIRON_KEY not in environ:
+            environ[TRIGGER_ENVIRON_KEY] = self.should_profile(requested)
+        return environ[TRIGGER_ENVIRON_KEY]
+    
+    def run(self, func: Callable[[], Any], metadata: Dict[str, Any],
+            describe: Optional[Callable[[Any], Dict[str, Any]]] = None) -> Tuple[Any, str]:
+        """
+        Call func under cProfile and save the profile.
+        
+        Args:
+            func: Zero-argument callable doing the request's work
+            metadata: Request details stored in the summary
+            describe: Optional callable returning more summary details
+                from func's return value
+                
+        Returns:
+            Tuple of (func's return value, profile id)
+        """
+        # Imported here so servers that never profile do not pay for it at startup
+        import cProfile
+        
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        result = profile.runcall(func)
+        duration = time.perf_counter() - started
+        
+        if describe is not None:
+            metadata = {**metadata, **describe(result)}
+        
+        profile_id = f"{time.time_ns()}-{os.getpid()}-{next(self._sequence)}"
+        try:
+            self._save(profile_id, profile, duration, metadata)
+            self._rotate()
+        except OSError as e:
+            logger.error("Could not save profile %s: %s", profile_id, e)
+        return result, profile_id
+    
+    def list_profiles(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Get the summaries of the most recent profiles, newest first.
+        
+        Args:
+            limit: Maximum number of summaries
+            
+        Returns:
+            Profile summaries
+        """
+        summaries = []
+        for name in sorted(self._summary_files(), reverse=True)[:limit]:
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as summary_file:
+                    summaries.append(json.load(summary_file))
+            except (OSError, ValueError):
+                # Rotated away or half written by another worker
+                continue
+        return summaries
+    
+    def profile_path(self, profile_id: str) -> Optional[str]:
+        """
+        Get the path of a saved .prof file.
+        
+        Args:
+            profile_id: Id returned by run
+            
+        Returns:
+            The path, or None if there is no such profile
+        """
+        if os.path.basename(profile_id) != profile_id:
+            return None
+        path = os.path.join(self.directory, profile_id + ".prof")
+        return path if os.path.exists(path) else None
+    
+    def _save(self, profile_id: str, profile: "cProfile.Profile", duration: float,
+              metadata: Dict[str, Any]) -> None:
+        """Write the profile and its summary."""
+        import pstats
+        
+        profile.dump_stats(os.path.join(self.directory, profile_id + ".prof"))
+        
+        stats = pstats.Stats(profile)
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        summary = {
+            "id": profile_id,
+            "timestamp": time.time(),
+            "duration_ms": round(duration * 1000, 3),
+            **metadata,
+            "top_functions": [
+                {
+                    "function": f"{filename}:{line}({name})",
+                    "calls": calls,
+                    "tottime_ms": round(tottime * 1000, 3),
+                    "cumtime_ms": round(cumtime * 1000, 3)
+                }
+                for (filename, line, name), (_, calls, tottime, cumtime, _) in top[:SUMMARY_FUNCTIONS]
+            ]
+        }
+        
+        # Write under a temporary name so listings never see a partial file
+        path = os.path.join(self.directory, profile_id + ".json")
+        with open(path + ".tmp", "w", encoding="utf-8") as summary_file:
+            json.dump(summary, summary_file)
+        os.replace(path + ".tmp", path)
+    
+    def _rotate(self) -> None:
+        """Delete the oldest profiles beyond max_profiles."""
+        names = sorted(self._summary_files())
+        for name in names[:max(len(names) - self.max_profiles, 0)]:
+            profile_id = name[:-len(".json")]
+            for suffix in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+    
+    def _summary_files(self) -> List[str]:
+        """Names of the summary files; ids start with a timestamp, so they sort by age."""
+        return [name for name in os.listdir(self.directory) if name.endswith(".json")]
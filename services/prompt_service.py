@@ -3,33 +3,37 @@ Service layer for prompt matching logic.
 Contains business logic for validating input and matching prompts.
 """
 
-from typing import Dict, Any, Union
+from typing import Dict, Any, Optional, Union
+
+from services.rules import RuleSet
+from services.rule_store import get_active_snapshot
 
 
 class PromptMatchingService:
     """Service class for handling prompt matching logic."""
     
-    # Define the valid values for each field
-    VALID_SITUATIONS = ["Commercial Auto", "General Liability", "Workers Compensation"]
-    VALID_LEVELS = ["Structure", "Summarize"]
-    VALID_FILE_TYPES = ["Medical Records", "Deposition", "Summons", "Summary Report"]
-    
-    # Define the prompt matching criteria
-    PROMPT_MAPPING = {
-        ("Commercial Auto", "Structure", "Summary Report"): "Prompt 1",
-        ("General Liability", "Summarize", "Deposition"): "Prompt 2",
-        ("Commercial Auto", "Summarize", "Summons"): "Prompt 3",
-        ("Workers Compensation", "Structure", "Medical Records"): "Prompt 4",
-        ("Workers Compensation", "Summarize", "Summons"): "Prompt 5"
-    }
+    @classmethod
+    def rules(cls) -> RuleSet:
+        """
+        Get the active rule set.
+        
+        The valid values and prompt mapping live in the rule file loaded
+        by the rule store, so rule changes do not need a code change.
+        
+        Returns:
+            The rule set of the current request's snapshot: its tenant's,
+            else the active rule store snapshot
+        """
+        return get_active_snapshot().rules
     
     @classmethod
-    def validate_input(cls, data: Dict[str, Any]) -> Dict[str, str]:
+    def validate_input(cls, data: Dict[str, Any], rules: Optional[RuleSet] = None) -> Dict[str, str]:
         """
         Validate the input data structure and required fields.
         
         Args:
             data: Dictionary containing the input data
+            rules: Rule set to validate against, defaults to the active one
             
         Returns:
             Dictionary with validation errors, empty if valid
@@ -37,7 +41,10 @@ class PromptMatchingService:
         Raises:
             ValueError: If missing required fields
         """
-        required_fields = ["situation", "level", "file_type", "data"]
+        rules = rules or cls.rules()
+        required_fields = [
+            dimension.name for dimension in rules.dimensions if dimension.required
+        ] + ["data"]
         missing_fields = []
         
         # Check for missing fields
@@ -51,23 +58,24 @@ class PromptMatchingService:
         # Validate field values
         validation_errors = {}
         
-        situation = data.get("situation", "").strip()
-        level = data.get("level", "").strip()
-        file_type = data.get("file_type", "").strip()
-        
-        if situation not in cls.VALID_SITUATIONS:
-            validation_errors["situation"] = f"Invalid situation. Must be one of: {', '.join(cls.VALID_SITUATIONS)}"
-        
-        if level not in cls.VALID_LEVELS:
-            validation_errors["level"] = f"Invalid level. Must be one of: {', '.join(cls.VALID_LEVELS)}"
-        
-        if file_type not in cls.VALID_FILE_TYPES:
-            validation_errors["file_type"] = f"Invalid file_type. Must be one of: {', '.join(cls.VALID_FILE_TYPES)}"
+        for dimension in rules.dimensions:
+            value = data.get(dimension.name)
+            
+            # Optional dimensions may be left out
+            if value is None and not dimension.required:
+                continue
+            
+            # Accept aliases and case or punctuation variants of a value
+            if dimension.canonical(value.strip()) is None:
+                validation_errors[dimension.name] = (
+                    f"Invalid {dimension.name}. Must be one of: {', '.join(dimension.values)}"
+                )
         
         return validation_errors
     
     @classmethod
-    def match_prompt(cls, situation: str, level: str, file_type: str) -> str:
+    def match_prompt(cls, situation: str, level: str, file_type: str,
+                     rules: Optional[RuleSet] = None, **extra_fields: str) -> str:
         """
         Match the input criteria to a prompt.
         
@@ -75,6 +83,8 @@ class PromptMatchingService:
             situation: The situation type
             level: The level type
             file_type: The file type
+            rules: Rule set to match against, defaults to the active one
+            extra_fields: Values of any further dimensions of the rule set
             
         Returns:
             The matched prompt name
@@ -82,11 +92,44 @@ class PromptMatchingService:
         Raises:
             ValueError: If no matching prompt is found
         """
-        # Create the lookup key
-        lookup_key = (situation.strip(), level.strip(), file_type.strip())
+        fields = dict(extra_fields, situation=situation, level=level, file_type=file_type)
+        return cls.match_fields(fields, rules)
+    
+    @classmethod
+    def match_fields(cls, fields: Dict[str, Any], rules: Optional[RuleSet] = None) -> str:
+        """
+        Match field values to a prompt using wildcard and priority rules.
         
-        # Try to find a matching prompt
-        matched_prompt = cls.PROMPT_MAPPING.get(lookup_key)
+        Args:
+            fields: Dictionary of field values keyed by dimension name;
+                optional dimensions may be absent or None
+            rules: Rule set to match against, defaults to the active one
+            
+        Returns:
+            The prompt of the highest priority matching rule
+            
+        Raises:
+            ValueError: If no matching prompt is found
+        """
+        snapshot = get_active_snapshot()
+        rules = rules or snapshot.rules
+        
+        # Create the lookup key from the canonical values; unknown
+        # values are only stripped and will not match
+        lookup_key = []
+        for dimension in rules.dimensions:
+            value = fields.get(dimension.name)
+            if value is not None:
+                value = value.strip()
+                value = dimension.lookup.get(value) or dimension.canonical(value) or value
+            lookup_key.append(value)
+        
+        # Walk the compiled decision tree; only a rule set that is not the
+        # active snapshot's is scanned rule by rule
+        if rules is snapshot.rules:
+            matched_prompt = snapshot.match_values(lookup_key)
+        else:
+            matched_prompt = rules.match(lookup_key)
         
         if matched_prompt is None:
             raise ValueError("Invalid Prompt: No matching prompt found for the given criteria")
@@ -94,19 +137,24 @@ class PromptMatchingService:
         return matched_prompt
     
     @classmethod
-    def process_request(cls, data: Dict[str, Any]) -> Dict[str, Union[str, bool]]:
+    def process_request(cls, data: Dict[str, Any],
+                        rules: Optional[RuleSet] = None) -> Dict[str, Union[str, bool]]:
         """
         Process the complete request: validate input and match prompt.
         
         Args:
             data: Dictionary containing the request data
+            rules: Rule set to use, defaults to the active one
             
         Returns:
             Dictionary with success status and result/error message
         """
+        # Use one rule set for the whole request, even if a reload happens
+        rules = rules or cls.rules()
+        
         try:
             # Validate input
-            validation_errors = cls.validate_input(data)
+            validation_errors = cls.validate_input(data, rules)
             
             if validation_errors:
                 return {
@@ -115,13 +163,8 @@ class PromptMatchingService:
                     "details": validation_errors
                 }
             
-            # Extract the validated values
-            situation = data["situation"].strip()
-            level = data["level"].strip()
-            file_type = data["file_type"].strip()
-            
-            # Match the prompt
-            matched_prompt = cls.match_prompt(situation, level, file_type)
+            # Match the prompt on the validated values
+            matched_prompt = cls.match_fields(data, rules)
             
             return {
                 "success": True,
@@ -0,0 +1,284 @@
+"""
+Prompt template library.
+Serves the system prompt text behind each matched prompt name from a
+memory-mapped template file, compiling each template once and keeping
+the compiled templates in a bounded LRU cache.
+"""
+
+import functools
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from services.lazy_json import LazyValue
+from services.rules import DEFAULT_TEMPLATES_PATH  # noqa: F401 (re-exported)
+
+
+logger = logging.getLogger(__name__)
+
+# Line starting a template: "=== <prompt name> ==="
+_HEADER = re.compile(rb"^=== *(.+?) *===[ \t]*\r?\n", re.MULTILINE)
+
+# Placeholder in a template: "{{ name }}" or "{{ data.field.subfield }}"
+_PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*)\s*\}\}")
+
+
+class PromptTemplate:
+    """
+    A compiled template: the literal text between placeholders and the
+    variable path of each placeholder, so rendering is one join.
+    """
+    
+    __slots__ = ("name", "literals", "paths")
+    
+    def __init__(self, name: str, text: str):
+        """
+        Compile a template.
+        
+        Args:
+            name: The prompt name
+            text: The template text
+        """
+        parts = _PLACEHOLDER.split(text)
+        self.name = name
+        self.literals: Tuple[str, ...] = tuple(parts[0::2])
+        self.paths: Tuple[Tuple[str, ...], ...] = tuple(tuple(path.split(".")) for path in parts[1::2])
+    
+    def render(self, variables: Mapping[str, Any]) -> str:
+        """
+        Render the template.
+        
+        A placeholder path walks into nested objects, including a "data"
+        field that holds a JSON object as a string. Missing variables
+        render as an empty string and values that are not strings as JSON.
+        
+        Args:
+            variables: The request variables
+            
+        Returns:
+            The rendered text
+        """
+        pieces = [self.literals[0]]
+        for path, literal in zip(self.paths, self.literals[1:]):
+            pieces.append(_format(_lookup(variables, path)))
+            pieces.append(literal)
+        return "".join(pieces)
+
+
+class TemplateFile:
+    """
+    The templates of one version of the template file.
+    
+    The file is memory-mapped and only scanned for template headers when
+    loaded; a template's text is decoded and compiled on first use, and
+    compiled templates are kept in an LRU cache of cache_size entries.
+    Pages of the map are shared by every process that maps the file,
+    including the forked workers of server.py.
+    """
+    
+    def __init__(self, path: str, cache_size: int = 256):
+        """
+        Map the template file and index its templates.
+        
+        Args:
+            path: Path of the template file
+            cache_size: Compiled templates kept
+            
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If a prompt name appears twice
+        """
+        self.path = path
+        with open(path, "rb") as template_file:
+            stat = os.fstat(template_file.fileno())
+            self._buffer = mmap.mmap(template_file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+        # Identifies this version of the file, e.g. in response cache keys
+        self.version = f"{stat.st_ino}-{stat.st_size}-{stat.st_mtime_ns}"
+        
+        self._index: Dict[str, Tuple[int, int]] = {}
+        headers = list(_HEADER.finditer(self._buffer))
+        for position, header in enumerate(headers):
+            name = header.group(1).decode("utf-8")
+            if name in self._index:
+                raise ValueError(f"Template {name!r} appears twice in {path}")
+            end = headers[position + 1].start() if position + 1 < len(headers) else len(self._buffer)
+            self._index[name] = (header.end(), end)
+        
+        self.get = functools.lru_cache(maxsize=cache_size)(self._compile)
+    
+    @property
+    def names(self) -> List[str]:
+        """Names of the prompts with a template."""
+        return list(self._index)
+    
+    def _compile(self, name: str) -> Optional[PromptTemplate]:
+        """Decode and compile the template of a prompt; None if it has none."""
+        span = self._index.get(name)
+        if span is None:
+            return None
+        text = self._buffer[span[0]:span[1]].decode("utf-8")
+        # The newline before the next header separates templates
+        return PromptTemplate(name, text[:-1] if text.endswith("\n") else text)
+
+
+class TemplateLibrary:
+    """
+    Renders the templates of a template file and picks up changes to it.
+    
+    At most every reload_interval seconds a render checks whether the
+    file changed and, if so, maps the new version and swaps it in as a
+    whole, like the rule store does. Replace the file atomically (write a
+    temporary file and rename it) so a mapped version never changes.
+    """
+    
+    def __init__(self, path: str = DEFAULT_TEMPLATES_PATH, cache_size: int = 256,
+                 reload_interval: float = 0):
+        """
+        Load the template file.
+        
+        Args:
+            path: Path of the template file
+            cache_size: Compiled templates kept
+            reload_interval: Seconds between checks for changes, 0 disables
+            
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the file is invalid
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self.reload_interval = reload_interval
+        self._reload_lock = threading.Lock()
+        self._file_state = self._stat()
+        self._next_check = time.monotonic() + reload_interval
+        self.templates = TemplateFile(path, cache_size)
+    
+    @property
+    def version(self) -> str:
+        """Version of the active templates."""
+        return self.templates.version
+    
+    def render(self, prompt: str, variables: Mapping[str, Any]) -> Optional[str]:
+        """
+        Render the template of a prompt.
+        
+        Args:
+            prompt: The matched prompt name
+            variables: The request variables
+            
+        Returns:
+            The rendered prompt, or None if the prompt has no template
+        """
+        if self.reload_interval and time.monotonic() >= self._next_check:
+            self.reload()
+        template = self.templates.get(prompt)
+        return template.render(variables) if template is not None else None
+    
+    def reload(self, force: bool = False) -> bool:
+        """
+        Load the template file again if it changed.
+        
+        An invalid file is logged and ignored; the previous templates stay active.
+        
+        Args:
+            force: Reload even if the file looks unchanged
+            
+        Returns:
+            True if new templates were swapped in
+        """
+        with self._reload_lock:
+            self._next_check = time.monotonic() + self.reload_interval
+            file_state = self._stat()
+            if not force and file_state == self._file_state:
+                return False
+            
+            try:
+                templates = TemplateFile(self.path, self.cache_size)
+            except (OSError, ValueError) as e:
+                logger.error("Keeping the previous templates, failed to load %s: %s", self.path, e)
+                return False
+            finally:
+                self._file_state = file_state
+            
+            self.templates = templates
+            logger.info("Loaded %d templates from %s", len(templates.names), self.path)
+            return True
+    
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        """Return (inode, size, mtime) of the template file, or None if missing."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _lookup(variables: Mapping[str, Any], path: Tuple[str, ...]) -> Any:
+    """Follow a placeholder path through the variables; None if it is missing."""
+    value: Any = variables
+    for key in path:
+        if isinstance(value, LazyValue):
+            value = value.decode()
+        if isinstance(value, bytes):
+            # A MessagePack bin data field
+            value = value.decode("utf-8", "replace")
+        if isinstance(value, str) and value.lstrip().startswith("{"):
+            # A data string holding a JSON object
+            try:
+                value = json.loads(value)
+            except ValueError:
+                return None
+        if not isinstance(value, Mapping):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _format(value: Any) -> str:
+    """Format a variable for a template."""
+    if isinstance(value, LazyValue):
+        value = value.decode()
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+# Library used by the controllers, None while rendering is disabled
+_template_library: Optional[TemplateLibrary] = None
+
+
+def get_template_library() -> Optional[TemplateLibrary]:
+    """
+    Get the process-wide template library.
+    
+    Returns:
+        The library, or None if no template file is configured
+    """
+    return _template_library
+
+
+def configure_template_library(path: Optional[str], cache_size: int = 256,
+                               reload_interval: float = 0) -> Optional[TemplateLibrary]:
+    """
+    Load the process-wide template library.
+    
+    Args:
+        path: Path of the template file, None to disable rendering
+        cache_size: Compiled templates kept
+        reload_interval: Seconds between checks for changes, 0 disables
+        
+    Returns:
+        The library, or None if rendering is disabled
+    """
+    global _template_library
+    _template_library = TemplateLibrary(path, cache_size, reload_interval) if path else None
+    return _template_library
@@ -0,0 +1,135 @@
+"""
+Rule engine for wildcard and priority prompt rules.
+Compiles rules into a decision tree whose lookup cost depends on the
+number of dimensions, not on the number of rules.
+"""
+
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+
+# Leaves are (priority, -rule_position, prompt) tuples so that the
+# better of two leaves is simply the larger one; None means no rule matches
+Leaf = Optional[Tuple[int, int, str]]
+
+
+class DecisionNode:
+    """
+    Inner node of a decision tree.
+    
+    children maps a dimension value key to the subtree for that value;
+    default is the subtree for every value without its own child, which is
+    where wildcard conditions end up.
+    """
+    
+    __slots__ = ("children", "default")
+    
+    def __init__(self, children: Dict[Any, Any], default: Any):
+        self.children = children
+        self.default = default
+
+
+class DecisionTree:
+    """
+    Decision tree compiled from a list of rules.
+    
+    Every rule is a tuple of conditions, one per dimension, where None is
+    a wildcard. Wildcard branches are merged into the exact branches at
+    compile time, so a lookup follows exactly one path of one node per
+    dimension. When several rules match, the rule with the highest
+    priority wins and ties go to the rule listed first.
+    """
+    
+    def __init__(self, depth: int, rules: Sequence[Tuple[Sequence[Any], str, int]]):
+        """
+        Compile the decision tree.
+        
+        Args:
+            depth: Number of dimensions
+            rules: (conditions, prompt, priority) tuples; conditions hold one
+                key per dimension, None for a wildcard
+        """
+        self.depth = depth
+        self._merge_cache: Dict[Tuple[int, int], Any] = {}
+        self._keep_alive = []
+        
+        root = None
+        for position, (conditions, prompt, priority) in enumerate(rules):
+            if len(conditions) != depth:
+                raise ValueError(f"Rule for {prompt!r} does not have {depth} conditions")
+            root = self._insert(root, conditions, 0, (priority, -position, prompt))
+        
+        self.root = self._specialize(root, 0)
+        self._merge_cache.clear()
+        self._keep_alive.clear()
+    
+    def lookup(self, keys: Sequence[Any]) -> Optional[str]:
+        """
+        Find the prompt of the best matching rule.
+        
+        Args:
+            keys: One key per dimension
+            
+        Returns:
+            The matched prompt, or None if no rule matches
+        """
+        node = self.root
+        for key in keys:
+            if node is None:
+                return None
+            node = node.children.get(key, node.default)
+        return node[2] if node is not None else None
+    
+    def _insert(self, node: Any, conditions: Sequence[Any], level: int, leaf: Leaf) -> Any:
+        """Add a rule below node, returning the (possibly new) node."""
+        if level == self.depth:
+            return leaf if node is None or leaf > node else node
+        
+        if node is None:
+            node = DecisionNode({}, None)
+        key = conditions[level]
+        if key is None:
+            node.default = self._insert(node.default, conditions, level + 1, leaf)
+        else:
+            node.children[key] = self._insert(node.children.get(key), conditions, level + 1, leaf)
+        return node
+    
+    def _specialize(self, node: Any, level: int) -> Any:
+        """Push every default subtree down into the exact children beside it."""
+        if node is None or level == self.depth:
+            return node
+        
+        default = self._specialize(node.default, level + 1)
+        children = {
+            key: self._merge(self._specialize(child, level + 1), default, level + 1)
+            for key, child in node.children.items()
+        }
+        return DecisionNode(children, default)
+    
+    def _merge(self, first: Any, second: Any, level: int) -> Any:
+        """Merge two specialized subtrees, keeping the better leaf everywhere."""
+        if first is None:
+            return second
+        if second is None:
+            return first
+        if level == self.depth:
+            return first if first > second else second
+        
+        # Subtrees are shared, so identical merges are only done once
+        cache_key = (id(first), id(second))
+        merged = self._merge_cache.get(cache_key)
+        if merged is not None:
+            return merged
+        
+        children = {}
+        for key in first.children.keys() | second.children.keys():
+            children[key] = self._merge(
+                first.children.get(key, first.default),
+                second.children.get(key, second.default),
+                level + 1
+            )
+        merged = DecisionNode(children, self._merge(first.default, second.default, level + 1))
+        
+        # Keep merged inputs alive so their ids stay unique while compiling
+        self._keep_alive.append((first, second))
+        self._merge_cache[cache_key] = merged
+        return merged
@@ -0,0 +1,184 @@
+"""
+Prebuilt rule snapshots.
+Saves a compiled rule set to disk so a starting server can load it
+instead of compiling the rule file again.
+
+Build a snapshot from the repository root:
+    python -m services.rule_snapshot -o rules/prompt_rules.snapshot
+
+Snapshots are pickles: only load files written by this module.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+from typing import Optional
+
+from services.compiled_matcher import CompiledPromptMatcher
+from services.rules import DEFAULT_RULES_PATH, RuleSet
+
+
+logger = logging.getLogger(__name__)
+
+# First object in every snapshot file
+SNAPSHOT_MAGIC = "prompt-rules-snapshot"
+
+# Modules whose classes a snapshot holds; editing one invalidates old snapshots
+_COMPILER_MODULES = ("compiled_matcher.py", "rule_engine.py", "rules.py")
+
+# Digest of the compiler sources, computed on first use
+_compiler_digest: Optional[bytes] = None
+
+
+def snapshot_key(rule_bytes: bytes) -> str:
+    """
+    Get the key identifying the snapshot of a rule file.
+    
+    The key covers the rule file contents and the source of the modules
+    that compile it, so a snapshot goes stale when either changes.
+    
+    Args:
+        rule_bytes: Contents of the rule file
+        
+    Returns:
+        Hex digest
+    """
+    global _compiler_digest
+    if _compiler_digest is None:
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in _COMPILER_MODULES:
+            with open(os.path.join(directory, name), "rb") as source:
+                digest.update(source.read())
+        _compiler_digest = digest.digest()
+    return hashlib.sha256(_compiler_digest + rule_bytes).hexdigest()
+
+
+def compile_rules(rule_bytes: bytes) -> CompiledPromptMatcher:
+    """
+    Compile the contents of a rule file.
+    
+    Args:
+        rule_bytes: Contents of the rule file
+        
+    Returns:
+        The compiled rules
+        
+    Raises:
+        ValueError: If the rule file is invalid
+    """
+    return CompiledPromptMatcher.from_rule_set(RuleSet.from_dict(json.loads(rule_bytes)))
+
+
+def load_snapshot(path: str, key: str) -> Optional[CompiledPromptMatcher]:
+    """
+    Load a snapshot if it was built for the given key.
+    
+    Args:
+        path: The snapshot file
+        key: Key of the current rule file, see snapshot_key
+        
+    Returns:
+        The compiled rules, or None if the file is missing, stale or unreadable
+    """
+    try:
+        with open(path, "rb") as snapshot_file:
+            # The header is read first so a stale snapshot is not unpickled in full
+            if pickle.load(snapshot_file) != (SNAPSHOT_MAGIC, key):
+                logger.info("Rule snapshot %s is stale", path)
+                return None
+            snapshot = pickle.load(snapshot_file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Could not load rule snapshot %s: %s", path, e)
+        return None
+    if not isinstance(snapshot, CompiledPromptMatcher):
+        logger.warning("Rule snapshot %s holds a %s", path, type(snapshot).__name__)
+        return None
+    return snapshot
+
+
+def save_snapshot(path: str, key: str, snapshot: CompiledPromptMatcher) -> None:
+    """
+    Write a snapshot atomically, so concurrently starting servers never read half a file.
+    
+    Args:
+        path: The snapshot file
+        key: Key of the rule file the snapshot was compiled from
+        snapshot: The compiled rules
+        
+    Raises:
+        OSError: If the file cannot be written
+    """
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as snapshot_file:
+            pickle.dump((SNAPSHOT_MAGIC, key), snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+
+
+def load_compiled_rules(rules_path: str, snapshot_path: Optional[str] = None) -> CompiledPromptMatcher:
+    """
+    Get the compiled rules of a rule file, from its snapshot when there is a current one.
+    
+    Without a current snapshot the rules are compiled and the snapshot is
+    written for the next start; failing to write it is only logged.
+    
+    Args:
+        rules_path: Path of the JSON rule file
+        snapshot_path: Path of the snapshot file, None to always compile
+        
+    Returns:
+        The compiled rules
+        
+    Raises:
+        OSError: If the rule file cannot be read
+        ValueError: If the rule file is invalid
+    """
+    with open(rules_path, "rb") as rule_file:
+        rule_bytes = rule_file.read()
+    if snapshot_path is None:
+        return compile_rules(rule_bytes)
+    
+    key = snapshot_key(rule_bytes)
+    snapshot = load_snapshot(snapshot_path, key)
+    if snapshot is not None:
+        return snapshot
+    
+    snapshot = compile_rules(rule_bytes)
+    try:
+        save_snapshot(snapshot_path, key, snapshot)
+        logger.info("Wrote rule snapshot %s", snapshot_path)
+    except OSError as e:
+        logger.warning("Could not write rule snapshot %s: %s", snapshot_path, e)
+    return snapshot
+
+
+def main():
+    """Compile a rule file and write its snapshot."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Build a prebuilt snapshot of the compiled rules.")
+    parser.add_argument("--rules", default=DEFAULT_RULES_PATH, help="Rule file to compile")
+    parser.add_argument("-o", "--output", required=True, help="Snapshot file to write")
+    args = parser.parse_args()
+    
+    with open(args.rules, "rb") as rule_file:
+        rule_bytes = rule_file.read()
+    snapshot = compile_rules(rule_bytes)
+    save_snapshot(args.output, snapshot_key(rule_bytes), snapshot)
+    print(f"Wrote rules version {snapshot.version} to {args.output} ({os.path.getsize(args.output)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
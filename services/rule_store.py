@@ -0,0 +1,207 @@
+"""
+Hot-reloadable rule store.
+Watches the rule file and atomically swaps in a newly compiled snapshot
+whenever it changes, and tracks which snapshot the current request uses.
+"""
+
+import logging
+import os
+import threading
+from contextvars import ContextVar, Token
+from typing import Optional, Tuple
+
+from services.compiled_matcher import CompiledPromptMatcher
+from services.rules import DEFAULT_RULES_PATH
+from services.rule_snapshot import load_compiled_rules
+
+
+logger = logging.getLogger(__name__)
+
+
+class RuleStore:
+    """
+    Holds the compiled snapshot of a rule file and keeps it up to date.
+    
+    The active snapshot is a single attribute that is replaced as a whole
+    once a new rule file has been fully loaded and compiled. Readers take
+    one reference to it per request and never lock, so an in-flight
+    request keeps using the snapshot it started with while a reload
+    happens in the background.
+    """
+    
+    def __init__(self, path: str = DEFAULT_RULES_PATH, snapshot_path: Optional[str] = None):
+        """
+        Load and compile the rule file.
+        
+        Args:
+            path: Path of the JSON rule file
+            snapshot_path: Prebuilt snapshot of the compiled rules, loaded
+                instead of compiling when it matches the rule file and
+                rewritten when it does not; None always compiles
+                
+        Raises:
+            OSError: If the rule file cannot be read
+            ValueError: If the rule file is invalid
+        """
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self._reload_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._file_state = self._stat()
+        self.snapshot = load_compiled_rules(path, snapshot_path)
+    
+    @property
+    def version(self) -> str:
+        """Version of the active rule snapshot."""
+        return self.snapshot.version
+    
+    def reload(self, force: bool = False) -> bool:
+        """
+        Reload the rule file if it changed since the last load.
+        
+        An invalid rule file is logged and ignored; the previous snapshot
+        stays active.
+        
+        Args:
+            force: Reload even if the file looks unchanged
+            
+        Returns:
+            True if a new snapshot was swapped in
+        """
+        with self._reload_lock:
+            file_state = self._stat()
+            if not force and file_state == self._file_state:
+                return False
+            
+            try:
+                snapshot = load_compiled_rules(self.path, self.snapshot_path)
+            except (OSError, ValueError) as e:
+                logger.error("Keeping rules version %s, failed to load %s: %s",
+                             self.snapshot.version, self.path, e)
+                return False
+            finally:
+                self._file_state = file_state
+            
+            # Single reference assignment: readers see the old or new snapshot
+            self.snapshot = snapshot
+            logger.info("Loaded rules version %s from %s", snapshot.version, self.path)
+            return True
+    
+    def start_watching(self, interval: float) -> None:
+        """
+        Start a background thread that polls the rule file for changes.
+        
+        Args:
+            interval: Seconds between checks
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        
+        self._stop_event.clear()
+        self._watcher = threading.Thread(
+            target=self._watch,
+            args=(interval,),
+            name="rule-store-watcher",
+            daemon=True
+        )
+        self._watcher.start()
+    
+    def stop_watching(self) -> None:
+        """Stop the background watcher thread, if running."""
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+    
+    def _watch(self, interval: float) -> None:
+        """Poll the rule file until stopped."""
+        while not self._stop_event.wait(interval):
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("Unexpected error while reloading %s", self.path)
+    
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        """Return (inode, size, mtime) of the rule file, or None if missing."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+# Process-wide store used by the service and controllers
+_rule_store: Optional[RuleStore] = None
+
+
+def get_rule_store() -> RuleStore:
+    """
+    Get the process-wide rule store, loading the bundled rules on first use.
+    
+    Returns:
+        The active rule store
+    """
+    global _rule_store
+    if _rule_store is None:
+        _rule_store = RuleStore()
+    return _rule_store
+
+
+def configure_rule_store(path: str = DEFAULT_RULES_PATH, reload_interval: float = 0,
+                         snapshot_path: Optional[str] = None) -> RuleStore:
+    """
+    Replace the process-wide rule store with one for the given rule file.
+    
+    Args:
+        path: Path of the JSON rule file
+        reload_interval: Seconds between checks for changes; 0 disables watching
+        snapshot_path: Prebuilt snapshot of the compiled rules, None always compiles
+        
+    Returns:
+        The new rule store
+    """
+    global _rule_store
+    store = RuleStore(path, snapshot_path)
+    if reload_interval > 0:
+        store.start_watching(reload_interval)
+    
+    previous, _rule_store = _rule_store, store
+    if previous is not None:
+        previous.stop_watching()
+    return store
+
+
+# Snapshot selected for the current request or job, such as a tenant's;
+# None means the process-wide store's. Context variables are per thread
+# and per asyncio task, so concurrent requests never see each other's.
+_request_snapshot: ContextVar[Optional[CompiledPromptMatcher]] = ContextVar("request_snapshot", default=None)
+
+
+def get_active_snapshot() -> CompiledPromptMatcher:
+    """
+    Get the rule snapshot the current request is matched against.
+    
+    Returns:
+        The snapshot selected with use_snapshot, else the process-wide store's
+    """
+    snapshot = _request_snapshot.get()
+    return snapshot if snapshot is not None else get_rule_store().snapshot
+
+
+def use_snapshot(snapshot: Optional[CompiledPromptMatcher]) -> Token:
+    """
+    Select the rule snapshot for the rest of the current request.
+    
+    Args:
+        snapshot: The snapshot, None for the process-wide store's
+        
+    Returns:
+        Token to pass to reset_snapshot when the request ends
+    """
+    return _request_snapshot.set(snapshot)
+
+
+def reset_snapshot(token: Token) -> None:
+    """Restore the snapshot selection from before use_snapshot."""
+    _request_snapshot.reset(token)
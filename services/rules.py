@@ -0,0 +1,333 @@
+"""
+Prompt rule definitions.
+Loads the versioned rule file holding the matching dimensions, their
+valid values and the prompt rules.
+"""
+
+import json
+import os
+import string
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+
+# Rule file shipped with the application
+DEFAULT_RULES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "rules",
+    "prompt_rules.json"
+)
+
+# Template file shipped with the application, see services.prompt_templates
+DEFAULT_TEMPLATES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "rules",
+    "prompt_templates.txt"
+)
+
+# Condition value that matches any value of a dimension
+WILDCARD = "*"
+
+# Punctuation dropped (apostrophes) or read as a space (everything else)
+# when normalizing field values
+_NORMALIZE_TABLE = str.maketrans({
+    **{char: " " for char in string.punctuation},
+    "'": None,
+    "\u2019": None
+})
+
+
+def normalize_value(value: str) -> str:
+    """
+    Normalize a field value for alias lookups.
+    
+    Case-folds the value, drops apostrophes, reads other punctuation as
+    spaces and collapses whitespace, so "Workers' Comp", "workers comp"
+    and "WORKERS-COMP" all normalize to "workers comp".
+    
+    Args:
+        value: The field value
+        
+    Returns:
+        The normalized value
+    """
+    return " ".join(value.casefold().translate(_NORMALIZE_TABLE).split())
+
+
+class Dimension(NamedTuple):
+    """
+    A request field that rules can match on.
+    
+    lookup maps every accepted spelling - the canonical values, their
+    aliases as written and the normalized forms of both - to the
+    canonical value, so resolving a value is one or two dict lookups.
+    """
+    
+    name: str
+    values: Tuple[str, ...]
+    required: bool = True
+    lookup: Mapping[str, str] = MappingProxyType({})
+    
+    @classmethod
+    def build(cls, name: str, values: Sequence[str], required: bool = True,
+              aliases: Optional[Mapping[str, Sequence[str]]] = None) -> "Dimension":
+        """
+        Build a dimension and its lookup index.
+        
+        Args:
+            name: The dimension name
+            values: The canonical values
+            required: Whether requests must include the field
+            aliases: Optional alternative spellings of each canonical value
+            
+        Returns:
+            The dimension
+            
+        Raises:
+            ValueError: If an alias names an unknown value or two values
+                share a normalized spelling
+        """
+        values = tuple(values)
+        lookup: Dict[str, str] = {}
+        
+        def add(spelling: str, canonical: str) -> None:
+            for key in (spelling, normalize_value(spelling)):
+                if lookup.setdefault(key, canonical) != canonical:
+                    raise ValueError(
+                        f"{name} value {spelling!r} is ambiguous between "
+                        f"{lookup[key]!r} and {canonical!r}"
+                    )
+        
+        for value in values:
+            add(value, value)
+        for canonical, spellings in (aliases or {}).items():
+            if canonical not in values:
+                raise ValueError(f"Aliases given for unknown {name} {canonical!r}")
+            if isinstance(spellings, str):
+                raise ValueError(f"Aliases of {name} {canonical!r} must be a list")
+            for spelling in spellings:
+                add(str(spelling), canonical)
+        
+        return cls(name, values, required, MappingProxyType(lookup))
+    
+    def canonical(self, value: str) -> Optional[str]:
+        """
+        Resolve a value, an alias or a variant of either to its canonical value.
+        
+        Args:
+            value: The field value, already stripped
+            
+        Returns:
+            The canonical value, or None if the value is not valid
+        """
+        canonical = self.lookup.get(value)
+        if canonical is None:
+            canonical = self.lookup.get(normalize_value(value))
+        return canonical
+    
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Mapping proxies cannot be pickled, so pickle a copy of the lookup
+        return _restore_dimension, (self.name, self.values, self.required, dict(self.lookup))
+
+
+def _restore_dimension(name: str, values: Tuple[str, ...], required: bool,
+                       lookup: Dict[str, str]) -> Dimension:
+    """Rebuild a pickled dimension around a read-only view of its lookup."""
+    return Dimension(name, values, required, MappingProxyType(lookup))
+
+
+class Rule(NamedTuple):
+    """
+    A prompt rule.
+    
+    conditions holds one value per dimension of the rule set, or None
+    where the rule matches any value (including an absent optional field).
+    """
+    
+    conditions: Tuple[Optional[str], ...]
+    prompt: str
+    priority: int = 0
+
+
+class RuleSet(NamedTuple):
+    """Immutable set of prompt matching rules loaded from a rule file."""
+    
+    version: str
+    dimensions: Tuple[Dimension, ...]
+    rules: Tuple[Rule, ...]
+    
+    @property
+    def valid_situations(self) -> Tuple[str, ...]:
+        """Valid values of the situation field."""
+        return self.values_of("situation")
+    
+    @property
+    def valid_levels(self) -> Tuple[str, ...]:
+        """Valid values of the level field."""
+        return self.values_of("level")
+    
+    @property
+    def valid_file_types(self) -> Tuple[str, ...]:
+        """Valid values of the file_type field."""
+        return self.values_of("file_type")
+    
+    def values_of(self, name: str) -> Tuple[str, ...]:
+        """
+        Get the valid values of a dimension.
+        
+        Args:
+            name: The dimension name
+            
+        Returns:
+            The valid values, empty if the dimension does not exist
+        """
+        for dimension in self.dimensions:
+            if dimension.name == name:
+                return dimension.values
+        return ()
+    
+    def match(self, values: Sequence[Optional[str]]) -> Optional[str]:
+        """
+        Find the prompt for a set of field values by scanning every rule.
+        
+        This is the reference semantics compiled into a DecisionTree: the
+        matching rule with the highest priority wins, and ties go to the
+        rule listed first.
+        
+        Args:
+            values: One value per dimension, None for an absent optional field
+            
+        Returns:
+            The matched prompt, or None if no rule matches
+        """
+        best = None
+        for rule in self.rules:
+            if best is not None and rule.priority <= best.priority:
+                continue
+            if all(
+                condition is None or condition == value
+                for condition, value in zip(rule.conditions, values)
+            ):
+                best = rule
+        return best.prompt if best is not None else None
+    
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> "RuleSet":
+        """
+        Build a rule set from the decoded contents of a rule file.
+        
+        Dimensions are read from "dimensions", or from the
+        valid_situations/valid_levels/valid_file_types lists of older
+        rule files. A dimension may list "aliases", mapping canonical
+        values to alternative spellings; older rule files give them in a
+        top-level "aliases" object keyed by dimension name. Rules are read from "rules" (or "prompt_mapping");
+        each rule names a value per dimension, "*" or an omitted dimension
+        matches any value, and "priority" defaults to 0.
+        
+        Args:
+            raw: Dictionary with the version, dimensions and rules
+            
+        Returns:
+            The rule set
+            
+        Raises:
+            ValueError: If the rule file is malformed
+        """
+        if not isinstance(raw, dict):
+            raise ValueError("Rule file must contain a JSON object")
+        
+        if "version" not in raw:
+            raise ValueError("Rule file is missing keys: version")
+        
+        dimensions = cls._parse_dimensions(raw)
+        
+        entries = raw.get("rules", raw.get("prompt_mapping"))
+        if not isinstance(entries, list):
+            raise ValueError("Rule file must contain a list of rules")
+        
+        return cls(
+            version=str(raw["version"]),
+            dimensions=dimensions,
+            rules=tuple(cls._parse_rule(entry, dimensions) for entry in entries)
+        )
+    
+    @staticmethod
+    def _parse_dimensions(raw: Dict[str, Any]) -> Tuple[Dimension, ...]:
+        """Read the dimensions of a rule file."""
+        if "dimensions" not in raw:
+            legacy_keys = [
+                ("situation", "valid_situations"),
+                ("level", "valid_levels"),
+                ("file_type", "valid_file_types")
+            ]
+            missing_keys = [key for _, key in legacy_keys if key not in raw]
+            if missing_keys:
+                raise ValueError(f"Rule file is missing keys: dimensions or {', '.join(missing_keys)}")
+            aliases = raw.get("aliases", {})
+            if not isinstance(aliases, dict):
+                raise ValueError("Rule file aliases must be an object")
+            return tuple(
+                Dimension.build(name, raw[key], aliases=aliases.get(name))
+                for name, key in legacy_keys
+            )
+        
+        dimensions: List[Dimension] = []
+        for entry in raw["dimensions"]:
+            try:
+                dimension = Dimension.build(
+                    str(entry["name"]),
+                    entry["values"],
+                    bool(entry.get("required", True)),
+                    entry.get("aliases")
+                )
+            except (KeyError, TypeError, AttributeError):
+                raise ValueError(f"Invalid dimension: {entry!r}")
+            if dimension.name == "data" or dimension.name in (d.name for d in dimensions):
+                raise ValueError(f"Invalid dimension name: {dimension.name!r}")
+            dimensions.append(dimension)
+        return tuple(dimensions)
+    
+    @staticmethod
+    def _parse_rule(entry: Mapping[str, Any], dimensions: Tuple[Dimension, ...]) -> Rule:
+        """Read one rule of a rule file."""
+        if not isinstance(entry, dict) or "prompt" not in entry:
+            raise ValueError(f"Invalid rule: {entry!r}")
+        
+        known_keys = {"prompt", "priority"} | {dimension.name for dimension in dimensions}
+        unknown_keys = set(entry) - known_keys
+        if unknown_keys:
+            raise ValueError(f"Rule {entry!r} uses unknown fields: {', '.join(sorted(unknown_keys))}")
+        
+        conditions = []
+        for dimension in dimensions:
+            value = entry.get(dimension.name, WILDCARD)
+            if value == WILDCARD:
+                conditions.append(None)
+            elif value in dimension.values:
+                conditions.append(value)
+            else:
+                raise ValueError(f"Rule {entry!r} uses unknown {dimension.name} {value!r}")
+        
+        priority = entry.get("priority", 0)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError(f"Rule {entry!r} has a non-integer priority")
+        
+        return Rule(tuple(conditions), str(entry["prompt"]), priority)
+
+
+def load_rule_set(path: str = DEFAULT_RULES_PATH) -> RuleSet:
+    """
+    Load a rule set from a JSON rule file.
+    
+    Args:
+        path: Path of the rule file
+        
+    Returns:
+        The rule set
+        
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file is not a valid rule file
+    """
+    with open(path, "r", encoding="utf-8") as rule_file:
+        return RuleSet.from_dict(json.load(rule_file))
@@ -0,0 +1,202 @@
+"""
+Tenant rule sets.
+Loads the rule file of each tenant from a directory on first use,
+compiles it once and keeps the compiled snapshots in an LRU bounded by
+count and approximate memory.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from services.compiled_matcher import CompiledPromptMatcher
+from services.rules import load_rule_set
+
+
+logger = logging.getLogger(__name__)
+
+# Tenant names map to <directory>/<tenant>.json, so they cannot contain separators
+TENANT_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+
+
+class TenantEntry(NamedTuple):
+    """A compiled tenant rule set and what is needed to keep it current."""
+    snapshot: CompiledPromptMatcher
+    file_state: Tuple[int, int, int]
+    size: int
+    checked: float
+
+
+class TenantRuleSets:
+    """
+    Compiled rule sets of many tenants in a memory-bounded LRU.
+    
+    A tenant's rule file is read and compiled the first time the tenant
+    is seen; afterwards a lookup is one dict operation under a lock, so
+    hot tenants never touch the disk. Files are checked for changes at
+    most every reload_interval seconds. The least recently used tenants
+    are evicted once max_entries or max_bytes is exceeded and compiled
+    again when they return.
+    """
+    
+    def __init__(self, directory: str, max_entries: int = 1000,
+                 max_bytes: int = 256 * 1024 * 1024, reload_interval: float = 0):
+        """
+        Args:
+            directory: Directory holding one <tenant>.json rule file per tenant
+            max_entries: Compiled rule sets kept
+            max_bytes: Memory used by the kept rule sets, roughly
+            reload_interval: Seconds between checks of a cached tenant's file, 0 for never
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.reload_interval = reload_interval
+        self._entries: "OrderedDict[str, TenantEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # One lock per tenant being loaded, so a cold tenant is compiled once
+        self._loading: Dict[str, threading.Lock] = {}
+        self._counts = {"hit": 0, "miss": 0, "unknown": 0, "reload": 0, "eviction": 0, "error": 0}
+        self._compile_seconds = 0.0
+        self._compiles = 0
+    
+    def get(self, tenant: str) -> Optional[CompiledPromptMatcher]:
+        """
+        Get the compiled rule set of a tenant, loading it if needed.
+        
+        A rule file that fails to load is logged; a previously loaded
+        version of it stays in use.
+        
+        Args:
+            tenant: The tenant name
+            
+        Returns:
+            The tenant's compiled rule set, or None if the tenant has no
+            valid rule file
+        """
+        if not TENANT_NAME.fullmatch(tenant):
+            return None
+        
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(tenant)
+            if entry is not None and (not self.reload_interval or now - entry.checked < self.reload_interval):
+                self._entries.move_to_end(tenant)
+                self._counts["hit"] += 1
+                return entry.snapshot
+            load_lock = self._loading.setdefault(tenant, threading.Lock())
+        
+        with load_lock:
+            try:
+                return self._load(tenant, now)
+            finally:
+                with self._lock:
+                    self._loading.pop(tenant, None)
+    
+    def stats(self) -> Dict[str, float]:
+        """
+        Get the cache counters.
+        
+        Returns:
+            Lookups by result, evictions and load errors, compile time,
+            plus the tenants and bytes held
+        """
+        with self._lock:
+            return dict(self._counts, entries=len(self._entries), bytes=self._bytes,
+                        compile_seconds=self._compile_seconds, compiles=self._compiles)
+    
+    def render_metrics(self) -> str:
+        """
+        Render the counters in the Prometheus text exposition format.
+        
+        Returns:
+            The metrics text
+        """
+        stats = self.stats()
+        lines = [
+            "# HELP prompt_tenant_rules_total Tenant rule set lookups by result, evictions and load errors.",
+            "# TYPE prompt_tenant_rules_total counter"
+        ]
+        for result in ("hit", "miss", "unknown", "reload", "eviction", "error"):
+            lines.append(f'prompt_tenant_rules_total{{result="{result}"}} {stats[result]}')
+        lines += [
+            "# HELP prompt_tenant_compile_seconds Time spent loading and compiling tenant rule files.",
+            "# TYPE prompt_tenant_compile_seconds summary",
+            f"prompt_tenant_compile_seconds_sum {stats['compile_seconds']!r}",
+            f"prompt_tenant_compile_seconds_count {stats['compiles']}",
+            "# HELP prompt_tenant_rules_cached Tenant rule sets held in memory.",
+            "# TYPE prompt_tenant_rules_cached gauge",
+            f"prompt_tenant_rules_cached {stats['entries']}",
+            "# HELP prompt_tenant_rules_bytes Approximate memory held by cached tenant rule sets.",
+            "# TYPE prompt_tenant_rules_bytes gauge",
+            f"prompt_tenant_rules_bytes {stats['bytes']}"
+        ]
+        return "\n".join(lines) + "\n"
+    
+    def _load(self, tenant: str, now: float) -> Optional[CompiledPromptMatcher]:
+        """Load or revalidate a tenant's rule set; called with the tenant's load lock held."""
+        with self._lock:
+            entry = self._entries.get(tenant)
+            if entry is not None and entry.checked >= now:
+                # Loaded or checked by another thread while this one waited
+                self._counts["hit"] += 1
+                return entry.snapshot
+        
+        path = os.path.join(self.directory, tenant + ".json")
+        try:
+            stat = os.stat(path)
+            file_state = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            with self._lock:
+                if entry is not None:
+                    self._remove(tenant)
+                self._counts["unknown"] += 1
+            return None
+        
+        if entry is not None and entry.file_state == file_state:
+            with self._lock:
+                if tenant in self._entries:
+                    self._entries[tenant] = entry._replace(checked=time.monotonic())
+                    self._entries.move_to_end(tenant)
+                self._counts["hit"] += 1
+            return entry.snapshot
+        
+        started = time.perf_counter()
+        try:
+            snapshot = CompiledPromptMatcher.from_rule_set(load_rule_set(path))
+        except (OSError, ValueError) as e:
+            logger.error("Failed to load rules of tenant %s from %s: %s", tenant, path, e)
+            with self._lock:
+                self._counts["error"] += 1
+                if entry is not None and tenant in self._entries:
+                    # Keep the previous rules, and do not retry before the next check
+                    self._entries[tenant] = entry._replace(file_state=file_state, checked=time.monotonic())
+            return entry.snapshot if entry is not None else None
+        elapsed = time.perf_counter() - started
+        
+        with self._lock:
+            self._compile_seconds += elapsed
+            self._compiles += 1
+            self._counts["reload" if entry is not None else "miss"] += 1
+            if tenant in self._entries:
+                self._remove(tenant)
+            self._insert(tenant, TenantEntry(snapshot, file_state, snapshot.footprint(), time.monotonic()))
+        logger.info("Loaded rules version %s of tenant %s in %.1f ms", snapshot.version, tenant, elapsed * 1000)
+        return snapshot
+    
+    def _insert(self, tenant: str, entry: TenantEntry) -> None:
+        """Add an entry and evict least recently used ones over the caps; lock held."""
+        self._entries[tenant] = entry
+        self._bytes += entry.size
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self._counts["eviction"] += 1
+    
+    def _remove(self, tenant: str) -> None:
+        """Drop an entry; lock held."""
+        self._bytes -= self._entries.pop(tenant).size
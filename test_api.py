@@ -5,8 +5,16 @@ Tests various scenarios including valid inputs, missing data, and invalid prompt
 
 import requests
 import json
+import os
+import tempfile
+import threading
+import time
 from typing import Dict, Any
 
+from app import create_app
+from client import PromptClient
+from services.msgpack_codec import packb, unpackb
+
 
 class APITester:
     """Class to test the Prompt Matching API."""
@@ -14,6 +22,8 @@ class APITester:
     def __init__(self, base_url: str = "http://localhost:5000"):
         self.base_url = base_url
         self.endpoint = f"{base_url}/match-prompt"
+        # Uncached, so every case reaches the server
+        self.client = PromptClient(base_url, cache_ttl=0)
     
     def test_valid_prompts(self):
         """Test all valid prompt matching scenarios."""
@@ -207,6 +217,67 @@ class APITester:
         }
         self._run_test(whitespace_test)
         
+        # Test aliases and case or punctuation variants
+        alias_test = {
+            "name": "Aliases and value variants",
+            "data": {
+                "situation": "commercial auto",
+                "level": "STRUCTURE",
+                "file_type": "summary-report",
+                "data": "test data"
+            },
+            "expected": "Prompt 1"
+        }
+        self._run_test(alias_test)
+        
+        # Test the rendered prompt text
+        print(f"Testing rendered prompt...")
+        try:
+            result = self.client.match("CA", "Structure", "Summary Report", "test data", render=True)
+            rendered = result.get("rendered_prompt") or ""
+            success = "Commercial Auto" in rendered and rendered.endswith("test data")
+            print(f"✓ Rendered prompt: {'PASS' if success else 'FAIL'}")
+        except Exception as e:
+            print(f"✗ Rendered prompt: FAIL - {e}")
+        
+        # Test a MessagePack request and response
+        print(f"Testing MessagePack request...")
+        try:
+            response = requests.post(
+                self.endpoint,
+                data=packb({
+                    "situation": "Commercial Auto",
+                    "level": "Structure",
+                    "file_type": "Summary Report",
+                    "data": b"test data"
+                }),
+                headers={"Content-Type": "application/msgpack"}
+            )
+            success = (
+                response.headers.get("Content-Type", "").startswith("application/msgpack") and
+                unpackb(response.content) == {"success": True, "prompt": "Prompt 1"}
+            )
+            print(f"✓ MessagePack request: {'PASS' if success else 'FAIL'}")
+        except Exception as e:
+            print(f"✗ MessagePack request: FAIL - {e}")
+        
+        # Test a cacheable GET lookup and its revalidation
+        print(f"Testing GET lookup with ETag...")
+        try:
+            params = {"situation": "Commercial Auto", "level": "Structure", "file_type": "Summary Report"}
+            response = requests.get(self.endpoint, params=params)
+            revalidated = requests.get(
+                self.endpoint, params=params, headers={"If-None-Match": response.headers.get("ETag", "")}
+            )
+            success = (
+                response.json() == {"success": True, "prompt": "Prompt 1"} and
+                "max-age" in response.headers.get("Cache-Control", "") and
+                revalidated.status_code == 304
+            )
+            print(f"✓ GET lookup with ETag: {'PASS' if success else 'FAIL'}")
+        except Exception as e:
+            print(f"✗ GET lookup with ETag: FAIL - {e}")
+        
         # Test non-JSON request
         print(f"Testing non-JSON request...")
         try:
@@ -223,17 +294,273 @@ class APITester:
             print(f"✓ Non-JSON request: {'PASS' if success else 'FAIL'}")
         except Exception as e:
             print(f"✗ Non-JSON request: FAIL - {e}")
+        
+        # Test a body large enough to be spooled to disk
+        large_body_test = {
+            "name": "Large data field",
+            "data": {
+                "situation": "Commercial Auto",
+                "level": "Structure",
+                "file_type": "Summary Report",
+                "data": "x" * (2 * 1024 * 1024)
+            },
+            "expected": "Prompt 1"
+        }
+        self._run_test(large_body_test)
     
-    def _run_test(self, test_case: Dict[str, Any]):
-        """Run a single test case."""
+    def test_batch_requests(self):
+        """Test the bulk matching endpoint with JSON and NDJSON bodies."""
+        print("\nTesting Batch Requests:")
+        print("-" * 50)
+        
+        batch = [
+            {
+                "situation": "Commercial Auto",
+                "level": "Structure",
+                "file_type": "Summary Report",
+                "data": "test data"
+            },
+            {
+                "situation": "Commercial Auto",
+                "level": "Structure",
+                "data": "test data"
+            },
+            {
+                "situation": "General Liability",
+                "level": "Structure",
+                "file_type": "Summary Report",
+                "data": "test data"
+            }
+        ]
+        expected = [(200, "Prompt 1"), (400, "Missing Data"), (422, "Invalid Prompt")]
+        
+        try:
+            response = requests.post(f"{self.endpoint}/batch", json=batch)
+            results = response.json()["results"]
+            success = [
+                (r["status"], r.get("prompt") or r.get("error")) for r in results
+            ] == expected
+            print(f"✓ JSON array batch: {'PASS' if success else 'FAIL'}")
+            if not success:
+                print(f"  Got: {results}")
+        except Exception as e:
+            print(f"✗ JSON array batch: FAIL - {e}")
+        
         try:
             response = requests.post(
-                self.endpoint,
-                json=test_case["data"],
-                headers={"Content-Type": "application/json"}
+                f"{self.endpoint}/batch",
+                data="\n".join(json.dumps(item) for item in batch),
+                headers={"Content-Type": "application/x-ndjson"}
             )
-            
-            result = response.json()
+            results = [json.loads(line) for line in response.text.splitlines()]
+            success = [
+                (r["status"], r.get("prompt") or r.get("error")) for r in results
+            ] == expected
+            print(f"✓ NDJSON batch: {'PASS' if success else 'FAIL'}")
+            if not success:
+                print(f"  Got: {results}")
+        except Exception as e:
+            print(f"✗ NDJSON batch: FAIL - {e}")
+        
+        # Malformed and empty JSON batches are client errors, not server errors
+        for name, body, message in [
+            ("Malformed JSON batch", '[{"a":', "Invalid JSON format"),
+            ("Empty JSON batch", "", "Request body must be a JSON array of match requests")
+        ]:
+            try:
+                response = requests.post(
+                    f"{self.endpoint}/batch",
+                    data=body,
+                    headers={"Content-Type": "application/json"}
+                )
+                result = response.json()
+                success = response.status_code == 400 and result.get("message") == message
+                print(f"✓ {name}: {'PASS' if success else 'FAIL'}")
+                if not success:
+                    print(f"  Got: {response.status_code} {result}")
+            except Exception as e:
+                print(f"✗ {name}: FAIL - {e}")
+    
+    def test_client(self):
+        """Test that the client batches concurrent calls and caches repeated lookups."""
+        print("\nTesting Client:")
+        print("-" * 50)
+        
+        try:
+            with PromptClient(self.base_url) as client:
+                results = [None] * 20
+                
+                def match(index):
+                    results[index] = client.match("Commercial Auto", "Structure", "Summary Report", str(index))
+                
+                threads = [threading.Thread(target=match, args=(index,)) for index in range(len(results))]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                repeated = client.match("Commercial Auto", "Structure", "Summary Report", "other data")
+                success = (
+                    all(result == {"success": True, "prompt": "Prompt 1"} for result in results) and
+                    repeated["prompt"] == "Prompt 1" and
+                    client.cache.stats()["hits"] >= 1
+                )
+            print(f"✓ Client batching and cache: {'PASS' if success else 'FAIL'}")
+        except Exception as e:
+            print(f"✗ Client batching and cache: FAIL - {e}")
+    
+    def test_metrics(self):
+        """Test that match requests show up on the metrics endpoint."""
+        print("\nTesting Metrics:")
+        print("-" * 50)
+        
+        try:
+            response = requests.get(f"{self.base_url}/metrics")
+            text = response.text
+            success = (
+                response.status_code == 200 and
+                'prompt_requests_total{outcome="Prompt 1"}' in text and
+                'prompt_stage_seconds_count{stage="json_parse"}' in text
+            )
+            print(f"✓ Metrics endpoint: {'PASS' if success else 'FAIL'}")
+        except Exception as e:
+            print(f"✗ Metrics endpoint: FAIL - {e}")
+    
+    def test_jobs(self):
+        """Test submitting a background job and long-polling its result."""
+        print("\nTesting Background Jobs:")
+        print("-" * 50)
+        
+        try:
+            response = requests.post(f"{self.base_url}/jobs", json={
+                "situation": "Commercial Auto",
+                "level": "Structure",
+                "file_type": "Summary Report",
+                "data": "test data"
+            })
+            if response.status_code == 404:
+                print("✓ Background job: SKIPPED - JOBS_ENABLED is off")
+                return
+            job = requests.get(
+                f"{self.base_url}{response.headers['Location']}", params={"wait": 10}
+            ).json()
+            success = (
+                response.status_code == 202 and
+                job.get("status") == "done" and
+                job.get("result_status") == 200 and
+                job.get("result", {}).get("prompt") == "Prompt 1"
+            )
+            print(f"✓ Background job: {'PASS' if success else 'FAIL'}")
+        except Exception as e:
+            print(f"✗ Background job: FAIL - {e}")
+    
+    def test_feature_combinations(self):
+        """Test features that interact, each on an in-process app with its own config."""
+        print("\nTesting Feature Combinations:")
+        print("-" * 50)
+        
+        body = {
+            "situation": "Commercial Auto",
+            "level": "Structure",
+            "file_type": "Summary Report",
+            "data": "test data"
+        }
+        
+        try:
+            client = create_app({
+                "RULES_RELOAD_INTERVAL": 0,
+                "FAST_PATH_ENABLED": True,
+                "RESPONSE_CACHE_ENABLED": True
+            }).test_client()
+            client.post("/match-prompt", json=body)
+            repeated = client.post("/match-prompt", json=body)
+            key = {"Idempotency-Key": "combination-test"}
+            first = client.post("/match-prompt", json=body, headers=key)
+            reused = client.post("/match-prompt", json=dict(body, data="other data"), headers=key)
+            success = (
+                repeated.headers.get("X-Cache") == "HIT" and
+                first.status_code == 200 and
+                reused.status_code == 422 and
+                reused.get_json().get("error") == "Idempotency Key Reused"
+            )
+            print(f"✓ Fast path with response cache: {'PASS' if success else 'FAIL'}")
+            if not success:
+                print(f"  Got: {repeated.headers.get('X-Cache')} {reused.status_code} {reused.get_json()}")
+        except Exception as e:
+            print(f"✗ Fast path with response cache: FAIL - {e}")
+        
+        try:
+            client = create_app({"RULES_RELOAD_INTERVAL": 0, "FAST_PATH_ENABLED": True}).test_client()
+            responses = [
+                client.post("/match-prompt", json=dict(body, **fields))
+                for fields in ({"level": "Unknown"}, {"situation": "Unknown"}, {"level": "Unknown"})
+            ]
+            details = [set(response.get_json().get("details", {})) for response in responses]
+            success = (
+                all(response.status_code == 422 for response in responses) and
+                details == [{"level"}, {"situation"}, {"level"}]
+            )
+            print(f"✓ Fast path validation errors: {'PASS' if success else 'FAIL'}")
+            if not success:
+                print(f"  Got: {[response.status_code for response in responses]} {details}")
+        except Exception as e:
+            print(f"✗ Fast path validation errors: FAIL - {e}")
+        
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for name, config, headers in [
+                    ("Fast path with profile header", {}, {"X-Profile": "1"}),
+                    ("Fast path with sampled profiling", {"PROFILE_SAMPLE_RATE": 1.0}, {})
+                ]:
+                    client = create_app(dict(
+                        config,
+                        RULES_RELOAD_INTERVAL=0,
+                        FAST_PATH_ENABLED=True,
+                        PROFILING_ENABLED=True,
+                        PROFILE_DIR=os.path.join(directory, name.replace(" ", "-"))
+                    )).test_client()
+                    response = client.post("/match-prompt", json=body, headers=headers)
+                    profiles = client.get("/profiles").get_json()["profiles"]
+                    success = (
+                        response.status_code == 200 and
+                        "X-Profile-Id" in response.headers and
+                        len(profiles) == 1
+                    )
+                    print(f"✓ {name}: {'PASS' if success else 'FAIL'}")
+                    if not success:
+                        print(f"  Got: {response.status_code} {profiles}")
+        except Exception as e:
+            print(f"✗ Fast path with profiling: FAIL - {e}")
+        
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                app = create_app({
+                    "RULES_RELOAD_INTERVAL": 0,
+                    "ADMISSION_ENABLED": True,
+                    "ADMISSION_INITIAL_CONCURRENCY": 1,
+                    "JOBS_ENABLED": True,
+                    "JOBS_DB_PATH": os.path.join(directory, "jobs.sqlite3"),
+                    # No workers, so the job stays queued and the poll waits
+                    "JOBS_WORKERS": 0
+                })
+                # Closed so the submission releases its concurrency slot
+                with app.test_client().post("/jobs", json=body) as submitted:
+                    location = submitted.headers["Location"]
+                poll = threading.Thread(target=lambda: app.test_client().get(location, query_string={"wait": 2}))
+                poll.start()
+                time.sleep(0.3)
+                response = app.test_client().post("/match-prompt", json=body)
+                poll.join()
+            success = response.status_code == 200
+            print(f"✓ Match request admitted during a job poll: {'PASS' if success else 'FAIL'}")
+            if not success:
+                print(f"  Got: {response.status_code} {response.get_json()}")
+        except Exception as e:
+            print(f"✗ Match request admitted during a job poll: FAIL - {e}")
+    
+    def _run_test(self, test_case: Dict[str, Any]):
+        """Run a single test case."""
+        try:
+            result = self.client.match_request(test_case["data"])
             
             if "expected" in test_case:
                 # Test for successful prompt match
@@ -272,6 +599,11 @@ class APITester:
         self.test_missing_data_scenarios()
         self.test_invalid_prompt_scenarios()
         self.test_edge_cases()
+        self.test_batch_requests()
+        self.test_client()
+        self.test_metrics()
+        self.test_jobs()
+        self.test_feature_combinations()
         
         print("\n" + "=" * 60)
         print("TESTS COMPLETED")
@@ -0,0 +1,176 @@
+"""
+WSGI admission control.
+Sheds excess requests with pre-encoded 429 and 503 responses before
+Flask routes them or reads their bodies.
+"""
+
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from werkzeug.http import HTTP_STATUS_CODES
+
+from services.admission import AdaptiveConcurrencyLimit, TokenBucketLimiter
+from services.metrics import get_request_metrics
+from views.encoding import encode_json
+
+
+# Paths whose latency is fed to the adaptive concurrency limit
+SAMPLED_PATHS = frozenset({"/match-prompt"})
+
+# Status line, body and metrics outcome of a rejection
+Rejection = Tuple[str, bytes, str]
+
+
+def _encode_error(status_code: int, message: str) -> Rejection:
+    """Encode an error response into its status line, body and outcome."""
+    name = HTTP_STATUS_CODES[status_code]
+    return (
+        f"{status_code} {name.upper()}",
+        encode_json({"success": False, "error": name, "message": message}),
+        name
+    )
+
+
+class AdmissionMiddleware:
+    """
+    WSGI middleware that admits or rejects each request before the app
+    sees it.
+    
+    A client over its token bucket rate gets a 429 and a client arriving
+    while the adaptive concurrency limit is reached gets a 503, both with
+    Retry-After. The decision takes a couple of dict operations under a
+    lock and the responses are encoded once, so shedding a request costs
+    microseconds and never touches its body. Exempt paths (health checks,
+    metrics, job long polls) are always admitted; an exempt path ending in
+    "/" exempts every path under it.
+    
+    The limits are kept per process. Under server.py every worker has its
+    own token buckets, so ADMISSION_RATE applies per worker, and a worker
+    serves one request at a time, so its concurrency limit never sheds;
+    there the limit only matters for threaded servers.
+    """
+    
+    def __init__(self, wsgi_app: Callable, config: Dict[str, Any]):
+        """
+        Args:
+            wsgi_app: The WSGI app to protect
+            config: The Flask app config (ADMISSION_* settings)
+        """
+        self.wsgi_app = wsgi_app
+        header = config.get("ADMISSION_CLIENT_HEADER", "X-Client-Id")
+        self.client_header = "HTTP_" + header.upper().replace("-", "_")
+        exempt = config.get("ADMISSION_EXEMPT_PATHS", ())
+        self.exempt_paths = frozenset(path for path in exempt if not path.endswith("/"))
+        self.exempt_prefixes = tuple(path for path in exempt if path.endswith("/"))
+        
+        rate = config.get("ADMISSION_RATE", 0)
+        self.rate_limiter = TokenBucketLimiter(
+            rate, config.get("ADMISSION_BURST", rate), config.get("ADMISSION_MAX_CLIENTS", 10000)
+        ) if rate else None
+        self.concurrency_limit = AdaptiveConcurrencyLimit(
+            config.get("ADMISSION_INITIAL_CONCURRENCY", 20),
+            config.get("ADMISSION_MIN_CONCURRENCY", 1),
+            config.get("ADMISSION_MAX_CONCURRENCY", 200),
+            config.get("ADMISSION_LATENCY_TOLERANCE", 2.0)
+        ) if config.get("ADMISSION_MAX_CONCURRENCY", 200) else None
+        
+        self._rate_limited = _encode_error(429, "Request rate limit exceeded, retry later")
+        self._overloaded = _encode_error(503, "Server is overloaded, retry later")
+        self.rejected = {"rate_limited": 0, "overloaded": 0}
+        self._rejected_lock = threading.Lock()
+    
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        path = environ.get("PATH_INFO", "")
+        if path in self.exempt_paths or path.startswith(self.exempt_prefixes):
+            return self.wsgi_app(environ, start_response)
+        
+        if self.rate_limiter is not None:
+            client = environ.get(self.client_header) or environ.get("REMOTE_ADDR", "")
+            wait = self.rate_limiter.acquire(client)
+            if wait:
+                with self._rejected_lock:
+                    self.rejected["rate_limited"] += 1
+                return self._reject(start_response, self._rate_limited, wait)
+        
+        if self.concurrency_limit is None:
+            return self.wsgi_app(environ, start_response)
+        if not self.concurrency_limit.acquire():
+            with self._rejected_lock:
+                self.rejected["overloaded"] += 1
+            return self._reject(start_response, self._overloaded, 1)
+        
+        started = time.perf_counter()
+        try:
+            response = self.wsgi_app(environ, start_response)
+        except BaseException:
+            self.concurrency_limit.release()
+            raise
+        # Streamed responses hold their slot until the server closes them
+        return _ReleasingIterable(response, self.concurrency_limit, started, path in SAMPLED_PATHS)
+    
+    def render_metrics(self) -> str:
+        """
+        Render rejection counts and the concurrency limit in the Prometheus text exposition format.
+        
+        Returns:
+            The metrics text
+        """
+        lines = [
+            "# HELP prompt_admission_rejected_total Requests shed by admission control.",
+            "# TYPE prompt_admission_rejected_total counter"
+        ]
+        with self._rejected_lock:
+            rejected = dict(self.rejected)
+        for reason, count in rejected.items():
+            lines.append(f'prompt_admission_rejected_total{{reason="{reason}"}} {count}')
+        if self.concurrency_limit is not None:
+            stats = self.concurrency_limit.stats()
+            lines += [
+                "# HELP prompt_admission_concurrency_limit Current adaptive limit on requests in flight.",
+                "# TYPE prompt_admission_concurrency_limit gauge",
+                f"prompt_admission_concurrency_limit {stats['limit']!r}",
+                "# HELP prompt_admission_in_flight Requests in flight.",
+                "# TYPE prompt_admission_in_flight gauge",
+                f"prompt_admission_in_flight {stats['in_flight']}"
+            ]
+        return "\n".join(lines) + "\n"
+    
+    @staticmethod
+    def _reject(start_response: Callable, rejection: Rejection, retry_after: float) -> List[bytes]:
+        """Send a pre-encoded rejection with a Retry-After in whole seconds."""
+        status, body, outcome = rejection
+        start_response(status, [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body))),
+            ("Retry-After", str(max(1, math.ceil(retry_after))))
+        ])
+        get_request_metrics().count(outcome)
+        return [body]
+
+
+class _ReleasingIterable:
+    """Wraps a WSGI response to release its concurrency slot when it is closed."""
+    
+    def __init__(self, response: Iterable[bytes], limit: AdaptiveConcurrencyLimit,
+                 started: float, sampled: bool):
+        self.response = response
+        self.limit = limit
+        self.started = started
+        self.sampled = sampled
+        self.closed = False
+    
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.response)
+    
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            close: Optional[Callable] = getattr(self.response, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self.limit.release(time.perf_counter() - self.started if self.sampled else None)
@@ -0,0 +1,346 @@
+"""
+HTTP body compression.
+Decompresses gzip, deflate and zstd request bodies as they are read, with
+a cap on the decompressed size, and compresses large responses for
+clients that accept it.
+"""
+
+import io
+import zlib
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wsgi import LimitedStream
+
+from views.encoding import MSGPACK_MIMETYPES, encode_json
+from views.request_body import DecompressionError  # noqa: F401 (re-exported)
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+
+# Compressed bytes read from the request stream at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+# Response bytes compressed before a streamed response is flushed to the client
+STREAM_FLUSH_BYTES = 16 * 1024
+
+# Response content types worth compressing
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/ndjson", "text/") + MSGPACK_MIMETYPES
+
+
+def request_encodings() -> Tuple[str, ...]:
+    """Content-Encodings accepted on request bodies."""
+    return ("gzip", "x-gzip", "deflate") + (("zstd",) if zstandard is not None else ())
+
+
+class DecompressingReader(io.RawIOBase):
+    """
+    A readable stream of the decompressed contents of a compressed stream.
+    
+    Input is read and decompressed one chunk at a time and never more
+    output than the caller asked for is produced, so a small body that
+    expands enormously (a zip bomb) costs no more memory than any other
+    read. Reading past max_size decompressed bytes raises
+    RequestEntityTooLarge. Wrap it in io.BufferedReader for readline().
+    """
+    
+    def __init__(self, raw: BinaryIO, encoding: str, max_size: Optional[int] = None):
+        """
+        Args:
+            raw: The compressed stream
+            encoding: The Content-Encoding, one of request_encodings()
+            max_size: Largest decompressed size accepted, None for no limit
+            
+        Raises:
+            DecompressionError: If the encoding is not supported
+        """
+        self.raw = raw
+        self.encoding = encoding.lower()
+        self.max_size = max_size
+        self.size = 0
+        self._zstd_reader = None
+        self._decompressor = None
+        self._tail = b""
+        if self.encoding == "zstd" and zstandard is not None:
+            self._zstd_reader = zstandard.ZstdDecompressor().stream_reader(
+                raw, read_size=READ_CHUNK_SIZE, read_across_frames=True
+            )
+        elif self.encoding not in ("gzip", "x-gzip", "deflate"):
+            raise DecompressionError(f"Unsupported Content-Encoding {encoding!r}")
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer: Any) -> int:
+        if self._zstd_reader is not None:
+            try:
+                count = self._zstd_reader.readinto(buffer)
+            except zstandard.ZstdError as e:
+                raise DecompressionError(f"Invalid zstd data: {e}") from None
+        else:
+            data = self._inflate(len(buffer))
+            count = len(data)
+            buffer[:count] = data
+        
+        self.size += count
+        if self.max_size is not None and self.size > self.max_size:
+            raise RequestEntityTooLarge()
+        return count
+    
+    def _inflate(self, limit: int) -> bytes:
+        """Produce up to limit bytes of gzip or deflate output; empty at the end."""
+        while True:
+            data = self._tail or self.raw.read(READ_CHUNK_SIZE)
+            self._tail = b""
+            if not data:
+                if self._decompressor is None or self._decompressor.eof:
+                    return b""
+                # Output held back by the previous limit
+                output = self._decompressor.decompress(b"", limit)
+                if not output:
+                    raise DecompressionError("Truncated compressed body")
+                return output
+            
+            if self._decompressor is None or self._decompressor.eof:
+                self._decompressor = self._new_decompressor(data)
+            try:
+                output = self._decompressor.decompress(data, limit)
+            except zlib.error as e:
+                raise DecompressionError(f"Invalid {self.encoding} data: {e}") from None
+            # Input left over once limit bytes were produced, or a next gzip member
+            self._tail = self._decompressor.unconsumed_tail or self._decompressor.unused_data
+            if output:
+                return output
+    
+    def _new_decompressor(self, data: bytes) -> Any:
+        """Start decompressing a gzip member or a deflate stream."""
+        if self.encoding != "deflate":
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # "deflate" is meant to be zlib-wrapped, but some clients send raw deflate
+        if len(data) >= 2 and data[0] & 0x0F == 8 and (data[0] << 8 | data[1]) % 31 == 0:
+            return zlib.decompressobj(zlib.MAX_WBITS)
+        return zlib.decompressobj(-zlib.MAX_WBITS)
+
+
+def decompress(body: bytes, encoding: str, max_size: Optional[int] = None) -> bytes:
+    """
+    Decompress a whole request body.
+    
+    Args:
+        body: The compressed body
+        encoding: The Content-Encoding
+        max_size: Largest decompressed size accepted, None for no limit
+        
+    Returns:
+        The decompressed body
+        
+    Raises:
+        DecompressionError: If the body is invalid or the encoding unsupported
+        RequestEntityTooLarge: If the body decompresses to more than max_size
+    """
+    return io.BufferedReader(DecompressingReader(io.BytesIO(body), encoding, max_size)).read()
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the response encoding for an Accept-Encoding header.
+    
+    Args:
+        accept_encoding: The header value
+        
+    Returns:
+        "zstd" (if available) or "gzip", or None if the client accepts neither
+    """
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        quality = params.strip()
+        if quality.startswith("q=") and quality[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(coding.strip())
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted or "x-gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    """Incremental gzip or zstd compression with flushes for streamed responses."""
+    
+    def __init__(self, encoding: str, level: int):
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=min(level, 19)).compressobj()
+            self._sync = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._sync = zlib.Z_SYNC_FLUSH
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def sync(self) -> bytes:
+        """Output everything compressed so far without ending the stream."""
+        return self._compressor.flush(self._sync)
+    
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    WSGI middleware for compressed request and response bodies.
+    
+    A request with a supported Content-Encoding gets a wsgi.input that
+    decompresses as the app reads it. Its length is unknown, so the app
+    reads it like a chunked upload: spooled to disk past
+    BODY_SPOOL_THRESHOLD and capped at MAX_CONTENT_LENGTH decompressed
+    bytes. Other encodings get a 415.
+    
+    A JSON or text response of at least COMPRESS_MIN_BYTES (or of
+    unknown length, like NDJSON streams) is compressed for a client whose
+    Accept-Encoding allows gzip or zstd. Streamed responses are flushed
+    every STREAM_FLUSH_BYTES of input, so results keep flowing. Data an
+    app passes to the write() callable is buffered and sent ahead of its
+    returned body.
+    """
+    
+    def __init__(self, wsgi_app: Callable, config: Dict[str, Any]):
+        """
+        Args:
+            wsgi_app: The WSGI app to wrap
+            config: The Flask app config (MAX_CONTENT_LENGTH, COMPRESS_* ...)
+        """
+        self.wsgi_app = wsgi_app
+        self.max_size = config.get("MAX_CONTENT_LENGTH")
+        self.min_bytes = config.get("COMPRESS_MIN_BYTES", 1024)
+        self.level = config.get("COMPRESS_LEVEL", 6)
+        self.encodings = request_encodings()
+    
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        content_encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if content_encoding and content_encoding != "identity":
+            if content_encoding not in self.encodings:
+                return self._unsupported(start_response, content_encoding)
+            self._decompress_input(environ, content_encoding)
+        
+        encoding = choose_encoding(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return self.wsgi_app(environ, start_response)
+        
+        started: Dict[str, Any] = {}
+        # Body written through write(); it comes before the returned iterable
+        written: List[bytes] = []
+        
+        def capture_start(status: str, headers: List[Tuple[str, str]], exc_info: Any = None) -> Callable:
+            started.update(status=status, headers=headers, exc_info=exc_info)
+            return written.append
+        
+        response = self.wsgi_app(environ, capture_start)
+        if not started:
+            # The app calls start_response with its first body chunk
+            chunks = iter(response)
+            first = next(chunks, b"")
+            return self._respond(started, start_response, encoding, response, written + [first], chunks)
+        return self._respond(started, start_response, encoding, response, written, iter(response))
+    
+    def _decompress_input(self, environ: Dict[str, Any], content_encoding: str) -> None:
+        """Replace the request body with its decompressed stream."""
+        raw = environ["wsgi.input"]
+        length = environ.get("CONTENT_LENGTH")
+        if length and length.isdigit():
+            # Never read past the body on a keep-alive connection
+            raw = LimitedStream(raw, int(length))
+        environ["wsgi.input"] = io.BufferedReader(
+            DecompressingReader(raw, content_encoding, self.max_size), READ_CHUNK_SIZE
+        )
+        environ["wsgi.input_terminated"] = True
+        environ.pop("CONTENT_LENGTH", None)
+        environ.pop("HTTP_CONTENT_ENCODING", None)
+    
+    def _respond(self, started: Dict[str, Any], start_response: Callable, encoding: str,
+                 response: Iterable[bytes], head: List[bytes], chunks: Iterator[bytes]) -> Iterable[bytes]:
+        """Send the response, compressed if it is worth it."""
+        headers = started["headers"]
+        names = {name.lower(): value for name, value in headers}
+        length = names.get("content-length")
+        if ("content-encoding" in names
+                or not names.get("content-type", "").lower().startswith(COMPRESSIBLE_TYPES)
+                or started["status"][:3] in ("204", "304")
+                or (length is not None and int(length) < self.min_bytes)):
+            start_response(started["status"], headers, started["exc_info"])
+            if not head:
+                return response
+            return _ClosingBody(response, _chain(head, chunks))
+        
+        headers = [(name, value) for name, value in headers if name.lower() != "content-length"]
+        # The bytes differ from the identity response, so its tag only stays as a weak one
+        headers = [
+            (name, "W/" + value if name.lower() == "etag" and not value.startswith("W/") else value)
+            for name, value in headers
+        ]
+        headers.append(("Content-Encoding", encoding))
+        headers.append(("Vary", "Accept-Encoding"))
+        compressor = _Compressor(encoding, self.level)
+        if length is not None:
+            # A complete body: compress it in one go and send its new length
+            body = compressor.compress(b"".join(_chain(head, chunks))) + compressor.finish()
+            headers.append(("Content-Length", str(len(body))))
+            start_response(started["status"], headers, started["exc_info"])
+            return _ClosingBody(response, iter([body]))
+        
+        start_response(started["status"], headers, started["exc_info"])
+        return _ClosingBody(response, _compress_stream(compressor, _chain(head, chunks)))
+    
+    @staticmethod
+    def _unsupported(start_response: Callable, content_encoding: str) -> List[bytes]:
+        """Reject a body in an encoding that cannot be decompressed."""
+        body = encode_json({
+            "success": False,
+            "error": "Unsupported Media Type",
+            "message": f"Content-Encoding {content_encoding!r} is not supported"
+        })
+        start_response("415 UNSUPPORTED MEDIA TYPE", [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body)))
+        ])
+        return [body]
+
+
+def _chain(head: List[bytes], chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Yield the chunks already taken from a body, then the rest of it."""
+    yield from head
+    yield from chunks
+
+
+def _compress_stream(compressor: _Compressor, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Compress a streamed body, flushing it every STREAM_FLUSH_BYTES of input."""
+    pending = 0
+    for chunk in chunks:
+        output = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= STREAM_FLUSH_BYTES:
+            output += compressor.sync()
+            pending = 0
+        if output:
+            yield output
+    yield compressor.finish()
+
+
+class _ClosingBody:
+    """A replacement response body that closes the original response when it is closed."""
+    
+    def __init__(self, response: Iterable[bytes], body: Iterator[bytes]):
+        self.response = response
+        self.body = body
+    
+    def __iter__(self) -> Iterator[bytes]:
+        return self.body
+    
+    def close(self) -> None:
+        close = getattr(self.response, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,66 @@
+"""
+JSON and MessagePack encoding helpers shared by the WSGI and ASGI front ends.
+"""
+
+import json
+from typing import Any
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from services.msgpack_codec import packb
+
+
+JSON_MIMETYPE = "application/json"
+
+# Media types accepted for MessagePack; responses use the one the client named
+MSGPACK_MIMETYPE = "application/msgpack"
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+
+def encode_json(data: Any) -> bytes:
+    """Encode a response body exactly like Flask's jsonify."""
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def encode_body(data: Any, mimetype: str) -> bytes:
+    """Encode a response body as JSON or, for a MessagePack media type, MessagePack."""
+    if mimetype in MSGPACK_MIMETYPES:
+        return packb(data)
+    return encode_json(data)
+
+
+def is_json_content_type(content_type: str) -> bool:
+    """Check a Content-Type header the way Flask's request.is_json does."""
+    mimetype = content_type.split(";", 1)[0].strip().lower()
+    return mimetype == "application/json" or (
+        mimetype.startswith("application/") and mimetype.endswith("+json")
+    )
+
+
+def is_msgpack_content_type(content_type: str) -> bool:
+    """Check whether a Content-Type header names MessagePack."""
+    return content_type.split(";", 1)[0].strip().lower() in MSGPACK_MIMETYPES
+
+
+def response_mimetype(accept: str, content_type: str) -> str:
+    """
+    Choose the media type of a response.
+    
+    The Accept header decides; when it allows both formats equally (or is
+    missing or names neither) the response uses the format of the request.
+    
+    Args:
+        accept: The Accept header, empty if absent
+        content_type: The Content-Type header of the request
+        
+    Returns:
+        JSON_MIMETYPE or one of MSGPACK_MIMETYPES
+    """
+    if is_msgpack_content_type(content_type):
+        offered = list(MSGPACK_MIMETYPES) + [JSON_MIMETYPE]
+    else:
+        offered = [JSON_MIMETYPE] + list(MSGPACK_MIMETYPES)
+    if not accept:
+        return offered[0]
+    return parse_accept_header(accept, MIMEAccept).best_match(offered, default=offered[0])
@@ -0,0 +1,167 @@
+"""
+WSGI fast path for /match-prompt.
+Answers match requests before they reach Flask, with response bytes
+encoded once per rule snapshot.
+"""
+
+import io
+import json
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from werkzeug.http import HTTP_STATUS_CODES
+
+from services.file_type_model import get_file_type_model
+from services.lazy_json import LazyJSONError
+from services.metrics import get_request_metrics
+from services.rule_store import get_rule_store
+from views.encoding import encode_json, is_json_content_type
+from views.prompt_controller import ERROR_STATUS_CODES, RULES_VERSION_HEADER, PromptController
+
+if TYPE_CHECKING:
+    from services.capture import RequestCapture
+    from services.profiler import RequestProfiler
+
+
+# Status line, headers and body of an encoded response
+EncodedResponse = Tuple[str, List[Tuple[str, str]], bytes]
+
+
+class FastPathMiddleware:
+    """
+    WSGI middleware that handles POST /match-prompt without Flask.
+    
+    The compiled matcher returns one of a small, fixed set of shared
+    result dictionaries, so each of them is encoded to its final status
+    line, headers and body once per rule snapshot. A request then costs
+    a JSON decode, the table lookup and a dict lookup of the response
+    bytes - no routing, request object, jsonify or response object.
+    
+    Anything out of the ordinary (other routes, non-JSON or large
+    bodies, bodies that are not a JSON object, requests whose file type
+    has to be inferred) falls through to the Flask app unchanged, so
+    responses stay identical. With RESPONSE_CACHE_ENABLED every request
+    falls through, so the response cache and idempotency keys apply,
+    and so does every request chosen for profiling.
+    """
+    
+    def __init__(self, wsgi_app: Callable, config: Dict[str, Any],
+                 capture: Optional["RequestCapture"] = None, profiler: Optional["RequestProfiler"] = None):
+        """
+        Args:
+            wsgi_app: The Flask WSGI app to fall through to
+            config: The Flask app config (FAST_PATH_MAX_BYTES, LAZY_JSON_* ...)
+            capture: Optional capture that answered requests are recorded to
+            profiler: Optional profiler; requests it chooses are profiled by the Flask view
+        """
+        self.wsgi_app = wsgi_app
+        self.config = config
+        self.capture = capture
+        self.profiler = profiler
+        self.profile_header = "HTTP_" + config.get("PROFILE_HEADER", "X-Profile").upper().replace("-", "_")
+        # Requests for a tenant's rules need Flask to select them
+        header = config.get("TENANT_HEADER", "X-Tenant-Id")
+        self.tenant_header = "HTTP_" + header.upper().replace("-", "_") if config.get("TENANT_RULES_DIR") else None
+        # The response cache and idempotency keys are handled by the Flask view
+        self.response_cache = bool(config.get("RESPONSE_CACHE_ENABLED"))
+        # (snapshot, {id(result): response}), replaced as a whole so
+        # concurrent requests always see a consistent pair
+        self._cache: Tuple[Any, Dict[int, EncodedResponse]] = (None, {})
+    
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        if (environ.get("PATH_INFO") != "/match-prompt" or environ.get("REQUEST_METHOD") != "POST"
+                or self.response_cache):
+            return self.wsgi_app(environ, start_response)
+        
+        started = time.perf_counter()
+        length = self._content_length(environ)
+        if (length is None
+                or length > self.config.get("FAST_PATH_MAX_BYTES", 0)
+                or not is_json_content_type(environ.get("CONTENT_TYPE", ""))
+                or "msgpack" in environ.get("HTTP_ACCEPT", "")
+                or "respond-async" in environ.get("HTTP_PREFER", "").lower()
+                or (self.tenant_header is not None and environ.get(self.tenant_header))):
+            # Encoded as JSON for the default rules only, and answered synchronously
+            return self.wsgi_app(environ, start_response)
+        if self.profiler is not None and self.profiler.should_profile_request(
+                environ, environ.get(self.profile_header, "").lower() in ("1", "true", "yes")):
+            return self.wsgi_app(environ, start_response)
+        
+        body = environ["wsgi.input"].read(length) if length else b""
+        snapshot = get_rule_store().snapshot
+        data = self._decode(body)
+        if (not isinstance(data, dict)
+                or data.get("render") is True
+                or (data.get("file_type") is None and get_file_type_model() is not None)):
+            # Let Flask produce its usual error for this body, infer its file type or render its prompt
+            environ["wsgi.input"] = io.BytesIO(body)
+            return self.wsgi_app(environ, start_response)
+        
+        result = snapshot.process_request(data)
+        status, headers, encoded = self._encoded_response(snapshot, result)
+        
+        metrics = get_request_metrics()
+        metrics.observe("total", time.perf_counter() - started)
+        metrics.count(PromptController.outcome_of(result))
+        
+        if self.capture is not None:
+            self.capture.record(environ.get("CONTENT_TYPE"), body, int(status[:3]))
+        
+        start_response(status, headers)
+        return [encoded]
+    
+    def _decode(self, body: bytes) -> Any:
+        """Decode a body like the controller does; None if it is not valid JSON."""
+        try:
+            if (self.config.get("LAZY_JSON_PARSING")
+                    and len(body) >= self.config.get("LAZY_JSON_MIN_BYTES", 0)):
+                try:
+                    return PromptController.scan_fields(body)
+                except LazyJSONError:
+                    pass
+            return json.loads(body)
+        except ValueError:
+            return None
+    
+    def _encoded_response(self, snapshot: Any, result: Dict[str, Any]) -> EncodedResponse:
+        """Get the encoded response for a result, encoding all of them once per snapshot."""
+        cached_snapshot, responses = self._cache
+        if snapshot is not cached_snapshot:
+            # Results are shared dictionaries owned by the snapshot, which
+            # the cache keeps alive, so their ids stay unique
+            responses = {
+                id(prebuilt): self._encode(prebuilt, snapshot.version) for prebuilt in snapshot.prebuilt_results()
+            }
+            self._cache = (snapshot, responses)
+        
+        response = responses.get(id(result))
+        if response is None:
+            response = self._encode(result, snapshot.version)
+            # Error results are built on first use; results built by the
+            # service fallback are new every time and encoded every time
+            if snapshot.is_shared_result(result):
+                responses[id(result)] = response
+        return response
+    
+    @staticmethod
+    def _encode(result: Dict[str, Any], version: str) -> EncodedResponse:
+        """Encode a result into its status line, headers and body."""
+        if result["success"]:
+            status_code = 200
+        else:
+            status_code = ERROR_STATUS_CODES.get(result["error"], 500)
+        body = encode_json(result)
+        return (
+            f"{status_code} {HTTP_STATUS_CODES[status_code].upper()}",
+            [("Content-Type", "application/json"), ("Content-Length", str(len(body))), (RULES_VERSION_HEADER, version)],
+            body
+        )
+    
+    @staticmethod
+    def _content_length(environ: Dict[str, Any]) -> Optional[int]:
+        """Get the declared body size, None if absent or invalid."""
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or "")
+        except ValueError:
+            return None
+        return length if length >= 0 else None
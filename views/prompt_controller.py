@@ -3,11 +3,59 @@ View layer (Controller) for handling API requests and responses.
 Handles HTTP requests and delegates business logic to the service layer.
 """
 
-from flask import request, jsonify
-from typing import Tuple, Dict, Any
+from flask import request, jsonify, current_app, g
+from typing import TYPE_CHECKING, Tuple, Dict, Any, Iterator, List, Mapping, Optional, Union
+from werkzeug.exceptions import RequestEntityTooLarge
+import hashlib
+import itertools
 import json
+import sys
+import time
+import weakref
 
-from services.prompt_service import PromptMatchingService
+from services.file_type_model import get_file_type_model
+from services.lazy_json import LazyJSONError, LazyValue, scan_object
+from services.metrics import RequestMetrics, get_request_metrics
+from services.msgpack_codec import MsgpackError, is_map, is_nil, iter_array, scan_map, unpackb
+from services.rule_store import get_active_snapshot
+from views.encoding import is_msgpack_content_type, response_mimetype
+from views.request_body import DecompressionError, SpooledBody, get_request_body
+
+if TYPE_CHECKING:
+    from services.job_queue import JobQueue
+
+
+# Content types accepted and produced for newline-delimited JSON
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# HTTP status codes for service error types; anything else is a 500
+ERROR_STATUS_CODES = {
+    "Missing Data": 400,  # Bad Request
+    "Invalid Prompt": 422  # Unprocessable Entity
+}
+
+# Response header reporting the version of the rules a request was matched against
+RULES_VERSION_HEADER = "X-Rules-Version"
+
+# Batch items whose missing file types are scored together
+INFERENCE_BATCH_SIZE = 256
+
+# Request options decoded along with the routing fields of lazily parsed bodies
+OPTION_FIELDS = frozenset({"render"})
+
+# API information and its entity tag per rule snapshot, dropped with the snapshot
+_api_info: "weakref.WeakKeyDictionary[Any, Tuple[Dict[str, Any], str]]" = weakref.WeakKeyDictionary()
+
+
+def _template_library() -> Optional[Any]:
+    """
+    The configured prompt template library, if any.
+    
+    create_app only imports services.prompt_templates when templates are
+    configured, so a module that was never loaded means there is none.
+    """
+    module = sys.modules.get("services.prompt_templates")
+    return module.get_template_library() if module is not None else None
 
 
 class PromptController:
@@ -21,73 +69,867 @@ class PromptController:
         Returns:
             Tuple of (response_data, status_code)
         """
+        metrics = get_request_metrics()
+        started = time.perf_counter()
         try:
-            # Ensure the request contains JSON data
-            if not request.is_json:
+            # Ensure the request contains JSON or MessagePack data
+            msgpack = is_msgpack_content_type(request.mimetype)
+            if not request.is_json and not msgpack:
                 return {
                     "success": False,
                     "error": "Missing Data",
                     "message": "Request must contain JSON data"
                 }, 400
             
+            # Read the body; spooled bodies are read into memory or a file
+            spool = PromptController._should_spool()
+            if spool:
+                get_request_body()
+            else:
+                request.get_data(cache=True)
+            read = time.perf_counter()
+            metrics.observe("body_read", read - started)
+            
             # Get the JSON data from the request
-            request_data = request.get_json()
+            if msgpack:
+                body = get_request_body().buffer if spool else request.get_data(cache=True)
+                request_data = PromptController.scan_msgpack(body)
+            elif spool:
+                request_data = PromptController._get_spooled_fields()
+            elif current_app.config.get("LAZY_JSON_PARSING"):
+                request_data = PromptController._get_routing_fields()
+            else:
+                request_data = PromptController._parse_json(request.get_data(cache=True))
+            metrics.observe("json_parse", time.perf_counter() - read)
+            
+            # Process the request and map the result to an HTTP response
+            return PromptController.process_data(request_data, metrics)
+        
+        except MsgpackError:
+            return {
+                "success": False,
+                "error": "Missing Data",
+                "message": "Invalid MessagePack format"
+            }, 400
+        except (json.JSONDecodeError, LazyJSONError, UnicodeDecodeError):
+            return {
+                "success": False,
+                "error": "Missing Data",
+                "message": "Invalid JSON format"
+            }, 400
+        except DecompressionError as e:
+            return {
+                "success": False,
+                "error": "Missing Data",
+                "message": f"Invalid compressed body: {e}"
+            }, 400
+        except RequestEntityTooLarge:
+            # Answered by the 413 error handler
+            raise
+        except Exception as e:
+            # Handle any unexpected errors gracefully
+            return {
+                "success": False,
+                "error": "Internal Error",
+                "message": f"An unexpected error occurred: {str(e)}"
+            }, 500
+    
+    @staticmethod
+    def match_query(args: Mapping[str, str]) -> Tuple[Dict[str, Any], int]:
+        """
+        Handle GET request for prompt matching.
+        
+        The routing fields (situation, level, file_type, ...) are read
+        from the query string and matched with an empty data field, so
+        lookups can be cached by HTTP caches. Other parameters are ignored.
+        
+        Args:
+            args: The query parameters
             
-            # Handle case where JSON is empty or None
-            if request_data is None:
+        Returns:
+            Tuple of (response_data, status_code)
+        """
+        request_data = {
+            dimension.name: args[dimension.name]
+            for dimension in get_active_snapshot().dimensions if dimension.name in args
+        }
+        request_data["data"] = ""
+        return PromptController.process_data(request_data, get_request_metrics(), infer=False)
+    
+    @staticmethod
+    def query_etag(args: Mapping[str, str], mimetype: str) -> str:
+        """
+        Get the entity tag of a GET /match-prompt response.
+        
+        The response depends only on the rules, the queried routing fields
+        and the response media type, so the tag is a hash of those and can
+        be checked before matching.
+        
+        Args:
+            args: The query parameters
+            mimetype: The negotiated response media type
+            
+        Returns:
+            The unquoted strong entity tag
+        """
+        snapshot = get_active_snapshot()
+        parts = [snapshot.version, snapshot.digest, mimetype]
+        parts += [f"{dimension.name}={args.get(dimension.name)!r}" for dimension in snapshot.dimensions]
+        return hashlib.blake2b("\0".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+    
+    @staticmethod
+    def match_prompt_batch() -> Tuple[Union[Dict[str, Any], Iterator[Dict[str, Any]]], int]:
+        """
+        Handle POST request for bulk prompt matching.
+        
+        The body is either a JSON or MessagePack array of match requests
+        or an NDJSON stream with one match request per line. Every item is
+        processed with the same semantics as a single /match-prompt request.
+        
+        Returns:
+            Tuple of (response_data, status_code). For NDJSON input, or when
+            the client accepts NDJSON, response_data is an iterator of
+            per-item results that is consumed while the body is still
+            being read.
+        """
+        try:
+            if request.mimetype in NDJSON_MIMETYPES:
+                # Stream items straight off the request body
+                return PromptController._iter_batch_results(
+                    PromptController._iter_ndjson_items()
+                ), 200
+            
+            if is_msgpack_content_type(request.mimetype):
+                items = PromptController._get_msgpack_items()
+            elif not request.is_json:
                 return {
                     "success": False,
                     "error": "Missing Data",
-                    "message": "Request body cannot be empty"
+                    "message": "Request must contain a JSON array, MessagePack array or NDJSON data"
                 }, 400
+            else:
+                items = PromptController._parse_json(request.get_data(cache=True))
             
-            # Process the request using the service layer
-            result = PromptMatchingService.process_request(request_data)
+            if not isinstance(items, list):
+                return {
+                    "success": False,
+                    "error": "Missing Data",
+                    "message": "Request body must be a JSON array of match requests"
+                }, 400
             
-            # Determine the appropriate HTTP status code
-            if result["success"]:
+            max_items = current_app.config.get("MAX_BATCH_ITEMS")
+            if max_items is not None and len(items) > max_items:
                 return {
-                    "success": True,
-                    "prompt": result["prompt"]
-                }, 200
-            else:
-                # Handle different error types with appropriate status codes
-                error_type = result.get("error", "Unknown Error")
-                
-                if error_type == "Missing Data":
-                    status_code = 400  # Bad Request
-                elif error_type == "Invalid Prompt":
-                    status_code = 422  # Unprocessable Entity
-                else:
-                    status_code = 500  # Internal Server Error
-                
-                response = {
                     "success": False,
-                    "error": error_type
-                }
-                
-                # Include additional message or details if available
-                if "message" in result:
-                    response["message"] = result["message"]
-                if "details" in result:
-                    response["details"] = result["details"]
-                
-                return response, status_code
-                
-        except json.JSONDecodeError:
+                    "error": "Batch Too Large",
+                    "message": f"A batch may contain at most {max_items} items"
+                }, 413
+            
+            results = PromptController._iter_batch_results(
+                (item, None) for item in items
+            )
+            
+            if PromptController.wants_ndjson():
+                return results, 200
+            
+            return {
+                "success": True,
+                "results": list(results)
+            }, 200
+        
+        except MsgpackError:
+            return {
+                "success": False,
+                "error": "Missing Data",
+                "message": "Invalid MessagePack format"
+            }, 400
+        except (json.JSONDecodeError, UnicodeDecodeError):
             return {
                 "success": False,
                 "error": "Missing Data",
                 "message": "Invalid JSON format"
             }, 400
+        except DecompressionError as e:
+            return {
+                "success": False,
+                "error": "Missing Data",
+                "message": f"Invalid compressed body: {e}"
+            }, 400
+        except RequestEntityTooLarge:
+            # Answered by the 413 error handler
+            raise
         except Exception as e:
-            # Handle any unexpected errors gracefully
             return {
                 "success": False,
                 "error": "Internal Error",
                 "message": f"An unexpected error occurred: {str(e)}"
             }, 500
     
+    @staticmethod
+    def response_cache_key(idempotency_header: str) -> Optional[bytes]:
+        """
+        Get the response cache key of the current /match-prompt request.
+        
+        A request with an idempotency key is keyed by that key alone; see
+        idempotency_fingerprint for telling apart different bodies sent
+        with the same key. Any other JSON or MessagePack request
+        is keyed by a hash of its raw body and of the active rule and
+        template versions. Both keys include the tenant, whose rule
+        versions are only unique within the tenant, and the response media
+        type, since responses are cached encoded.
+        
+        Args:
+            idempotency_header: Name of the idempotency key header
+            
+        Returns:
+            The cache key, or None if the request is not cacheable
+        """
+        # Imported here so apps without the response cache never load it
+        from services.response_cache import content_key, idempotency_key
+        
+        scope = f"{g.get('tenant') or ''}\0{PromptController.response_mimetype()}"
+        value = request.headers.get(idempotency_header)
+        if value:
+            return idempotency_key(f"{value}\0{scope}")
+        if not request.is_json and not is_msgpack_content_type(request.mimetype):
+            return None
+        
+        library = _template_library()
+        generation = f"{get_active_snapshot().version}\0{library.version if library is not None else ''}\0{scope}"
+        return content_key(generation, PromptController._raw_body())
+    
+    @staticmethod
+    def idempotency_fingerprint(idempotency_header: str) -> Optional[bytes]:
+        """
+        Hash the body of the current request if it carries an idempotency key.
+        
+        A cached response is only replayed for a request with the same
+        fingerprint as the one it answered.
+        
+        Args:
+            idempotency_header: Name of the idempotency key header
+            
+        Returns:
+            The fingerprint, or None if the request has no idempotency key
+        """
+        if not request.headers.get(idempotency_header):
+            return None
+        from services.response_cache import body_fingerprint
+        return body_fingerprint(PromptController._raw_body())
+    
+    @staticmethod
+    def idempotency_conflict(idempotency_header: str) -> Tuple[Dict[str, Any], int]:
+        """
+        Answer a request that reuses an idempotency key with a different body.
+        
+        Returns:
+            Tuple of (response_data, status_code)
+        """
+        return {
+            "success": False,
+            "error": "Idempotency Key Reused",
+            "message": f"The {idempotency_header} was already used with a different request body"
+        }, 422
+    
+    @staticmethod
+    def _raw_body() -> Any:
+        """Get the raw body of the current request, spooled when it is large."""
+        if PromptController._should_spool():
+            return get_request_body().buffer
+        return request.get_data(cache=True)
+    
+    @staticmethod
+    def response_mimetype() -> str:
+        """
+        Get the negotiated media type of the current request's response.
+        
+        Returns:
+            application/json or a MessagePack media type, per the Accept
+            header and otherwise the format of the request body
+        """
+        return response_mimetype(request.headers.get("Accept", ""), request.content_type or "")
+    
+    @staticmethod
+    def outcome_of(response_data: Dict[str, Any]) -> str:
+        """
+        Get the metrics outcome label of a response.
+        
+        Args:
+            response_data: A match response
+            
+        Returns:
+            The matched prompt, or the error type
+        """
+        if response_data.get("success"):
+            return response_data["prompt"]
+        return response_data.get("error", "Internal Error")
+    
+    @staticmethod
+    def wants_ndjson() -> bool:
+        """
+        Check whether the client asked for an NDJSON response.
+        
+        Returns:
+            True if the request body is NDJSON or NDJSON is preferred over JSON
+        """
+        if request.mimetype in NDJSON_MIMETYPES:
+            return True
+        best = request.accept_mimetypes.best_match(
+            ["application/json"] + list(NDJSON_MIMETYPES)
+        )
+        return best in NDJSON_MIMETYPES
+    
+    @staticmethod
+    def _get_routing_fields() -> Any:
+        """
+        Decode only the fields needed for matching from the request body.
+        
+        The routing fields are decoded and every other field, including
+        the potentially huge "data" value, is left undecoded as a
+        LazyValue. Bodies below LAZY_JSON_MIN_BYTES, and bodies the scanner
+        cannot handle, go through the regular JSON parser so their results
+        and errors stay the same.
+        
+        Returns:
+            Dictionary of routing fields plus lazily decoded other fields
+        """
+        body = request.get_data(cache=True)
+        
+        # json.loads is faster for small bodies
+        if len(body) < current_app.config.get("LAZY_JSON_MIN_BYTES", 0):
+            return PromptController._parse_json(body)
+        
+        try:
+            return PromptController.scan_fields(body)
+        except LazyJSONError:
+            return PromptController._parse_json(body)
+    
+    @staticmethod
+    def _parse_json(body: Any) -> Any:
+        """
+        Parse a whole JSON body.
+        
+        Args:
+            body: The raw body
+            
+        Returns:
+            The decoded value, None for an empty body
+            
+        Raises:
+            json.JSONDecodeError: If the body is not valid JSON
+            UnicodeDecodeError: If the body is not UTF-8
+        """
+        return json.loads(body) if body else None
+    
+    @staticmethod
+    def _should_spool() -> bool:
+        """
+        Check whether the request body has to be read with bounded memory.
+        
+        Returns:
+            True if the body is larger than BODY_SPOOL_THRESHOLD or its
+            size is unknown (chunked transfer encoding)
+        """
+        threshold = current_app.config.get("BODY_SPOOL_THRESHOLD")
+        if threshold is None:
+            return False
+        return request.content_length is None or request.content_length > threshold
+    
+    @staticmethod
+    def _get_spooled_fields() -> Any:
+        """
+        Decode the routing fields of a body that may be spooled to disk.
+        
+        The body is read into memory or a temporary file and scanned in
+        place. Every field other than the routing fields stays a
+        LazyValue, so the "data" field is read through
+        services.lazy_json.open_text instead of being decoded into one
+        string.
+        
+        Returns:
+            Dictionary of routing fields plus lazily decoded other fields
+            
+        Raises:
+            LazyJSONError: If a spooled body is a malformed JSON object
+            json.JSONDecodeError: If the body is not valid JSON
+        """
+        return PromptController.parse_spooled(get_request_body())
+    
+    @staticmethod
+    def parse_spooled(body: SpooledBody) -> Any:
+        """
+        Decode a JSON body read with SpooledBody.
+        
+        Args:
+            body: The body, in memory or spooled to disk
+            
+        Returns:
+            Dictionary of routing fields plus lazily decoded other fields,
+            or the decoded value of a body that is not a JSON object
+            
+        Raises:
+            LazyJSONError: If a spooled body is a malformed JSON object
+            json.JSONDecodeError: If the body is not valid JSON
+        """
+        if not body.buffer:
+            return None
+        
+        try:
+            return PromptController.scan_fields(body.buffer)
+        except LazyJSONError:
+            if body.spooled and PromptController._starts_object(body.buffer):
+                raise
+            # Anything but an object is parsed in full, so arrays, null and
+            # malformed bodies get the same results as in-memory ones
+            return PromptController._parse_json(bytes(body.buffer))
+    
+    @staticmethod
+    def _starts_object(buffer: Any) -> bool:
+        """Check whether a body's first non-whitespace byte opens a JSON object."""
+        head = bytes(buffer[:4096]).lstrip(b" \t\r\n")
+        return head[:1] == b"{"
+    
+    @staticmethod
+    def scan_fields(body: Any) -> Dict[str, Any]:
+        """
+        Scan a JSON object body, decoding only the routing and option fields.
+        
+        Args:
+            body: Buffer holding the JSON body
+            
+        Returns:
+            Dictionary of routing and option fields plus LazyValue other fields
+            
+        Raises:
+            LazyJSONError: If the body is not a well-formed JSON object
+        """
+        decoded, lazy = scan_object(body, get_active_snapshot().routing_fields | OPTION_FIELDS)
+        
+        # A JSON null counts as a missing field, just like after a full parse
+        request_data = {
+            key: None if len(value) == 4 and value.raw() == b"null" else value
+            for key, value in lazy.items()
+        }
+        request_data.update(decoded)
+        return request_data
+    
+    @staticmethod
+    def scan_msgpack(body: Any, start: int = 0, end: Optional[int] = None) -> Any:
+        """
+        Decode a MessagePack match request, only the routing and option fields of a map.
+        
+        Every other field stays a MsgpackValue pointing into the body, so
+        a "data" string or bin value is neither copied nor decoded.
+        
+        Args:
+            body: Buffer holding the MessagePack body
+            start: Offset of the request in the buffer
+            end: End of the request in the buffer, None for the end of the buffer
+            
+        Returns:
+            Dictionary of routing and option fields plus MsgpackValue other
+            fields; None for an empty body; other values fully decoded
+            
+        Raises:
+            MsgpackError: If the body is not valid MessagePack
+        """
+        end = len(body) if end is None else end
+        if start == end:
+            return None
+        if not is_map(body, start):
+            return unpackb(memoryview(body)[start:end])
+        
+        decoded, lazy = scan_map(body, get_active_snapshot().routing_fields | OPTION_FIELDS, start, end)
+        # nil counts as a missing field, like a JSON null
+        request_data = {key: None if is_nil(value) else value for key, value in lazy.items()}
+        request_data.update(decoded)
+        return request_data
+    
+    @staticmethod
+    def _get_msgpack_items() -> Any:
+        """
+        Decode a MessagePack batch body.
+        
+        Returns:
+            List of match requests scanned like single requests, or the
+            decoded body if it is not an array
+            
+        Raises:
+            MsgpackError: If the body is not valid MessagePack
+        """
+        body = request.get_data(cache=True)
+        try:
+            spans = list(iter_array(body))
+        except MsgpackError:
+            return unpackb(body) if body else None
+        return [PromptController.scan_msgpack(body, start, end) for start, end in spans]
+    
+    @staticmethod
+    def process_data(request_data: Any, metrics: Optional[RequestMetrics] = None,
+                     prediction: Optional[Tuple[str, float]] = None,
+                     infer: bool = True) -> Tuple[Dict[str, Any], int]:
+        """
+        Run a decoded request body through the service layer.
+        
+        When a file type model is configured and the request leaves out
+        file_type, the file type is inferred from the data field and the
+        response reports it in "inferred_file_type" and
+        "file_type_confidence".
+        
+        Args:
+            request_data: The decoded JSON body of a single match request
+            metrics: Metrics to record the infer, validate and match stage times in
+            prediction: File type prediction already made for this request
+            infer: Whether to predict the file type if no prediction is given
+            
+        Returns:
+            Tuple of (response_data, status_code)
+        """
+        # Handle case where JSON is empty or None
+        if request_data is None:
+            return {
+                "success": False,
+                "error": "Missing Data",
+                "message": "Request body cannot be empty"
+            }, 400
+        
+        # Fill in a missing file_type from the data
+        model = get_file_type_model()
+        if model is not None:
+            if prediction is None and infer:
+                started = time.perf_counter()
+                prediction = PromptController.infer_file_types([request_data])[0]
+                if metrics is not None and prediction is not None:
+                    metrics.observe("infer", time.perf_counter() - started)
+            if prediction is not None and prediction[1] >= model.min_confidence:
+                request_data = dict(request_data, file_type=prediction[0])
+        
+        # Resolve the request against the active compiled rule snapshot;
+        # the result is a prebuilt dictionary in the response format already
+        snapshot = get_active_snapshot()
+        if metrics is None:
+            result = snapshot.process_request(request_data)
+        else:
+            started = time.perf_counter()
+            result = snapshot.validate(request_data)
+            validated = time.perf_counter()
+            metrics.observe("validate", validated - started)
+            if result.__class__ is int:
+                result = snapshot.match(result)
+                metrics.observe("match", time.perf_counter() - validated)
+        
+        # Results are shared, so report an inferred file type on a copy
+        if prediction is not None:
+            result = {
+                **result,
+                "inferred_file_type": prediction[0],
+                "file_type_confidence": round(prediction[1], 4)
+            }
+        
+        # Determine the appropriate HTTP status code
+        if result["success"]:
+            if request_data.get("render") is True:
+                result = PromptController.render_prompt(result, request_data, snapshot, metrics)
+            return result, 200
+        
+        return result, ERROR_STATUS_CODES.get(result["error"], 500)
+    
+    @staticmethod
+    def render_prompt(result: Dict[str, Any], request_data: Dict[str, Any], snapshot: Any,
+                      metrics: Optional[RequestMetrics] = None) -> Dict[str, Any]:
+        """
+        Add the rendered template of the matched prompt to a result.
+        
+        Templates see the request fields, with routing fields resolved to
+        their canonical values, and the matched "prompt" name.
+        "rendered_prompt" is null if the prompt has no template.
+        
+        Args:
+            result: The shared success result
+            request_data: The decoded request body
+            snapshot: The rule snapshot the request was matched against
+            metrics: Metrics to record the render stage time in
+            
+        Returns:
+            A copy of the result with "rendered_prompt"
+        """
+        library = _template_library()
+        if library is None:
+            return result
+        
+        started = time.perf_counter()
+        variables = dict(request_data)
+        for dimension in snapshot.dimensions:
+            value = variables.get(dimension.name)
+            if isinstance(value, str):
+                variables[dimension.name] = dimension.canonical(value.strip()) or value
+        variables["prompt"] = result["prompt"]
+        rendered = library.render(result["prompt"], variables)
+        if metrics is not None:
+            metrics.observe("render", time.perf_counter() - started)
+        return {**result, "rendered_prompt": rendered}
+    
+    @staticmethod
+    def infer_file_types(items: List[Any]) -> List[Optional[Tuple[str, float]]]:
+        """
+        Predict the file types of the requests that leave file_type out.
+        
+        All predictions are scored in one batch.
+        
+        Args:
+            items: Decoded request bodies
+            
+        Returns:
+            A (file type, probability) tuple per item; None for items that
+            name a file type or have no text data, and for every item
+            when no file type model is configured
+        """
+        predictions: List[Optional[Tuple[str, float]]] = [None] * len(items)
+        model = get_file_type_model()
+        if model is None:
+            return predictions
+        
+        positions, texts = [], []
+        for position, item in enumerate(items):
+            text = PromptController._inference_text(item, model.max_chars)
+            if text is not None:
+                positions.append(position)
+                texts.append(text)
+        for position, prediction in zip(positions, model.predict(texts)):
+            predictions[position] = prediction
+        return predictions
+    
+    @staticmethod
+    def _inference_text(item: Any, max_chars: int) -> Optional[str]:
+        """Get the start of a request's data if its file_type has to be inferred."""
+        if not isinstance(item, dict) or item.get("file_type") is not None:
+            return None
+        data = item.get("data")
+        if isinstance(data, str):
+            return data[:max_chars]
+        if isinstance(data, LazyValue) and data.is_string():
+            # Decode only the part of a large data field the model reads
+            with data.open() as text:
+                return text.read(max_chars)
+        return None
+    
+    @staticmethod
+    def _iter_ndjson_items() -> Iterator[Tuple[Any, Any]]:
+        """
+        Read match requests from an NDJSON request body one line at a time.
+        
+        Yields:
+            Tuples of (request_data, error_response); error_response is set
+            when the line could not be decoded
+        """
+        try:
+            for raw_line in request.stream:
+                line = raw_line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line), None
+                except ValueError:
+                    yield None, ({
+                        "success": False,
+                        "error": "Missing Data",
+                        "message": "Invalid JSON format"
+                    }, 400)
+        except DecompressionError as e:
+            # The rest of a corrupt compressed body cannot be read
+            yield None, ({
+                "success": False,
+                "error": "Missing Data",
+                "message": f"Invalid compressed body: {e}"
+            }, 400)
+    
+    @staticmethod
+    def _iter_batch_results(items: Iterator[Tuple[Any, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Process batch items and tag each result with its position and status.
+        
+        Args:
+            items: Iterator of (request_data, error_response) tuples
+            
+        Yields:
+            Per-item result dictionaries
+        """
+        # With a file type model, items are processed in chunks whose
+        # missing file types are scored in one batch
+        chunk_size = INFERENCE_BATCH_SIZE if get_file_type_model() is not None else 1
+        items = iter(items)
+        index = 0
+        while True:
+            chunk = list(itertools.islice(items, chunk_size))
+            if not chunk:
+                return
+            
+            try:
+                predictions = PromptController.infer_file_types([item for item, _ in chunk])
+                infer = False
+            except Exception:
+                # Let each item infer, and report its error, on its own
+                predictions = [None] * len(chunk)
+                infer = True
+            
+            for (item, error_response), prediction in zip(chunk, predictions):
+                try:
+                    response, status_code = error_response or PromptController.process_data(
+                        item, prediction=prediction, infer=infer
+                    )
+                except Exception as e:
+                    response, status_code = {
+                        "success": False,
+                        "error": "Internal Error",
+                        "message": f"An unexpected error occurred: {str(e)}"
+                    }, 500
+                
+                yield {"index": index, "status": status_code, **response}
+                index += 1
+    
+    @staticmethod
+    def submit_job(queue: "JobQueue") -> Tuple[Dict[str, Any], int]:
+        """
+        Queue the current /match-prompt request body as a background job.
+        
+        Only the body is read here; parsing and matching happen in a job
+        worker, so large documents do not hold up request handling.
+        
+        Args:
+            queue: The job queue
+            
+        Returns:
+            Tuple of (response_data, status_code): 202 with the job id, or
+            503 if the queue is full
+        """
+        # Imported here so apps without background jobs never load the queue
+        from services.job_queue import QueueFullError
+        
+        try:
+            if not request.is_json and not is_msgpack_content_type(request.mimetype):
+                return {
+                    "success": False,
+                    "error": "Missing Data",
+                    "message": "Request must contain JSON data"
+                }, 400
+            
+            body = get_request_body().buffer if PromptController._should_spool() else request.get_data(cache=True)
+            job_id = queue.submit(body, request.mimetype, g.get("tenant"))
+            return {"success": True, "job_id": job_id, "status": "queued"}, 202
+        
+        except QueueFullError:
+            return {
+                "success": False,
+                "error": "Queue Full",
+                "message": "Too many jobs are waiting, retry later"
+            }, 503
+        except DecompressionError as e:
+            return {
+                "success": False,
+                "error": "Missing Data",
+                "message": f"Invalid compressed body: {e}"
+            }, 400
+        except RequestEntityTooLarge:
+            # Answered by the 413 error handler
+            raise
+        except Exception as e:
+            return {
+                "success": False,
+                "error": "Internal Error",
+                "message": f"An unexpected error occurred: {str(e)}"
+            }, 500
+    
+    @staticmethod
+    def process_body(body: bytes, content_type: str) -> Tuple[Dict[str, Any], int]:
+        """
+        Process a stored match request body, such as a job's, outside of a request.
+        
+        Args:
+            body: The raw JSON or MessagePack body
+            content_type: Its Content-Type
+            
+        Returns:
+            Tuple of (response_data, status_code), as /match-prompt would answer
+        """
+        try:
+            if is_msgpack_content_type(content_type):
+                request_data = PromptController.scan_msgpack(body)
+            elif not body:
+                request_data = None
+            elif (current_app.config.get("LAZY_JSON_PARSING")
+                    and len(body) >= current_app.config.get("LAZY_JSON_MIN_BYTES", 0)):
+                try:
+                    request_data = PromptController.scan_fields(body)
+                except LazyJSONError:
+                    request_data = json.loads(body)
+            else:
+                request_data = json.loads(body)
+        except MsgpackError:
+            return {
+                "success": False,
+                "error": "Missing Data",
+                "message": "Invalid MessagePack format"
+            }, 400
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return {
+                "success": False,
+                "error": "Missing Data",
+                "message": "Invalid JSON format"
+            }, 400
+        
+        return PromptController.process_data(request_data)
+    
+    @staticmethod
+    def api_info() -> Tuple[Dict[str, Any], int]:
+        """
+        Describe the API and the values accepted by the active rules.
+        
+        The description is built once per rule snapshot and shared.
+        
+        Returns:
+            Tuple of (response_data, status_code)
+        """
+        return PromptController._api_info_entry()[0], 200
+    
+    @staticmethod
+    def api_info_etag() -> str:
+        """
+        Get the entity tag of the API description.
+        
+        Returns:
+            The unquoted strong entity tag
+        """
+        return PromptController._api_info_entry()[1]
+    
+    @staticmethod
+    def _api_info_entry() -> Tuple[Dict[str, Any], str]:
+        """Get the API description of the active snapshot and its tag, building them on first use."""
+        snapshot = get_active_snapshot()
+        entry = _api_info.get(snapshot)
+        if entry is not None:
+            return entry
+        
+        rules = snapshot.rules
+        info = {
+            "message": "Prompt Matching API",
+            "version": "1.0.0",
+            "endpoints": {
+                "POST /match-prompt": "Match a system prompt based on input criteria",
+                "GET /match-prompt": "Match a system prompt by query parameters, cacheable with ETags",
+                "POST /match-prompt/batch": "Match prompts for a JSON array or NDJSON stream of requests",
+                "GET /health": "Health check endpoint",
+                "GET /metrics": "Request counts and stage latency histograms (Prometheus format)",
+                "GET /": "API information"
+            },
+            "rules_version": rules.version,
+            "supported_values": {
+                dimension.name: list(dimension.values) for dimension in rules.dimensions
+            }
+        }
+        etag = hashlib.blake2b(json.dumps(info, sort_keys=True).encode("utf-8"), digest_size=16).hexdigest()
+        _api_info[snapshot] = entry = (info, etag)
+        return entry
+    
     @staticmethod
     def health_check() -> Tuple[Dict[str, Any], int]:
         """
@@ -98,5 +940,6 @@ class PromptController:
         """
         return {
             "status": "healthy",
-            "message": "Prompt Matching API is running"
+            "message": "Prompt Matching API is running",
+            "rules_version": get_active_snapshot().version
         }, 200 
\ No newline at end of file
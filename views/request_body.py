@@ -0,0 +1,153 @@
+"""
+Request body spooling.
+Reads request bodies with bounded memory: small bodies are kept in
+memory and larger ones are written to a temporary file and memory-mapped.
+"""
+
+import mmap
+import tempfile
+from typing import Any, BinaryIO, Optional
+
+from flask import current_app, g, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+
+# Bytes read from the request stream at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class DecompressionError(Exception):
+    """
+    A request body is not valid data in its Content-Encoding.
+    
+    Not a ValueError: werkzeug's LimitedStream reports those as a client
+    disconnect.
+    """
+
+
+class SpooledBody:
+    """
+    A request body held in memory or in a memory-mapped temporary file.
+    
+    buffer supports len(), slicing and find() either way, so it can be
+    handed to the lazy JSON scanner directly. Closing the body removes
+    the temporary file.
+    """
+    
+    def __init__(self, buffer: Any, spool_file: Optional[BinaryIO] = None):
+        self.buffer = buffer
+        self.spool_file = spool_file
+    
+    @property
+    def spooled(self) -> bool:
+        """Whether the body was written to disk."""
+        return self.spool_file is not None
+    
+    def close(self) -> None:
+        """Release the memory map and delete the temporary file."""
+        if self.spool_file is not None:
+            self.buffer.close()
+            self.spool_file.close()
+            self.spool_file = None
+        self.buffer = b""
+    
+    @classmethod
+    def read(cls, stream: BinaryIO, threshold: int, max_size: Optional[int] = None,
+             spool_dir: Optional[str] = None) -> "SpooledBody":
+        """
+        Read a stream, spooling it to disk once it grows past threshold bytes.
+        
+        Args:
+            stream: The request body stream
+            threshold: Largest body kept in memory
+            max_size: Largest body accepted, None for no limit
+            spool_dir: Directory for temporary files, None for the system default
+            
+        Returns:
+            The body
+            
+        Raises:
+            RequestEntityTooLarge: If the body is larger than max_size
+        """
+        memory = bytearray()
+        spool_file = None
+        size = 0
+        try:
+            while True:
+                chunk = stream.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise RequestEntityTooLarge()
+                
+                if spool_file is not None:
+                    spool_file.write(chunk)
+                    continue
+                
+                memory += chunk
+                if size > threshold:
+                    # Move what has been read so far to disk
+                    spool_file = tempfile.TemporaryFile(dir=spool_dir)
+                    spool_file.write(memory)
+                    memory = bytearray()
+            
+            if spool_file is None:
+                return cls(bytes(memory))
+            
+            spool_file.flush()
+            return cls(mmap.mmap(spool_file.fileno(), 0, access=mmap.ACCESS_READ), spool_file)
+        except BaseException:
+            if spool_file is not None:
+                spool_file.close()
+            raise
+
+
+def get_request_body() -> SpooledBody:
+    """
+    Read the body of the current request with bounded memory.
+    
+    The body is read once per request and closed by close_request_body
+    when the request ends.
+    
+    Returns:
+        The spooled body of the current request
+    """
+    body = g.get("spooled_body")
+    if body is None:
+        body = SpooledBody.read(
+            request.stream,
+            current_app.config.get("BODY_SPOOL_THRESHOLD", 0),
+            current_app.config.get("MAX_CONTENT_LENGTH"),
+            current_app.config.get("BODY_SPOOL_DIR")
+        )
+        g.spooled_body = body
+    return body
+
+
+def get_small_request_body(limit: int) -> Optional[bytes]:
+    """
+    Get the body of the current request if it fits in memory.
+    
+    Args:
+        limit: Largest body returned, in bytes
+        
+    Returns:
+        The body, or None if it is larger than limit, spooled to disk or
+        of unknown length
+    """
+    body = g.get("spooled_body")
+    if body is not None:
+        if body.spooled or len(body.buffer) > limit:
+            return None
+        return bytes(body.buffer)
+    if request.content_length is None or request.content_length > limit:
+        return None
+    return request.get_data(cache=True)
+
+
+def close_request_body(error: Optional[BaseException] = None) -> None:
+    """Close the spooled body of the current request; a teardown_request handler."""
+    body = g.pop("spooled_body", None)
+    if body is not None:
+        body.close()